@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Shanghainese Learning ASGI App
+Async serving mode for the upstream-bound endpoints
+
+/translate, /translate/stream and /speak are handled on the event loop: GPT-4o is called with
+the async OpenAI client and gradio TTS runs in a bounded thread pool, so a
+slow upstream only holds a coroutine, not a worker. Every other route is
+served by the Flask app in web_app.py. Both kinds of route are counted in the
+same request metrics (see metrics.py) and traced the same way (see tracing.py).
+Work handed to the thread pool runs in a copy of the request's context, so
+its spans land in the request's trace.
+
+Run with:
+    gunicorn asgi_app:app -k uvicorn.workers.UvicornWorker
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from clients import ASYNC_OPENAI_CLIENT
+from metrics import REQUEST_LATENCY, REQUESTS, REQUESTS_IN_FLIGHT, track_upstream
+from prompts import TOKEN_USAGE, TRANSLATION_PROMPT
+from tracing import TRACER, span
+from translation_cache import cache_key as translation_cache_key
+from tts_router import BackendUnavailable
+from web_app import (SINGLE_FLIGHT, TRANSLATION_CACHE, TRANSLATION_MODEL,
+                     TRANSLATION_PROMPT_VERSION, VOCAB_STORE, app as flask_app, audio_variant,
+                     generate_audio, negotiate_audio_format, retry_after, sse_event)
+
+# Maximum concurrent GPT-4o calls per worker
+ASYNC_TRANSLATE_CONCURRENCY = int(os.getenv('ASYNC_TRANSLATE_CONCURRENCY', 200))
+# Threads available to the (blocking) TTS backends per worker
+ASYNC_TTS_CONCURRENCY = int(os.getenv('ASYNC_TTS_CONCURRENCY', 32))
+
+TTS_EXECUTOR = ThreadPoolExecutor(max_workers=ASYNC_TTS_CONCURRENCY,
+                                  thread_name_prefix='tts')
+
+# Created on first use so they bind to the worker's running loop
+_translate_limit = None
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+def translate_limit():
+    global _translate_limit
+    if _translate_limit is None:
+        _translate_limit = asyncio.Semaphore(ASYNC_TRANSLATE_CONCURRENCY)
+    return _translate_limit
+
+
+async def get_shanghainese_translation_async(text, source_lang="mandarin"):
+    """Async twin of web_app.get_shanghainese_translation (same cache)"""
+    with span('get_shanghainese_translation', source=source_lang, text_length=len(text)) as translation_span:
+        cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+        translation_span.set_attribute('cache_hit', cached is not None)
+        if cached is not None:
+            return cached
+
+        key = translation_cache_key(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+        return await SINGLE_FLIGHT.do_async(f"translate:{key}", translate_uncached_async, text, source_lang)
+
+
+async def translate_uncached_async(text, source_lang):
+    """Call GPT-4o unless another worker cached the result while we waited"""
+    cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL,
+                                   count=False)
+    if cached is not None:
+        return cached
+
+    async with translate_limit():
+        client = ASYNC_OPENAI_CLIENT.get()
+        with track_upstream('openai_chat'), span('openai.chat', model=TRANSLATION_MODEL) as chat_span:
+            response = await client.chat.completions.create(
+                model=TRANSLATION_MODEL,
+                messages=TRANSLATION_PROMPT.messages(text, source_lang, VOCAB_STORE.current().search)
+            )
+            if response.usage:
+                chat_span.set_attribute('prompt_tokens', response.usage.prompt_tokens)
+
+    TOKEN_USAGE.record(TRANSLATION_PROMPT.key, response.usage)
+    translation = response.choices[0].message.content
+    TRANSLATION_CACHE.set(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL, translation)
+    return translation
+
+
+async def stream_shanghainese_translation_async(text, source_lang="mandarin"):
+    """Async twin of web_app.stream_shanghainese_translation"""
+    cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async with translate_limit():
+        client = ASYNC_OPENAI_CLIENT.get()
+        with track_upstream('openai_chat'), span('openai.chat', model=TRANSLATION_MODEL, stream=True):
+            stream = await client.chat.completions.create(
+                model=TRANSLATION_MODEL,
+                messages=TRANSLATION_PROMPT.messages(text, source_lang, VOCAB_STORE.current().search),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    TOKEN_USAGE.record(TRANSLATION_PROMPT.key, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+    TRANSLATION_CACHE.set(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL, ''.join(parts))
+
+
+def generate_audio_variant(text, fmt):
+    audio_file = generate_audio(text)
+    return audio_variant(audio_file, fmt) if audio_file else None
+
+
+async def generate_audio_async(text, fmt=None):
+    """Run web_app.generate_audio (and any transcode) in the TTS thread pool"""
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry contextvars over, so the active span would be lost
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(TTS_EXECUTOR, ctx.run, generate_audio_variant, text, fmt)
+
+
+# ============================================================================
+# ASGI PLUMBING
+# ============================================================================
+
+async def read_json(receive):
+    """Read the full request body and decode it as a JSON object (ValueError if it isn't one)"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    data = json.loads(body) if body else {}
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    return data
+
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def translate(scope, receive, send):
+    """Translation endpoint (same contract as the Flask route)"""
+    try:
+        data = await read_json(receive)
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON', 'success': False}, 400)
+    text = data.get('text', '')
+    source = data.get('source', 'mandarin')
+
+    if not text:
+        return await send_json(send, {'error': 'No text provided'}, 400)
+
+    try:
+        translation = await get_shanghainese_translation_async(text, source)
+        await send_json(send, {'translation': translation, 'success': True})
+    except Exception as e:
+        await send_json(send, {'error': str(e), 'success': False}, 500)
+
+
+async def translate_stream(scope, receive, send):
+    """Streaming translation endpoint (same contract as the Flask route)"""
+    try:
+        data = await read_json(receive)
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON', 'success': False}, 400)
+    text = data.get('text', '')
+    source = data.get('source', 'mandarin')
+
+    if not text:
+        return await send_json(send, {'error': 'No text provided'}, 400)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def send_event(event, payload):
+        await send({
+            'type': 'http.response.body',
+            'body': sse_event(event, payload).encode('utf-8'),
+            'more_body': True,
+        })
+
+    parts = []
+    try:
+        async for delta in stream_shanghainese_translation_async(text, source):
+            parts.append(delta)
+            await send_event('delta', {'text': delta})
+        await send_event('done', {'translation': ''.join(parts), 'success': True})
+    except Exception as e:
+        await send_event('error', {'error': str(e), 'success': False})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def speak(scope, receive, send):
+    """Audio endpoint (same contract as the Flask route)"""
+    try:
+        data = await read_json(receive)
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON', 'success': False}, 400)
+    text = data.get('text', '')
+
+    if not text:
+        return await send_json(send, {'error': 'No text provided'}, 400)
+
+    headers = dict(scope['headers'])
+    fmt = negotiate_audio_format(data.get('format'), headers.get(b'accept', b'').decode('latin-1'))
+    try:
+        audio_file = await generate_audio_async(text, fmt)
+        if audio_file:
+            await send_json(send, {'audio_url': f'/{audio_file}', 'success': True})
+        else:
+            await send_json(send, {'error': 'Failed to generate audio', 'success': False}, 500)
+    except BackendUnavailable:
+        await send_json(send, {'error': 'All TTS backends are unavailable, try again later', 'success': False},
+                        503, [(b'retry-after', retry_after().encode())])
+    except Exception as e:
+        await send_json(send, {'error': str(e), 'success': False}, 500)
+
+
+ASYNC_ROUTES = {
+    ('POST', '/translate'): translate,
+    ('POST', '/translate/stream'): translate_stream,
+    ('POST', '/speak'): speak,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            TTS_EXECUTOR.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = None
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+
+    if handler is None:
+        # Each Flask request gets its own thread instead of sharing one
+        async with ThreadSensitiveContext():
+            return await wsgi_app(scope, receive, send)
+
+    # These routes skip the Flask hooks, so record the request metrics here
+    route, method = scope['path'], scope['method']
+    started = time.perf_counter()
+    status = 500  # if the handler fails before starting a response
+
+    async def send_and_record(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            # Latency until the headers, as for the Flask routes
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route=route, method=method)
+            request_span.set_attribute('http.status_code', status)
+        await send(message)
+
+    REQUESTS_IN_FLIGHT.inc(route=route)
+    # Root span of this request's trace; stages below it nest under it
+    with TRACER.start_trace(f"{method} {route}", **{'http.method': method, 'http.route': route}) as request_span:
+        try:
+            await handler(scope, receive, send_and_record)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(route=route)
+            REQUESTS.inc(route=route, method=method, status=status)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 8080))
+    print(f"\n🌐 Starting async server at http://127.0.0.1:{port}")
+    uvicorn.run('asgi_app:app', port=port)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Audio Cache
+Content-addressed cache for generated Shanghainese TTS audio
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from logs import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker may collect
+    fcntl = None
+
+log = get_logger('audio_cache')
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share one cache entry"""
+    text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split())
+
+
+def cache_key(text, backend, voice, speed):
+    """Hash of (normalized text, backend, voice, speed)"""
+    raw = '\x1f'.join([normalize_text(text), backend, voice, f"{float(speed):.2f}"])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.opus')
+
+# Temp files older than this (seconds) are leftovers of a crashed write
+STALE_TMP_AGE = 3600
+# A hit only rewrites the file's atime if it is older than this (seconds)
+ACCESS_RESOLUTION = 600
+
+
+class AudioCache:
+    """
+    Bounded LRU cache of audio files in sharded subdirectories
+
+    Files are named after their cache key plus the extension of their
+    format and live in a subdirectory named after the key's first two hex
+    digits (e.g. static/audio/3f/3fa2...e1.mp3), so no directory grows past
+    a few thousand entries. Writes land in a temp file in the cache
+    directory and are moved into place with os.replace, so readers never see
+    a partial file.
+
+    Each worker keeps its own LRU index and evicts from it as it stores.
+    Because a worker only knows the files it has seen, a background garbage
+    collector also walks the shards every gc_interval seconds (one worker on
+    the host at a time) and enforces the byte, file-count and age limits
+    against what is actually on disk. Last access is recorded in the file's
+    atime (at most once per ACCESS_RESOLUTION seconds), so the collector
+    evicts least recently used files first. The mtime is left alone: it is
+    what Last-Modified and conditional requests are built from.
+    """
+
+    def __init__(self, directory, max_bytes, max_files=None, max_age=None, gc_interval=0,
+                 extensions=AUDIO_EXTENSIONS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files  # None: no limit
+        self.max_age = max_age  # seconds since last access; None: no limit
+        self.gc_interval = gc_interval  # 0: no background collection
+        self.extensions = tuple(extensions)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.gc_runs = 0
+        self.last_gc = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (size in bytes, extension)
+        self._total_bytes = 0
+        self._gc_pid = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._migrate_flat_files()
+        if not gc_interval:
+            # No collector to build the index, so do it now
+            for _, key, size, ext in self._disk_entries():
+                self._entries[key] = (size, ext)
+                self._total_bytes += size
+
+    def _is_entry(self, name):
+        key, ext = os.path.splitext(name)
+        return ext in self.extensions and len(key) == 32
+
+    def _migrate_flat_files(self):
+        """Move entries from the old single-directory layout into their shards"""
+        for name in os.listdir(self.directory):
+            if self._is_entry(name):
+                key, ext = os.path.splitext(name)
+                try:
+                    self._place(os.path.join(self.directory, name), key, ext)
+                except FileNotFoundError:
+                    pass  # moved by another worker starting up
+
+    def _disk_entries(self):
+        """(last access, key, size, extension) of every cached file, oldest first"""
+        found = []
+        with os.scandir(self.directory) as shards:
+            shards = [shard.path for shard in shards
+                      if len(shard.name) == 2 and shard.is_dir() and not shard.name.startswith('.')]
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard))
+            except FileNotFoundError:
+                continue
+            for entry in files:
+                if not self._is_entry(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                key, ext = os.path.splitext(entry.name)
+                found.append((max(st.st_atime, st.st_mtime), key, st.st_size, ext))
+        found.sort()
+        return found
+
+    def path_for(self, key, extension):
+        """Location of the audio file for a cache key"""
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def tmp_path(self, extension):
+        """Unique temp file in the cache directory, for writing a new entry"""
+        return os.path.join(self.directory, f".tmp_{secrets.token_hex(8)}{extension}")
+
+    def _candidates(self, key):
+        """Paths the file for key may be at, the indexed one first"""
+        if key in self._entries:
+            return [self.path_for(key, self._entries[key][1])]
+        return [self.path_for(key, ext) for ext in self.extensions]
+
+    def lookup(self, *keys, count=True):
+        """
+        Return the path of the first cached key, or None
+
+        Counts a single hit or miss regardless of how many keys are tried
+        (or none with count=False, for re-checks after waiting on a lock).
+        """
+        self._ensure_collector()
+        now = time.time_ns()
+        with self._lock:
+            for key in keys:
+                for path in self._candidates(key):
+                    try:
+                        st = os.stat(path)
+                        if now - st.st_atime_ns > ACCESS_RESOLUTION * 10**9:
+                            os.utime(path, ns=(now, st.st_mtime_ns))
+                    except FileNotFoundError:
+                        continue
+                    size = st.st_size
+
+                    if key not in self._entries:
+                        # Written by another worker
+                        self._entries[key] = (size, os.path.splitext(path)[1])
+                        self._total_bytes += size
+                    self._entries.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return path
+
+                # Evicted by another worker
+                self._forget(key)
+
+            if count:
+                self.misses += 1
+            return None
+
+    def _place(self, source_path, key, extension):
+        path = self.path_for(key, extension)
+        if source_path != path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(source_path, path)
+        return path
+
+    def store(self, key, source_path):
+        """
+        Move a generated file into place (atomically) under its cache key
+
+        The cached file keeps source_path's extension, which must be one of
+        the cache's audio extensions. source_path should come from
+        tmp_path() so the move stays on one filesystem.
+        """
+        extension = os.path.splitext(source_path)[1]
+        if extension not in self.extensions:
+            raise ValueError(f"unsupported audio extension {extension!r}")
+        path = self._place(source_path, key, extension)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (size, extension)
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def _over_quota(self, total_bytes, files):
+        return (total_bytes > self.max_bytes
+                or (self.max_files is not None and files > self.max_files))
+
+    def _remove(self, key, extension):
+        try:
+            os.remove(self.path_for(key, extension))
+        except FileNotFoundError:
+            pass
+        self.evictions += 1
+
+    def _evict(self):
+        """Drop least recently used files until under the quotas"""
+        while self._over_quota(self._total_bytes, len(self._entries)) and len(self._entries) > 1:
+            key, (size, extension) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove(key, extension)
+
+    def _ensure_collector(self):
+        # Started lazily so each forked worker gets its own thread
+        if not self.gc_interval or self._gc_pid == os.getpid():
+            return
+        with self._lock:
+            if self._gc_pid == os.getpid():
+                return
+            self._gc_pid = os.getpid()
+        threading.Thread(target=self._collect_forever, name='audio-gc', daemon=True).start()
+
+    def _collect_forever(self):
+        while True:
+            try:
+                self.collect()
+            except OSError as e:
+                log.warning("Audio cache GC failed", error=str(e))
+            time.sleep(self.gc_interval)
+
+    def collect(self):
+        """
+        One garbage collection pass over the files on disk
+
+        Removes files not accessed within max_age, then the least recently
+        used ones until the byte and file-count quotas are met, plus temp
+        files left behind by crashed writes. Returns the number of files
+        removed, or None if another worker is already collecting.
+        """
+        lock_fd = self._gc_lock()
+        if lock_fd is False:
+            return None
+        try:
+            now = time.time()
+            entries = self._disk_entries()
+            total_bytes = sum(size for _, _, size, _ in entries)
+            files = len(entries)
+            kept = OrderedDict()
+            removed = 0
+
+            for accessed, key, size, ext in entries:
+                expired = self.max_age is not None and now - accessed > self.max_age
+                if expired or self._over_quota(total_bytes, files):
+                    self._remove(key, ext)
+                    total_bytes -= size
+                    files -= 1
+                    removed += 1
+                else:
+                    kept[key] = (size, ext)
+
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.startswith('.tmp_'):
+                    try:
+                        if now - os.path.getmtime(path) > STALE_TMP_AGE:
+                            os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+            with self._lock:
+                # Keep what this worker stored during the pass
+                for key, entry in self._entries.items():
+                    if key not in kept and os.path.exists(self.path_for(key, entry[1])):
+                        kept[key] = entry
+                self._entries = kept
+                self._total_bytes = sum(size for size, _ in kept.values())
+                self.gc_runs += 1
+                self.last_gc = {'at': now, 'removed': removed, 'files': len(kept),
+                                'bytes': self._total_bytes}
+            return removed
+        finally:
+            if lock_fd is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+
+    def _gc_lock(self):
+        """Host-wide collector lock: fd, None without fcntl, False if held elsewhere"""
+        if fcntl is None:
+            return None
+        fd = os.open(os.path.join(self.directory, '.gc.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        return fd
+
+    def stats(self):
+        """Hit/miss counters, current disk usage and the last GC pass"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_files': self.max_files,
+                'max_age': self.max_age,
+                'gc_interval': self.gc_interval,
+                'gc_runs': self.gc_runs,
+                'last_gc': self.last_gc,
+            }
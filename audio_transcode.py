@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Audio Transcoding
+Compressed, loudness-normalized variants of generated TTS audio (via ffmpeg)
+
+The rendered file (Hugging Face WAV or OpenAI MP3) stays in the audio cache
+as the master. Each format is produced from it once, with leading/trailing
+silence trimmed and loudness normalized, and cached under its own key. If
+ffmpeg is not installed, or a transcode fails, the master is served as is.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import subprocess
+
+FFMPEG = shutil.which(os.getenv('FFMPEG_BINARY', 'ffmpeg'))
+
+AUDIO_OPUS_BITRATE = os.getenv('AUDIO_OPUS_BITRATE', '24k')
+AUDIO_MP3_BITRATE = os.getenv('AUDIO_MP3_BITRATE', '48k')
+# Trim leading/trailing silence quieter than this (empty disables)
+AUDIO_SILENCE_THRESHOLD = os.getenv('AUDIO_SILENCE_THRESHOLD', '-50dB')
+# ffmpeg loudnorm target (empty disables)
+AUDIO_LOUDNORM = os.getenv('AUDIO_LOUDNORM', 'I=-16:TP=-1.5:LRA=11')
+TRANSCODE_TIMEOUT = float(os.getenv('TRANSCODE_TIMEOUT', 20))
+
+# Part of every variant's cache key; bump when the processing chain changes
+PROCESSING_VERSION = 'v1'
+
+FORMATS = {
+    'opus': {
+        'extension': '.opus',
+        'mimetype': 'audio/ogg',
+        'args': ['-c:a', 'libopus', '-b:a', AUDIO_OPUS_BITRATE, '-application', 'voip', '-f', 'ogg'],
+    },
+    'mp3': {
+        'extension': '.mp3',
+        'mimetype': 'audio/mpeg',
+        'args': ['-c:a', 'libmp3lame', '-b:a', AUDIO_MP3_BITRATE, '-f', 'mp3'],
+    },
+}
+
+MIMETYPES = {'.wav': 'audio/wav', '.mp3': 'audio/mpeg', '.opus': 'audio/ogg'}
+
+# So static files under /static/audio get the right Content-Type too
+for _extension, _mimetype in MIMETYPES.items():
+    mimetypes.add_type(_mimetype, _extension)
+
+
+class TranscodeError(Exception):
+    """ffmpeg failed or timed out"""
+
+
+def available():
+    """Whether ffmpeg was found"""
+    return FFMPEG is not None
+
+
+def mimetype_for(path):
+    return MIMETYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+
+
+def audio_filters():
+    """ffmpeg filter chain applied to every variant"""
+    filters = []
+    if AUDIO_SILENCE_THRESHOLD:
+        # Trim the start, then the end by trimming the reversed audio
+        trim = f'silenceremove=start_periods=1:start_threshold={AUDIO_SILENCE_THRESHOLD}'
+        filters += [trim, 'areverse', trim, 'areverse']
+    if AUDIO_LOUDNORM:
+        filters.append(f'loudnorm={AUDIO_LOUDNORM}')
+    return ','.join(filters)
+
+
+def variant_key(master_key, fmt):
+    """Cache key of a master's variant in fmt (changes with the settings)"""
+    raw = '\x1f'.join([master_key, fmt, ' '.join(FORMATS[fmt]['args']), audio_filters(),
+                       PROCESSING_VERSION])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def transcode(source_path, fmt, output_path):
+    """Write source_path to output_path as mono fmt, trimmed and normalized"""
+    if not available():
+        raise TranscodeError("ffmpeg not found")
+
+    cmd = [FFMPEG, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+           '-i', source_path, '-vn', '-ac', '1']
+    filters = audio_filters()
+    if filters:
+        cmd += ['-af', filters]
+    cmd += FORMATS[fmt]['args'] + [output_path]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        raise TranscodeError(e.stderr.decode('utf-8', 'replace').strip()[-300:] or f"exit {e.returncode}")
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"ffmpeg took longer than {TRANSCODE_TIMEOUT}s")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Batch Translator
+Bulk Shanghainese translation with packed GPT-4o requests
+
+Records are dicts with a "text", an optional "source" ("mandarin" or
+"english") and an optional "id". Identical inputs are translated once,
+inputs already in the translation cache are not sent at all, and the rest
+are packed several sentences per request (JSON structured output) and run
+on a bounded worker pool with jittered exponential backoff. A packed
+request whose replies keep coming back malformed is split in half so one
+bad sentence cannot sink its neighbours.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import OPENAI_CLIENT
+from logs import get_logger
+from metrics import track_upstream
+from prompts import TOKEN_USAGE
+
+log = get_logger('batch_translator')
+
+# Sentences per GPT-4o request, and a cap on their combined length
+BATCH_TRANSLATE_SIZE = int(os.getenv('BATCH_TRANSLATE_SIZE', 20))
+BATCH_TRANSLATE_MAX_CHARS = int(os.getenv('BATCH_TRANSLATE_MAX_CHARS', 4000))
+# Concurrent GPT-4o requests per batch run
+BATCH_TRANSLATE_WORKERS = int(os.getenv('BATCH_TRANSLATE_WORKERS', 8))
+# Attempts per request, and the base of the exponential backoff (seconds)
+BATCH_TRANSLATE_RETRIES = int(os.getenv('BATCH_TRANSLATE_RETRIES', 4))
+BATCH_TRANSLATE_BACKOFF = float(os.getenv('BATCH_TRANSLATE_BACKOFF', 1.0))
+BATCH_TRANSLATE_MAX_BACKOFF = 30.0
+
+BATCH_INSTRUCTIONS = """
+
+You will receive a JSON object whose "sentences" each have an "id" and a
+"text". Translate every sentence independently and return each id with its
+translation."""
+
+BATCH_SCHEMA = {
+    'name': 'translations',
+    'strict': True,
+    'schema': {
+        'type': 'object',
+        'properties': {
+            'translations': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'id': {'type': 'integer'},
+                        'translation': {'type': 'string'},
+                    },
+                    'required': ['id', 'translation'],
+                    'additionalProperties': False,
+                },
+            },
+        },
+        'required': ['translations'],
+        'additionalProperties': False,
+    },
+}
+
+
+class BatchFormatError(Exception):
+    """The model's reply did not contain one translation per sentence"""
+
+
+def parse_records(lines):
+    """
+    Parse JSONL input into records, numbering them by line
+
+    Each line is a JSON object ({"id", "text", "source"}) or a bare JSON
+    string. Raises ValueError with the line number for anything else.
+    """
+    records = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number}: not valid JSON")
+        if isinstance(record, str):
+            record = {'text': record}
+        if not isinstance(record, dict) or not isinstance(record.get('text'), str) or not record['text'].strip():
+            raise ValueError(f"line {number}: expected an object with a non-empty \"text\"")
+        if record.get('source', 'mandarin') not in ('mandarin', 'english'):
+            raise ValueError(f"line {number}: source must be \"mandarin\" or \"english\"")
+        record.setdefault('id', number)
+        record.setdefault('source', 'mandarin')
+        records.append(record)
+    return records
+
+
+def retryable(error):
+    """Rate limits, timeouts, 5xx and malformed replies are worth retrying"""
+    if isinstance(error, BatchFormatError):
+        return True
+    import openai
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError,
+                              openai.InternalServerError))
+
+
+class BatchTranslator:
+    """Translates many records with as few GPT-4o requests as possible"""
+
+    def __init__(self, cache, prompt, model,
+                 batch_size=BATCH_TRANSLATE_SIZE, workers=BATCH_TRANSLATE_WORKERS,
+                 retries=BATCH_TRANSLATE_RETRIES, executor=None):
+        self.cache = cache
+        self.prompt = prompt  # prompts.PromptTemplate
+        self.prompt_version = prompt.cache_version
+        # Packed requests extend the prompt, so they get their own cache
+        # version; single-request translations are reused on lookup
+        self.batch_prompt_version = f"{prompt.key}+batch"
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.retries = max(1, retries)
+        # Pool shared by every run (the web app's); None gives each run its own
+        self.executor = executor
+
+    def cached(self, text, source):
+        for version in (self.prompt_version, self.batch_prompt_version):
+            translation = self.cache.get(text, source, version, self.model, count=False)
+            if translation is not None:
+                return translation
+        return None
+
+    def run(self, records, on_record):
+        """
+        Translate records, calling on_record(result) once per record as
+        soon as its translation (or failure) is known
+
+        Results are the input record plus "translation" and "cached", or
+        plus "error". Returns a summary of the run.
+        """
+        if self.executor is not None:
+            summary, futures = self.submit(records, on_record)
+            for future in futures:
+                future.result()
+            return summary
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-translate') as pool:
+            summary, futures = self.submit(records, on_record, pool)
+            for future in futures:
+                future.result()
+        return summary
+
+    def submit(self, records, on_record, executor=None):
+        """
+        Start translating records on executor (the shared one by default)
+        without waiting; cached records are reported before it returns
+
+        Returns (summary, futures): one future per packed request, and the
+        summary, which is complete once every future is done.
+        """
+        pending = {}  # (text, source) -> records waiting for it
+        for record in records:
+            pending.setdefault((record['text'], record.get('source', 'mandarin')), []).append(record)
+
+        summary = {'records': len(records), 'distinct': len(pending), 'cached': 0,
+                   'translated': 0, 'failed': 0, 'requests': 0}
+        lock = threading.Lock()
+
+        def finish(key, translation=None, error=None, cached=False):
+            with lock:
+                for record in pending[key]:
+                    if error is None:
+                        on_record(dict(record, translation=translation, cached=cached))
+                    else:
+                        on_record(dict(record, error=error))
+                if error is not None:
+                    summary['failed'] += len(pending[key])
+                elif cached:
+                    summary['cached'] += len(pending[key])
+                else:
+                    summary['translated'] += len(pending[key])
+
+        todo = {}  # source -> distinct texts still to translate
+        for key in pending:
+            translation = self.cached(*key)
+            if translation is not None:
+                finish(key, translation, cached=True)
+            else:
+                todo.setdefault(key[1], []).append(key[0])
+
+        def work(source, texts):
+            for text, translation, error in self._translate_chunk(source, texts, summary, lock):
+                if error is None:
+                    self.cache.set(text, source, self.batch_prompt_version, self.model, translation)
+                finish((text, source), translation, error)
+
+        executor = executor or self.executor
+        futures = [executor.submit(work, source, chunk)
+                   for source, texts in todo.items()
+                   for chunk in self._chunks(texts)]
+        return summary, futures
+
+    def _chunks(self, texts):
+        """Split texts into packed requests by count and total length"""
+        chunk, size = [], 0
+        for text in texts:
+            if chunk and (len(chunk) >= self.batch_size or size + len(text) > BATCH_TRANSLATE_MAX_CHARS):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(text)
+            size += len(text)
+        if chunk:
+            yield chunk
+
+    def _translate_chunk(self, source, texts, summary, lock):
+        """(text, translation, error) for every text, retrying and splitting on failure"""
+        for attempt in range(self.retries):
+            try:
+                with lock:
+                    summary['requests'] += 1
+                translations = self._request(texts)
+                return [(text, translation, None) for text, translation in zip(texts, translations)]
+            except Exception as e:
+                error = e
+                if not retryable(e) or attempt == self.retries - 1:
+                    break
+                # Full jitter keeps the workers from retrying in lockstep
+                time.sleep(random.uniform(0, min(BATCH_TRANSLATE_MAX_BACKOFF,
+                                                 BATCH_TRANSLATE_BACKOFF * 2 ** attempt)))
+
+        # Only a bad reply is worth splitting; an outage would just multiply requests
+        if len(texts) > 1 and isinstance(error, BatchFormatError):
+            middle = len(texts) // 2
+            return (self._translate_chunk(source, texts[:middle], summary, lock)
+                    + self._translate_chunk(source, texts[middle:], summary, lock))
+        log.error("Batch translation failed", count=len(texts), error=str(error))
+        return [(text, None, str(error)) for text in texts]
+
+    def _request(self, texts):
+        """One packed GPT-4o request; returns translations in input order"""
+        # Retries are handled here, with backoff shared across the batch
+        client = OPENAI_CLIENT.get().with_options(max_retries=0)
+        sentences = [{'id': i, 'text': text} for i, text in enumerate(texts)]
+
+        with track_upstream('openai_chat'):
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.prompt.system + BATCH_INSTRUCTIONS},
+                    {"role": "user", "content": json.dumps({'sentences': sentences}, ensure_ascii=False)}
+                ],
+                response_format={'type': 'json_schema', 'json_schema': BATCH_SCHEMA}
+            )
+        TOKEN_USAGE.record(self.batch_prompt_version, response.usage)
+
+        try:
+            items = json.loads(response.choices[0].message.content)['translations']
+            by_id = {item['id']: item['translation'] for item in items}
+        except (TypeError, ValueError, KeyError) as e:
+            raise BatchFormatError(f"unreadable reply: {e}")
+        missing = [i for i in range(len(texts)) if not by_id.get(i)]
+        if missing:
+            raise BatchFormatError(f"{len(missing)} of {len(texts)} sentences missing from reply")
+        return [by_id[i] for i in range(len(texts))]
+
+
+def read_checkpoint(path):
+    """Ids already translated in a previous (interrupted) run's output file"""
+    done = set()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # last line cut off by the interruption
+                if isinstance(record, dict) and 'translation' in record:
+                    done.add(record.get('id'))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def translate_file(translator, input_path, output_path):
+    """
+    Translate a JSONL file into a JSONL file, resuming where a previous run
+    stopped
+
+    Successful results are appended and flushed as they complete, so the
+    output doubles as the checkpoint; failed records are left out and are
+    retried by the next run. Returns the run summary.
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        records = parse_records(f)
+
+    done = read_checkpoint(output_path)
+    todo = [record for record in records if record['id'] not in done]
+    print(f"📦 {len(records)} records, {len(records) - len(todo)} already done, {len(todo)} to translate")
+
+    # A cut-off last line would otherwise merge with the first new record
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    else:
+        needs_newline = False
+
+    progress = {'done': 0}
+    with open(output_path, 'a', encoding='utf-8') as out:
+        if needs_newline:
+            out.write('\n')
+
+        def write(result):
+            if 'translation' in result:
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                out.flush()
+            progress['done'] += 1
+            if progress['done'] % 100 == 0 or progress['done'] == len(todo):
+                print(f"   {progress['done']}/{len(todo)}")
+
+        summary = translator.run(todo, write)
+
+    summary['skipped'] = len(records) - len(todo)
+    return summary
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Batch TTS
+Pre-warms the audio cache for many texts within the backends' rate limits
+
+Usage:
+    python batch_tts.py --category greetings [--category numbers]
+    python batch_tts.py --all
+    python batch_tts.py --file texts.txt [--workers 8] [--spread]
+    python batch_tts.py 侬好 谢谢侬
+
+Each backend gets a token bucket (HF_TTS_RPM, OPENAI_TTS_RPM), so a large
+deck is paced to what the Hugging Face space and OpenAI accept instead of
+tripping their throttling. Texts already in the audio cache are skipped.
+By default every text goes to the router's preferred backend (normally the
+Shanghainese Hugging Face model) and only falls back on failure; --spread
+also sends work to whichever backend has capacity first.
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_cache import normalize_text
+from tts_router import MAX_SPEED, MIN_SPEED, TTS_ROUTER
+from web_app import (AUDIO_CACHE, AUDIO_RENDERERS, SINGLE_FLIGHT, VOCAB_STORE,
+                     audio_cache_keys)
+
+# Requests per minute each backend is allowed during a batch run
+HF_TTS_RPM = float(os.getenv('HF_TTS_RPM', 20))
+OPENAI_TTS_RPM = float(os.getenv('OPENAI_TTS_RPM', 50))
+BATCH_TTS_WORKERS = int(os.getenv('BATCH_TTS_WORKERS', 8))
+# Attempts per text, and the base of the jittered backoff between them (seconds)
+BATCH_TTS_RETRIES = int(os.getenv('BATCH_TTS_RETRIES', 3))
+BATCH_TTS_BACKOFF = float(os.getenv('BATCH_TTS_BACKOFF', 2.0))
+
+
+class TokenBucket:
+    """Allows rate_per_minute calls on average, with bursts of up to burst"""
+
+    def __init__(self, rate_per_minute, burst=None):
+        if not rate_per_minute > 0:
+            raise ValueError(f"rate_per_minute must be positive, not {rate_per_minute}")
+        self.rate = rate_per_minute / 60.0
+        # Default burst: five seconds' worth of calls
+        self.capacity = burst or max(1.0, self.rate * 5)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class BatchSynthesizer:
+    """Renders many texts into the audio cache across the TTS backends"""
+
+    def __init__(self, rates=None, workers=BATCH_TTS_WORKERS, retries=BATCH_TTS_RETRIES,
+                 spread=False, speed=1.0):
+        rates = rates or {'hf': HF_TTS_RPM, 'openai': OPENAI_TTS_RPM}
+        self.buckets = {name: TokenBucket(rate) for name, rate in rates.items()}
+        self.workers = max(1, workers)
+        self.retries = max(1, retries)
+        self.spread = spread
+        self.speed = speed
+        self._lock = threading.Lock()
+
+    def _acquire(self, candidates):
+        """Block until one of candidates (best first) may be called; return it"""
+        while True:
+            with self._lock:
+                wait, _, name = min((self.buckets[name].wait_time(), i, name)
+                                    for i, name in enumerate(candidates))
+                if wait <= 0:
+                    self.buckets[name].take()
+                    return name
+            time.sleep(min(wait, 1.0))
+
+    def synthesize(self, text):
+        """(path, backend) for one text; backend is 'cache' for a hit, path None on failure"""
+        hf_key, openai_key = audio_cache_keys(text, self.speed)
+        cached = AUDIO_CACHE.lookup(hf_key, openai_key)
+        if cached:
+            return cached, 'cache'
+
+        for attempt in range(self.retries):
+            order = [name for name in TTS_ROUTER.order() if name in self.buckets]
+            if not order:
+                # Every circuit is open: wait for the first probe instead of failing the text
+                time.sleep(max(TTS_ROUTER.retry_after(), 0.1))
+                continue
+            if self.spread:
+                candidates = order
+            else:
+                # Preferred backend first, the next one on each retry
+                candidates = [order[attempt % len(order)]]
+            backend = self._acquire(candidates)
+
+            key = hf_key if backend == 'hf' else openai_key
+            path = SINGLE_FLIGHT.do(f"audio-{backend}:{key}", AUDIO_RENDERERS[backend], text, self.speed)
+            if path:
+                return path, backend
+            if attempt < self.retries - 1:
+                time.sleep(random.uniform(0, BATCH_TTS_BACKOFF * 2 ** attempt))
+        return None, None
+
+    def run(self, texts, on_result=None):
+        """
+        Render every distinct text, calling on_result(text, path, backend)
+        as each finishes; returns a summary of the run
+        """
+        # Texts differing only in whitespace/width share a cache entry
+        distinct = {}
+        for text in texts:
+            if text.strip():
+                distinct.setdefault(normalize_text(text), text)
+        distinct = list(distinct.values())
+        summary = {'texts': len(distinct), 'cached': 0, 'rendered': {name: 0 for name in self.buckets},
+                   'failed': [], 'elapsed': 0.0}
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-tts') as pool:
+            futures = {pool.submit(self.synthesize, text): text for text in distinct}
+            for i, future in enumerate(as_completed(futures), 1):
+                text = futures[future]
+                path, backend = future.result()
+                if backend == 'cache':
+                    summary['cached'] += 1
+                elif path:
+                    summary['rendered'][backend] += 1
+                else:
+                    summary['failed'].append(text)
+
+                elapsed = time.monotonic() - start
+                eta = elapsed / i * (len(distinct) - i)
+                status = f"✅ {text} ({backend})" if path else f"❌ {text}"
+                print(f"  [{i}/{len(distinct)}] {status}  eta {eta:.0f}s")
+                if on_result:
+                    on_result(text, path, backend)
+
+        summary['elapsed'] = round(time.monotonic() - start, 1)
+        return summary
+
+
+def vocabulary_texts(categories=None):
+    """Shanghainese text of every word in the given categories (all if None)"""
+    vocab = VOCAB_STORE.current().vocab
+    texts = []
+    for category in categories or list(vocab):
+        if category not in vocab:
+            raise KeyError(category)
+        texts.extend(word['shanghainese'] for word in vocab[category])
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render TTS audio into the audio cache")
+    parser.add_argument('texts', nargs='*', help="Texts to render")
+    parser.add_argument('--category', action='append', default=[],
+                        help="Render a vocabulary category (repeatable)")
+    parser.add_argument('--all', action='store_true', help="Render the whole vocabulary")
+    parser.add_argument('--file', help="Render each non-empty line of a text file")
+    parser.add_argument('--workers', type=int, default=BATCH_TTS_WORKERS,
+                        help=f"Concurrent TTS calls (default {BATCH_TTS_WORKERS})")
+    parser.add_argument('--hf-rpm', type=float, default=HF_TTS_RPM,
+                        help=f"Hugging Face requests per minute (default {HF_TTS_RPM:g})")
+    parser.add_argument('--openai-rpm', type=float, default=OPENAI_TTS_RPM,
+                        help=f"OpenAI TTS requests per minute (default {OPENAI_TTS_RPM:g})")
+    parser.add_argument('--spread', action='store_true',
+                        help="Use any backend with spare capacity, not just the preferred one")
+    parser.add_argument('--speed', type=float, default=1.0, help="Speaking speed (default 1.0)")
+    args = parser.parse_args()
+
+    texts = list(args.texts)
+    try:
+        if args.all or args.category:
+            texts.extend(vocabulary_texts(None if args.all else args.category))
+    except KeyError as e:
+        parser.error(f"unknown category {e}")
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            texts.extend(line.strip() for line in f)
+    if not any(text.strip() for text in texts):
+        parser.error("nothing to render (give texts, --category, --all or --file)")
+    if not MIN_SPEED <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed must be between {MIN_SPEED} and {MAX_SPEED}")
+
+    try:
+        synthesizer = BatchSynthesizer(rates={'hf': args.hf_rpm, 'openai': args.openai_rpm},
+                                       workers=args.workers, spread=args.spread,
+                                       speed=round(args.speed, 2))
+    except ValueError as e:
+        parser.error(f"requests per minute: {e}")
+    summary = synthesizer.run(texts)
+
+    rendered = ', '.join(f"{count} {name}" for name, count in summary['rendered'].items())
+    print(f"\n✅ {summary['texts']} texts in {summary['elapsed']}s: {summary['cached']} cached, "
+          f"rendered {rendered}, {len(summary['failed'])} failed")
+    raise SystemExit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Load Benchmark
+Drives the web app at a fixed request rate against local stub upstreams
+
+Usage:
+    python bench_load.py [--rps 50] [--duration 30] [--mix translate=3,speak=2,quiz=1,vocabulary=4]
+                         [--upstream-latency 0.3] [--error-rate 0.02] [--json] [--output run.json]
+    python bench_load.py --compare baseline.json [...]
+
+The app runs in a separate process with its own working directory, so its
+translation cache, progress database and audio cache start empty and never
+touch the real ones. OpenAI is replaced by a stub server (through
+OPENAI_BASE_URL) that answers chat completions, streams and speech; the
+Hugging Face space by a stub TTS server behind a client with the same
+submit()/result() interface as gradio's. Both stubs add configurable
+latency and fail a configurable fraction of calls, so no API key is needed.
+
+Requests are sent open-loop: each one is scheduled at a fixed time and its
+latency is measured from that time, so a slow app shows up as latency
+instead of as a lower request rate. Reports throughput and p50/p95/p99 per
+route; --compare reports the change against an earlier --output file.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+VOCAB_FILE = os.path.join(REPO_DIR, 'shanghainese_vocab.json')
+
+DEFAULT_MIX = 'translate=3,speak=2,quiz=1,vocabulary=4'
+PERCENTILES = (50, 95, 99)
+
+# Seconds to wait for the app to import and answer
+APP_START_TIMEOUT = 60
+
+
+# ============================================================================
+# STUB UPSTREAMS
+# ============================================================================
+
+def silent_wav(seconds=0.5, rate=16000):
+    """A valid mono 16-bit WAV file, like the space returns"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b'\0\0' * int(seconds * rate))
+    return buffer.getvalue()
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server that delays every call and fails some of them"""
+
+    daemon_threads = True
+
+    def __init__(self, handler, latency, jitter, error_rate, speech):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.speech = speech
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def begin(self, path):
+        """Wait out the injected latency; True if this call should fail"""
+        with self._lock:
+            # Exponential tail on top of the base latency, like a real upstream
+            delay = self.latency + (self._rng.expovariate(1 / self.jitter) if self.jitter else 0)
+            failed = self._rng.random() < self.error_rate
+            counts = self.calls.setdefault(path, {'calls': 0, 'errors': 0})
+            counts['calls'] += 1
+            counts['errors'] += failed
+        time.sleep(delay)
+        return failed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self):
+        body = json.dumps({'error': {'message': 'Injected upstream error', 'type': 'server_error'}})
+        self.send_body(body.encode(), 'application/json', status=500)
+
+
+class OpenAIStubHandler(StubHandler):
+    """Chat completions (plain and streamed) and speech, with usage"""
+
+    def do_POST(self):
+        payload = self.read_json()
+        if self.server.begin(self.path):
+            self.send_error_json()
+        elif self.path == '/v1/chat/completions':
+            self.chat(payload)
+        elif self.path == '/v1/audio/speech':
+            self.send_body(self.server.speech, 'audio/mpeg')
+        else:
+            self.send_body(b'{}', 'application/json', status=404)
+
+    def chat(self, payload):
+        prompt = ''.join(str(message.get('content', '')) for message in payload.get('messages', []))
+        text = str(payload['messages'][-1].get('content', '')) if payload.get('messages') else ''
+        translation = f"侬{text}"
+        usage = {'prompt_tokens': len(prompt) // 2 + 1, 'completion_tokens': len(translation),
+                 'total_tokens': len(prompt) // 2 + 1 + len(translation),
+                 'prompt_tokens_details': {'cached_tokens': 0}}
+        base = {'id': 'chatcmpl-stub', 'created': int(time.time()), 'model': payload.get('model', 'stub')}
+
+        if not payload.get('stream'):
+            body = dict(base, object='chat.completion', usage=usage, choices=[{
+                'index': 0, 'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': translation}}])
+            self.send_body(json.dumps(body, ensure_ascii=False).encode(), 'application/json')
+            return
+
+        chunks = [dict(base, object='chat.completion.chunk', choices=[{
+            'index': 0, 'finish_reason': None, 'delta': {'content': char}}]) for char in translation]
+        chunks.append(dict(base, object='chat.completion.chunk', choices=[{
+            'index': 0, 'finish_reason': 'stop', 'delta': {}}]))
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            chunks.append(dict(base, object='chat.completion.chunk', choices=[], usage=usage))
+        body = ''.join(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n" for chunk in chunks)
+        self.send_body((body + "data: [DONE]\n\n").encode(), 'text/event-stream')
+
+
+class TTSStubHandler(StubHandler):
+    """Stand-in for the Hugging Face space: POST /synthesize returns a WAV file"""
+
+    def do_POST(self):
+        self.read_json()
+        if self.server.begin(self.path):
+            self.send_error_json()
+        else:
+            self.send_body(self.server.speech, 'audio/wav')
+
+
+class StubTTSJob:
+    """The part of gradio's Job used by tts_router: result(timeout) and cancel()"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        return self.future.cancel()
+
+
+class StubTTSClient:
+    """
+    gradio Client replacement that calls the stub TTS server
+
+    Speaking gradio's queue protocol to a fake space would tie the benchmark
+    to one gradio_client version, so the client is swapped instead; the
+    route, circuit breaker and cache code in the app run unchanged.
+    """
+
+    def __init__(self, url, workdir):
+        self.url = url
+        self.workdir = workdir
+        self.pool = ThreadPoolExecutor(max_workers=32)
+
+    def submit(self, text, *args, fn_index=None):
+        return StubTTSJob(self.pool.submit(self._predict, text))
+
+    def _predict(self, text):
+        host = self.url.split('://', 1)[1]
+        connection = http.client.HTTPConnection(host, timeout=60)
+        try:
+            connection.request('POST', '/synthesize', json.dumps({'text': text}),
+                               {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            body = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"stub TTS returned {response.status}")
+        fd, path = tempfile.mkstemp(suffix='.wav', dir=self.workdir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        return path
+
+
+# ============================================================================
+# APP UNDER TEST
+# ============================================================================
+
+def run_app(port, workdir, env, tts_url, verbose):
+    """Child process: serve web_app from workdir with stubbed upstreams"""
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    import clients
+    clients.HF_TTS_CLIENT.factory = lambda: StubTTSClient(tts_url, tempfile.mkdtemp(dir=workdir))
+    import web_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            if verbose:
+                super().log_request(*args, **kwargs)
+
+    make_server('127.0.0.1', port, web_app.app, threaded=True,
+                request_handler=QuietHandler).serve_forever()
+
+
+def free_port():
+    with ThreadingHTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler) as server:
+        return server.server_address[1]
+
+
+def start_app(workdir, openai_url, tts_url, verbose):
+    """Spawn the app and wait until it answers; returns (process, port)"""
+    os.symlink(VOCAB_FILE, os.path.join(workdir, os.path.basename(VOCAB_FILE)))
+    env = {
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_BASE_URL': f"{openai_url}/v1",
+        'HF_TTS_SPACE': tts_url,
+        'VOCAB_BINARY_FILE': os.path.join(workdir, 'shanghainese_vocab.bin'),
+        'VOCAB_RELOAD_INTERVAL': '0',
+        'FLASK_ENV': 'production',
+    }
+    if not verbose:
+        # The app logs JSON to stderr, and every stubbed failure would bury the report
+        env['LOG_LEVEL'] = 'CRITICAL'
+    port = free_port()
+    process = multiprocessing.get_context('spawn').Process(
+        target=run_app, args=(port, workdir, env, tts_url, verbose), daemon=True)
+    process.start()
+
+    deadline = time.monotonic() + APP_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError(f"app exited during startup (exit code {process.exitcode})")
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        try:
+            status, _ = request_once(connection, 'GET', '/vocabulary/version', None)
+            if status == 200:
+                return process, port
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"app did not answer within {APP_START_TIMEOUT}s")
+
+
+# ============================================================================
+# TRAFFIC
+# ============================================================================
+
+class Traffic:
+    """Builds the requests of each scenario from the vocabulary"""
+
+    def __init__(self, vocab, unique_ratio, seed):
+        self.categories = list(vocab)
+        self.words = [word for words in vocab.values() for word in words]
+        self.unique_ratio = unique_ratio
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def text(self, field):
+        """A vocabulary text, made unique (an upstream call) unique_ratio of the time"""
+        text = self.rng.choice(self.words)[field]
+        if self.rng.random() < self.unique_ratio:
+            self.counter += 1
+            text = f"{text}{self.counter}"
+        return text
+
+    def translate(self):
+        return 'POST', '/translate', {'text': self.text('mandarin'), 'source': 'mandarin'}
+
+    def translate_stream(self):
+        return 'POST', '/translate/stream', {'text': self.text('mandarin'), 'source': 'mandarin'}
+
+    def speak(self):
+        return 'POST', '/speak', {'text': self.text('shanghainese')}
+
+    def quiz(self):
+        return 'POST', '/quiz/generate', {'num_questions': 5}
+
+    def vocabulary(self):
+        return 'GET', f"/vocabulary/{self.rng.choice(self.categories)}", None
+
+    def flashcards(self):
+        return 'GET', f"/flashcards/{self.rng.choice(self.categories)}", None
+
+    def search(self):
+        return 'GET', f"/vocabulary/search?q={self.rng.choice(self.words)['english'].split()[0]}", None
+
+
+SCENARIOS = ['translate', 'translate_stream', 'speak', 'quiz', 'vocabulary', 'flashcards', 'search']
+
+
+def parse_mix(mix):
+    """'translate=3,speak=2' -> {'translate': 3.0, 'speak': 2.0}"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def request_once(connection, method, path, body):
+    """(status, response bytes) over a keep-alive connection"""
+    headers = {'Accept-Encoding': 'gzip'}
+    if body is not None:
+        body = json.dumps(body, ensure_ascii=False).encode()
+        headers['Content-Type'] = 'application/json'
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def run_load(port, traffic, weights, rps, duration, warmup, max_in_flight):
+    """Send requests at rps for warmup + duration seconds; returns the samples after warmup"""
+    local = threading.local()
+    samples = []
+    lock = threading.Lock()
+    names, shares = list(weights), list(weights.values())
+
+    def send(name, method, path, body, scheduled, measured):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        started = time.perf_counter()
+        try:
+            status, _ = request_once(connection, method, path, body)
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            local.connection = None
+            status = None
+        done = time.perf_counter()
+        if measured:
+            with lock:
+                samples.append((name, status, done - scheduled, done - started, done))
+
+    total = int((warmup + duration) * rps)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = traffic.rng.choices(names, shares)[0]
+            method, path, body = getattr(traffic, name)()
+            pool.submit(send, name, method, path, body, scheduled, i >= warmup * rps)
+    return samples
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples):
+    """Throughput, error rate and latency percentiles (ms), per route and overall"""
+    if not samples:
+        return {}
+    # From the first scheduled send to the last response
+    first_scheduled = min(sample[4] - sample[2] for sample in samples)
+    span = max(max(sample[4] for sample in samples) - first_scheduled, 1e-9)
+
+    groups = {'all': samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+
+    routes = {}
+    for name, group in groups.items():
+        latencies = sorted(sample[2] for sample in group)
+        errors = sum(1 for sample in group if sample[1] is None or sample[1] >= 400)
+        result = {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': round(errors / len(group), 4),
+            'throughput_rps': round(len(group) / span, 1),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            'service_p50_ms': round(percentile(sorted(s[3] for s in group), 50) * 1000, 1),
+        }
+        for p in PERCENTILES:
+            result[f'p{p}_ms'] = round(percentile(latencies, p) * 1000, 1)
+        routes[name] = result
+    return routes
+
+
+def app_stats(port):
+    """The app's own cache and upstream statistics after the run"""
+    stats = {}
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    for path in ('/translate/stats', '/speak/stats'):
+        try:
+            status, body = request_once(connection, 'GET', path, None)
+            if status == 200:
+                stats[path] = json.loads(body)
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+    connection.close()
+    return stats
+
+
+def compare(results, baseline):
+    """Lines comparing each route's percentiles with a baseline run"""
+    lines = []
+    for name, result in results['routes'].items():
+        base = baseline.get('routes', {}).get(name)
+        if not base:
+            continue
+        changes = []
+        for key in [f'p{p}_ms' for p in PERCENTILES] + ['throughput_rps']:
+            before, after = base.get(key), result[key]
+            if before:
+                changes.append(f"{key} {before} -> {after} ({(after - before) / before:+.0%})")
+        lines.append(f"   {name:18s} " + ', '.join(changes))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the web app against stub upstreams")
+    parser.add_argument('--rps', type=float, default=50, help="Requests per second (default 50)")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds (default 30)")
+    parser.add_argument('--warmup', type=float, default=5, help="Unmeasured seconds first (default 5)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Scenario weights (default {DEFAULT_MIX}; also "
+                             f"{', '.join(s for s in SCENARIOS if s not in DEFAULT_MIX)})")
+    parser.add_argument('--unique-ratio', type=float, default=0.2,
+                        help="Share of translate/speak texts not in any cache (default 0.2)")
+    parser.add_argument('--max-in-flight', type=int, default=128,
+                        help="Most concurrent requests (default 128)")
+    parser.add_argument('--upstream-latency', type=float, default=0.3,
+                        help="Base latency of every stub call in seconds (default 0.3)")
+    parser.add_argument('--upstream-jitter', type=float, default=0.1,
+                        help="Mean of the random extra latency in seconds (default 0.1)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Share of stub calls that fail with a 500 (default 0)")
+    parser.add_argument('--tts-latency', type=float,
+                        help="Base latency of the TTS stub (default --upstream-latency)")
+    parser.add_argument('--tts-error-rate', type=float,
+                        help="Error rate of the TTS stub (default --error-rate)")
+    parser.add_argument('--seed', type=int, default=0, help="Traffic random seed (default 0)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    parser.add_argument('--compare', help="Results file of an earlier run to compare with")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own output and logs")
+    args = parser.parse_args()
+
+    with open(VOCAB_FILE, encoding='utf-8') as f:
+        vocab = json.load(f)
+    speech = silent_wav()
+
+    openai_stub = StubServer(OpenAIStubHandler, args.upstream_latency, args.upstream_jitter,
+                             args.error_rate, speech).start()
+    tts_stub = StubServer(TTSStubHandler,
+                          args.upstream_latency if args.tts_latency is None else args.tts_latency,
+                          args.upstream_jitter,
+                          args.error_rate if args.tts_error_rate is None else args.tts_error_rate,
+                          speech).start()
+
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    process = None
+    try:
+        process, port = start_app(workdir, openai_stub.url, tts_stub.url, args.verbose)
+        if not args.json:
+            print(f"🚀 Sending {args.rps:g} req/s for {args.warmup:g}s warmup + {args.duration:g}s "
+                  f"({', '.join(f'{k}={v:g}' for k, v in args.mix.items())})")
+        samples = run_load(port, Traffic(vocab, args.unique_ratio, args.seed), args.mix, args.rps,
+                           args.duration, args.warmup, args.max_in_flight)
+        results = {
+            'config': {key: value for key, value in vars(args).items()
+                       if key not in ('json', 'output', 'compare', 'verbose')},
+            'routes': summarize(samples),
+            'upstream': {'openai': openai_stub.calls, 'tts': tts_stub.calls},
+            'app': app_stats(port),
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join(5)
+        openai_stub.shutdown()
+        tts_stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print(f"\n{'route':18s} {'requests':>8s} {'req/s':>7s} {'errors':>7s} "
+              f"{'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+        for name, r in results['routes'].items():
+            print(f"{name:18s} {r['requests']:8d} {r['throughput_rps']:7.1f} {r['error_rate']:7.1%} "
+                  f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['max_ms']:8.1f}")
+        for backend, calls in results['upstream'].items():
+            for path, counts in calls.items():
+                print(f"🔌 {backend} {path}: {counts['calls']} calls, {counts['errors']} injected errors")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare}:", file=sys.stderr if args.json else sys.stdout)
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr if args.json else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
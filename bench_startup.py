@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures the import cost of the app's entry points in fresh interpreters
+
+Usage:
+    python bench_startup.py [--runs 5] [--top 15] [--json]
+
+Each module is imported in a new `python -X importtime` process, so every
+run is a true cold start (apart from the OS page cache). Reports the median
+wall-clock import time per entry point and the cost of each of its direct
+imports.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = ['web_app', 'asgi_app', 'shanghainese_learning_app', 'clients',
+                'tts_router', 'openai', 'gradio_client']
+
+
+def import_once(module):
+    """(wall seconds, {direct import: cumulative microseconds}) for one cold import"""
+    code = ("import time; start = time.perf_counter(); "
+            f"import {module}; "
+            "print(time.perf_counter() - start)")
+    env = dict(os.environ, VOCAB_RELOAD_INTERVAL='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Lines are "import time: self [us] | cumulative | name", children before
+    # their parent and indented two spaces per level
+    packages = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            top = name.split('.')[0]
+            children[top] = children.get(top, 0) + int(cumulative)
+        elif depth == 0:
+            if name == module:
+                packages = dict(children)
+                packages[f'{module} (own code)'] = int(self_us)
+            children = {}
+
+    wall = float(result.stdout.strip().splitlines()[-1])
+    return wall, packages
+
+
+def measure(module, runs):
+    walls = []
+    packages = {}
+    for _ in range(runs):
+        wall, run_packages = import_once(module)
+        walls.append(wall)
+        for name, us in run_packages.items():
+            packages.setdefault(name, []).append(us)
+    return {
+        'median_ms': round(statistics.median(walls) * 1000, 1),
+        'min_ms': round(min(walls) * 1000, 1),
+        'max_ms': round(max(walls) * 1000, 1),
+        'packages_ms': {
+            name: round(statistics.median(values) / 1000, 1)
+            for name, values in sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import cost per module")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS,
+                        help="Modules to import (default: the app's entry points)")
+    parser.add_argument('--runs', type=int, default=5, help="Cold imports per module (default 5)")
+    parser.add_argument('--top', type=int, default=15, help="Packages to list per module (default 15)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        try:
+            results[module] = measure(module, max(1, args.runs))
+        except RuntimeError as e:
+            results[module] = {'error': str(e)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for module, result in results.items():
+        if 'error' in result:
+            print(f"❌ {module}: {result['error']}")
+            continue
+        print(f"\n⏱️  {module}: {result['median_ms']} ms median "
+              f"({result['min_ms']}-{result['max_ms']} ms over {args.runs} runs)")
+        for name, ms in list(result['packages_ms'].items())[:args.top]:
+            print(f"   {ms:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
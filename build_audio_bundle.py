@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Vocabulary Audio Bundle Builder
+Pre-renders audio for every vocabulary entry and writes a manifest
+
+Usage:
+    python build_audio_bundle.py [--concurrency 4] [--force] [--format mp3]
+
+Rendering is paced by the per-backend rate limits of batch_tts.py. The web
+app picks up the manifest and returns each word's static audio URL inline,
+so playing a vocabulary word never calls a TTS backend.
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+from audio_cache import AUDIO_EXTENSIONS
+from audio_transcode import FORMATS
+from batch_tts import BatchSynthesizer
+from web_app import (AUDIO_DEFAULT_FORMAT, VOCAB_AUDIO_DIR, VOCAB_STORE, VOCAB_AUDIO_MANIFEST,
+                     audio_variant)
+
+
+def load_manifest():
+    """Load the existing manifest so unchanged entries are not rebuilt"""
+    try:
+        with open(VOCAB_AUDIO_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f).get('entries', {})
+    except FileNotFoundError:
+        return {}
+
+
+def bundle(audio_file, fmt=None):
+    """Copy a rendered file (transcoded to fmt if possible) into the bundle directory; return its URL"""
+    audio_file = audio_variant(audio_file, fmt)
+    bundle_file = os.path.join(VOCAB_AUDIO_DIR, os.path.basename(audio_file))
+    if not os.path.exists(bundle_file):
+        shutil.copy(audio_file, bundle_file)
+    return f'/{bundle_file}'
+
+
+def build(concurrency=4, force=False, fmt=AUDIO_DEFAULT_FORMAT):
+    """Render every distinct shanghainese field in the vocabulary"""
+    os.makedirs(VOCAB_AUDIO_DIR, exist_ok=True)
+
+    vocab = VOCAB_STORE.current().vocab
+    texts = sorted({word['shanghainese'] for words in vocab.values() for word in words})
+    entries = {} if force else load_manifest()
+
+    # Keep existing entries whose file is still on disk and in the wanted
+    # format (others are re-bundled, usually straight from the audio cache)
+    wanted = FORMATS[fmt]['extension'] if fmt else None
+    entries = {
+        text: url for text, url in entries.items()
+        if text in texts and os.path.exists(url.lstrip('/'))
+        and (wanted is None or url.endswith(wanted))
+    }
+    todo = [text for text in texts if text not in entries]
+
+    print(f"📚 {len(texts)} vocabulary entries, {len(todo)} to render")
+
+    def on_result(text, audio_file, backend):
+        if audio_file:
+            entries[text] = bundle(audio_file, fmt)
+
+    # Paced by the per-backend rate limits (HF_TTS_RPM, OPENAI_TTS_RPM)
+    failed = BatchSynthesizer(workers=concurrency).run(todo, on_result)['failed']
+
+    # Remove bundle files no longer referenced by the manifest
+    referenced = {os.path.basename(url) for url in entries.values()}
+    for name in os.listdir(VOCAB_AUDIO_DIR):
+        if os.path.splitext(name)[1] in AUDIO_EXTENSIONS and name not in referenced:
+            os.remove(os.path.join(VOCAB_AUDIO_DIR, name))
+
+    manifest = {
+        'generated': datetime.now().isoformat(),
+        'entries': dict(sorted(entries.items())),
+    }
+    tmp_file = VOCAB_AUDIO_MANIFEST + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, VOCAB_AUDIO_MANIFEST)
+
+    print(f"\n✅ Manifest written: {VOCAB_AUDIO_MANIFEST} ({len(entries)} entries)")
+    if failed:
+        print(f"⚠️  {len(failed)} entries failed, run again to retry")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render vocabulary audio")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="Maximum parallel TTS calls (default 4)")
+    parser.add_argument('--force', action='store_true',
+                        help="Re-render every entry, ignoring the existing manifest")
+    parser.add_argument('--format', choices=list(FORMATS) + ['original'], default=AUDIO_DEFAULT_FORMAT,
+                        help=f"Bundle format, if ffmpeg is available (default {AUDIO_DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    fmt = None if args.format == 'original' else args.format
+    ok = build(concurrency=max(1, args.concurrency), force=args.force, fmt=fmt)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
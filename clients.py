@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Client Registry
+Long-lived OpenAI and gradio clients shared by the web app and the CLI
+
+The openai and gradio_client packages are only imported when a client is
+first built, so workers that never translate or speak (and CLI sessions
+that only browse vocabulary) do not pay for them at startup.
+"""
+
+import os
+import threading
+import time
+
+from logs import get_logger
+
+log = get_logger('clients')
+
+HF_TTS_SPACE = os.getenv('HF_TTS_SPACE', 'CjangCjengh/Shanghainese-TTS')
+
+# Rebuild a client after this many consecutive failed calls
+CLIENT_MAX_FAILURES = int(os.getenv('CLIENT_MAX_FAILURES', 3))
+# Seconds between health checks of a cached client
+CLIENT_HEALTH_INTERVAL = int(os.getenv('CLIENT_HEALTH_INTERVAL', 60))
+
+
+class MissingAPIKey(RuntimeError):
+    """Raised when an OpenAI client is needed but OPENAI_API_KEY is not set"""
+
+
+def openai_configured():
+    return bool(os.getenv('OPENAI_API_KEY'))
+
+
+class ClientRegistry:
+    """
+    Lazily builds one client per worker process and reuses it
+
+    The client is rebuilt when its health check fails, after
+    CLIENT_MAX_FAILURES consecutive failures reported by callers, or when
+    the process has forked (each gunicorn worker gets its own connections).
+    Building happens outside the state lock, one build at a time, so a slow
+    build does not block failure reports or stats.
+    """
+
+    def __init__(self, name, factory, health_check=None):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.builds = 0
+        self._client = None
+        self._pid = None
+        self._failures = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()  # guards the fields above
+        self._build_lock = threading.Lock()  # held while the factory runs
+
+    def get(self):
+        """Return the shared client, building it on first use"""
+        client = self._current()
+        if client is not None:
+            return client
+        with self._build_lock:
+            # Another thread may have built it while this one waited
+            client = self._current()
+            if client is not None:
+                return client
+            client = self.factory()
+            with self._lock:
+                self._client = client
+                self._pid = os.getpid()
+                self._failures = 0
+                self._checked_at = time.monotonic()
+                self.builds += 1
+            return client
+
+    def _current(self):
+        """The cached client if this process built it and it is healthy, else None"""
+        with self._lock:
+            client = self._client
+            if client is None or self._pid != os.getpid():
+                return None
+            now = time.monotonic()
+            if self.health_check is None or now - self._checked_at < CLIENT_HEALTH_INTERVAL:
+                return client
+            self._checked_at = now
+
+        if self._healthy(client):
+            return client
+        log.warning("Client failed health check, rebuilding", client=self.name)
+        with self._lock:
+            if self._client is client:
+                self._client = None
+        return None
+
+    def _healthy(self, client):
+        try:
+            return bool(self.health_check(client))
+        except Exception:
+            return False
+
+    def report_success(self):
+        """Reset the failure count after a successful call"""
+        self._failures = 0
+
+    def report_failure(self):
+        """Count a failed call and drop the client once it looks broken"""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= CLIENT_MAX_FAILURES:
+                self._client = None
+                self._failures = 0
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        with self._lock:
+            self._client = None
+
+    def stats(self):
+        return {
+            'built': self._client is not None,
+            'builds': self.builds,
+            'consecutive_failures': self._failures,
+        }
+
+
+def _openai_api_key():
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise MissingAPIKey("OPENAI_API_KEY not found in environment variables "
+                            "(create a .env file, see .env.example)")
+    return api_key
+
+
+def _build_openai():
+    import openai
+    return openai.OpenAI(api_key=_openai_api_key())
+
+
+def _build_async_openai():
+    import openai
+    return openai.AsyncOpenAI(api_key=_openai_api_key())
+
+
+def _build_hf_tts():
+    from gradio_client import Client
+    # Fetches the space config once; later predict() calls reuse it
+    return Client(HF_TTS_SPACE, verbose=False)
+
+
+def _hf_tts_connected(client):
+    """The gradio client's heartbeat stream to the space is still open
+
+    Its thread ends on a connection error (the space restarted or went to
+    sleep), after which the client's session is stale. Checking costs no request.
+    """
+    return client.heartbeat.is_alive()
+
+
+OPENAI_CLIENT = ClientRegistry('OpenAI', _build_openai,
+                               health_check=lambda client: not client.is_closed())
+ASYNC_OPENAI_CLIENT = ClientRegistry('Async OpenAI', _build_async_openai,
+                                     health_check=lambda client: not client.is_closed())
+HF_TTS_CLIENT = ClientRegistry('Hugging Face TTS', _build_hf_tts, health_check=_hf_tts_connected)
+
+
+def get_openai_client():
+    """Shared OpenAI client (keeps its HTTP connection pool alive)"""
+    return OPENAI_CLIENT.get()
+
+
+def get_hf_tts_client():
+    """Shared gradio client for the Shanghainese TTS space"""
+    return HF_TTS_CLIENT.get()
+
+
+def client_stats():
+    return {
+        'openai': OPENAI_CLIENT.stats(),
+        'async_openai': ASYNC_OPENAI_CLIENT.stats(),
+        'hf_tts': HF_TTS_CLIENT.stats(),
+    }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Logging
+Structured, non-blocking logging for the web app
+
+Records carry key/value fields and are written as one JSON object per line
+(or plain text with LOG_FORMAT=text). Request threads only put records on
+a queue; a listener thread per process formats and writes them, so a slow
+terminal or log pipe never delays a response.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# json or text
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+LOGGER_PREFIX = 'shanghainese'
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = ' '.join(f"{key}={value}" for key, value in getattr(record, 'fields', {}).items())
+        line = (f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:7s} "
+                f"{record.name}: {record.getMessage()}" + (f" {fields}" if fields else ''))
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class Logger:
+    """logging.Logger with key/value fields: log.info("Audio saved", path=path)"""
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"{LOGGER_PREFIX}.{name}")
+
+    def _log(self, level, msg, fields, exc_info=False):
+        # Skip building the record at all for disabled levels
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+class InProcessQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; the listener thread does all the formatting"""
+
+    def prepare(self, record):
+        # Only fix the message now, in case the arguments change later
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def get_logger(name):
+    return Logger(name)
+
+
+_listener = None
+
+
+def _start_listener(log_queue, handler):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send the app's log records through a queue to stderr (once per process)"""
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(TextFormatter() if fmt == 'text' else JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger(LOGGER_PREFIX)
+    root.setLevel(level)
+    root.addHandler(InProcessQueueHandler(log_queue))
+    root.propagate = False
+
+    _start_listener(log_queue, handler)
+    # The listener thread does not survive a fork (gunicorn workers): start one per child
+    os.register_at_fork(after_in_child=lambda: _start_listener(log_queue, handler))
+    atexit.register(lambda: _listener.stop())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Counters, gauges and histograms served in the Prometheus text format
+
+Request and upstream timings are recorded as they happen; numbers the app
+already keeps (cache hit counts, token usage, circuit states) are read by
+collectors only when /metrics is scraped, so they cost nothing per request.
+Values are per worker process: with several gunicorn workers, each scrape
+sees the worker that answered it.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with one value per combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            lines.append(f"{name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]  # per-bucket, count, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            states = [(key, list(counts), count, total) for key, (counts, count, total) in self._values.items()]
+        names = self.labelnames + ('le',)
+        for key, counts, count, total in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(names, key + (format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(names, key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+        return lines
+
+
+class Registry:
+    """Metrics of this process, plus collectors called at scrape time"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """
+        Register collect(), called on every scrape, which returns metrics
+        built from numbers kept elsewhere (see snapshot())
+        """
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            try:
+                for metric in collect():
+                    lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# collector {collect.__name__} failed: {escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+def snapshot(kind, name, documentation, labelnames, values):
+    """A one-off metric for a collector: values is {label values tuple: value}"""
+    metric = (Counter if kind == 'counter' else Gauge)(name, documentation, labelnames)
+    metric._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+    return metric
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'http_requests_total', "HTTP requests by route, method and status", ('route', 'method', 'status'))
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', "Time until the response headers, by route", ('route', 'method'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', "Requests being handled, by route", ('route',))
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'upstream_request_duration_seconds', "Upstream API calls by backend and outcome",
+    ('backend', 'outcome'))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    'upstream_requests_in_flight', "Upstream API calls in progress, by backend", ('backend',))
+FALLBACKS = REGISTRY.counter(
+    'tts_fallbacks_total', "Speech requests handed to a lower-preference backend", ('backend',))
+PROCESS_START = REGISTRY.gauge('process_start_time_seconds', "Unix time this worker started")
+PROCESS_START.set(time.time())
+
+
+@contextmanager
+def track_upstream(backend):
+    """Time one upstream call (outcome ok, error or cancelled) and count it as in flight"""
+    UPSTREAM_IN_FLIGHT.inc(backend=backend)
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    except GeneratorExit:
+        # A streaming caller stopped reading
+        outcome = 'cancelled'
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(backend=backend)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, backend=backend, outcome=outcome)
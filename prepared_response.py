@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Prepared Responses
+Read-only responses serialized and compressed once, served with ETags
+
+Used for data that only changes with the vocabulary version: the body is
+built once per snapshot, gzip (and brotli, when the brotli package is
+installed) variants are compressed up front, and each request just picks a
+variant from memory, or answers 304 Not Modified when the client already
+has it.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Browser cache lifetime of vocabulary responses (seconds); afterwards they
+# are revalidated with their ETag, which is cheap
+VOCAB_CACHE_MAX_AGE = int(os.getenv('VOCAB_CACHE_MAX_AGE', 60))
+
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+
+class PreparedResponse:
+    """One immutable response body in every encoding, with a strong ETag per encoding"""
+
+    def __init__(self, body, mimetype='application/json', max_age=VOCAB_CACHE_MAX_AGE):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.max_age = max_age
+
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        self.variants = {'identity': (body, digest)}  # encoding -> (body, etag)
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants['gzip'] = (gzip.compress(body, 9, mtime=0), f"{digest}-gzip")
+            if brotli is not None:
+                self.variants['br'] = (brotli.compress(body, quality=11), f"{digest}-br")
+
+    @classmethod
+    def json(cls, payload, **kwargs):
+        return cls(json.dumps(payload, ensure_ascii=False, separators=(',', ':')), **kwargs)
+
+    def encoding_for(self, accept_encodings):
+        """Best encoding the client accepts (br, then gzip, then none)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    def serve(self, request):
+        """Response for request: the matching variant, or 304 if the client has the body"""
+        encoding = self.encoding_for(request.accept_encodings)
+        body, etag = self.variants[encoding]
+
+        # Any variant's ETag means the client already has this body
+        if any(request.if_none_match.contains_weak(tag) for _, tag in self.variants.values()):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return {encoding: len(body) for encoding, (body, _) in self.variants.items()}
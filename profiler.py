@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Sampling Profiler
+Shows where a live worker spends its time, as flame graph input
+
+For a given number of seconds, a background thread samples the stack of
+every thread in the process at a fixed interval and counts identical
+stacks. The result is in the folded format ("thread;outer;inner count")
+read by flamegraph.pl, speedscope and inferno. This is wall-clock time,
+so threads waiting on an upstream call show up as well as busy ones.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Longest capture accepted (seconds)
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+# Seconds between samples (per capture: ?interval= on /admin/profile)
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """One capture at a time; the last result is kept until the next one starts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.counts = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0.0
+        self.interval = PROFILE_INTERVAL
+
+    def start(self, seconds, interval=PROFILE_INTERVAL):
+        """Begin a capture in the background; False if one is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            self.counts = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+            self.interval = max(interval, 0.001)
+        threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+        return True
+
+    def wait(self):
+        """Block until the running capture has finished"""
+        while self.running:
+            time.sleep(0.05)
+
+    def _run(self):
+        own = threading.get_ident()
+        counts = Counter()
+        samples = 0
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        try:
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                if frames.keys() - names.keys():
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    counts[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(self.interval)
+        finally:
+            with self._lock:
+                self.counts = counts
+                self.samples = samples
+                self.running = False
+
+    def folded(self):
+        """The last capture in folded-stack format, heaviest stacks first"""
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'started_at': self.started_at,
+                'seconds': self.seconds,
+                'interval': self.interval,
+                'samples': self.samples,
+                'stacks': len(self.counts),
+                'pid': os.getpid(),
+            }
+
+
+PROFILER = SamplingProfiler()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Progress Store
+Per-learner progress in SQLite, shared by the CLI and the web app
+
+Learned words are a set (one row per learner and word), quiz answers and
+session results are appended as events, and running totals are updated in
+the same transaction, so recording anything is a couple of row writes
+instead of rewriting a whole progress file. Old answer events are compacted
+away periodically; the totals keep counting them.
+
+Flashcard scheduling state (see srs.py) is kept per learner and card; the
+(learner, due) index is the review queue, so the next due cards are read
+in index order without sorting the deck.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from srs import CardState
+
+PROGRESS_DB = os.getenv('PROGRESS_DB', 'learning_progress.db')
+# Most recent answer events kept per learner by compaction
+PROGRESS_KEEP_EVENTS = int(os.getenv('PROGRESS_KEEP_EVENTS', 1000))
+# Compact after this many writes (per process)
+PROGRESS_COMPACT_EVERY = int(os.getenv('PROGRESS_COMPACT_EVERY', 1000))
+
+SESSION_KINDS = ('quiz', 'flashcards')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS learned (
+    learner TEXT NOT NULL,
+    word TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (learner, word)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS learned_recent ON learned (learner, created);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    learner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    word TEXT,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_learner ON events (learner, kind, id);
+
+CREATE TABLE IF NOT EXISTS cards (
+    learner TEXT NOT NULL,
+    word TEXT NOT NULL,
+    category TEXT,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    PRIMARY KEY (learner, word)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cards_due ON cards (learner, due);
+CREATE INDEX IF NOT EXISTS cards_category_due ON cards (learner, category, due);
+
+CREATE TABLE IF NOT EXISTS totals (
+    learner TEXT PRIMARY KEY,
+    words_learned INTEGER NOT NULL DEFAULT 0,
+    answers INTEGER NOT NULL DEFAULT 0,
+    correct_answers INTEGER NOT NULL DEFAULT 0,
+    quizzes INTEGER NOT NULL DEFAULT 0,
+    study_sessions INTEGER NOT NULL DEFAULT 0,
+    last_session REAL
+);
+"""
+
+
+class ProgressStore:
+    """
+    Learning progress of any number of learners (CLI user, web sessions)
+
+    SQLite in WAL mode lets every web worker read while one writes; each
+    write is a short transaction, so concurrent learners only ever wait for
+    a few row updates.
+    """
+
+    def __init__(self, db_path=PROGRESS_DB, keep_events=PROGRESS_KEEP_EVENTS,
+                 compact_every=PROGRESS_COMPACT_EVERY):
+        self.db_path = db_path
+        self.keep_events = keep_events
+        self.compact_every = compact_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connect(self):
+        """One SQLite connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def learner(self, learner_id):
+        """Progress of one learner"""
+        return Learner(self, learner_id)
+
+    def _write(self, learner, statements):
+        """Run (sql, params) statements in one transaction, after creating the totals row"""
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO totals (learner) VALUES (?)", (learner,))
+            results = [conn.execute(sql, params).rowcount for sql, params in statements]
+
+        with self._lock:
+            self._writes += 1
+            compact = self.compact_every and self._writes % self.compact_every == 0
+        if compact:
+            self.compact(learner)
+        return results
+
+    def mark_learned(self, learner, word, when=None):
+        """Add word to the learner's learned set; True if it was new"""
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO totals (learner) VALUES (?)", (learner,))
+            added = conn.execute(
+                "INSERT OR IGNORE INTO learned (learner, word, created) VALUES (?, ?, ?)",
+                (learner, word, when or time.time())).rowcount
+            if added:
+                conn.execute("UPDATE totals SET words_learned = words_learned + 1 WHERE learner = ?",
+                             (learner,))
+        return bool(added)
+
+    def is_learned(self, learner, word):
+        return self._connect().execute(
+            "SELECT 1 FROM learned WHERE learner = ? AND word = ?", (learner, word)).fetchone() is not None
+
+    def record_answer(self, learner, word, correct):
+        """Append one quiz or flashcard answer"""
+        self._write(learner, [
+            ("INSERT INTO events (learner, kind, word, score, total, created) VALUES (?, 'answer', ?, ?, 1, ?)",
+             (learner, word, int(bool(correct)), time.time())),
+            ("UPDATE totals SET answers = answers + 1, correct_answers = correct_answers + ? WHERE learner = ?",
+             (int(bool(correct)), learner)),
+        ])
+
+    def record_session(self, learner, kind, score, total, when=None):
+        """Append the result of a finished quiz or flashcard session"""
+        if kind not in SESSION_KINDS:
+            raise ValueError(f"unknown session kind {kind!r}")
+        when = when or time.time()
+        counter = 'quizzes' if kind == 'quiz' else 'study_sessions'
+        self._write(learner, [
+            ("INSERT INTO events (learner, kind, score, total, created) VALUES (?, ?, ?, ?, ?)",
+             (learner, kind, score, total, when)),
+            (f"UPDATE totals SET {counter} = {counter} + 1, last_session = MAX(COALESCE(last_session, 0), ?) "
+             "WHERE learner = ?", (when, learner)),
+        ])
+
+    def next_cards(self, learner, limit, new_words=(), category=None, now=None):
+        """
+        Up to limit (word, CardState) pairs to review: due cards, most
+        overdue first, then cards never reviewed taken from new_words (an
+        iterable of words in deck order) to fill the rest
+        """
+        now = now or time.time()
+        conn = self._connect()
+        if category is None:
+            rows = conn.execute(
+                "SELECT word, ease, interval, repetitions, lapses, due FROM cards "
+                "WHERE learner = ? AND due <= ? ORDER BY due LIMIT ?", (learner, now, limit)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT word, ease, interval, repetitions, lapses, due FROM cards "
+                "WHERE learner = ? AND category = ? AND due <= ? ORDER BY due LIMIT ?",
+                (learner, category, now, limit)).fetchall()
+        cards = [(row[0], CardState(*row[1:])) for row in rows]
+
+        # Check candidates in chunks, so a long deck is only read as far as needed
+        words = iter(new_words)
+        while len(cards) < limit:
+            chunk = [word for _, word in zip(range(max(limit * 4, 50)), words)]
+            if not chunk:
+                break
+            seen = {row[0] for row in conn.execute(
+                f"SELECT word FROM cards WHERE learner = ? AND word IN ({','.join('?' * len(chunk))})",
+                [learner, *chunk])}
+            for word in chunk:
+                if word not in seen and len(cards) < limit:
+                    seen.add(word)
+                    cards.append((word, CardState()))
+        return cards
+
+    def next_due(self, learner):
+        """When the learner's next card falls due (None without reviewed cards)"""
+        row = self._connect().execute("SELECT MIN(due) FROM cards WHERE learner = ?", (learner,)).fetchone()
+        return row[0]
+
+    def review_cards(self, learner, reviews, now=None):
+        """
+        Apply a batch of (word, category, grade) reviews in one transaction
+
+        Each review also counts as an answer, and a passing grade marks the
+        word learned. Returns {word: new CardState}.
+        """
+        now = now or time.time()
+        reviews = list(reviews)
+        if not reviews:
+            return {}
+        words = sorted({word for word, _, _ in reviews})
+
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO totals (learner) VALUES (?)", (learner,))
+            states = {row[0]: CardState(*row[1:]) for row in conn.execute(
+                "SELECT word, ease, interval, repetitions, lapses, due FROM cards "
+                f"WHERE learner = ? AND word IN ({','.join('?' * len(words))})", [learner, *words])}
+
+            categories = {}
+            for word, category, grade in reviews:
+                states[word] = states.get(word, CardState()).review(grade, now)
+                categories[word] = category
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO cards (learner, word, category, ease, interval, repetitions, lapses, due) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(learner, word, categories[word], state.ease, state.interval, state.repetitions,
+                  state.lapses, state.due) for word, state in states.items() if word in categories])
+            conn.executemany(
+                "INSERT INTO events (learner, kind, word, score, total, created) VALUES (?, 'answer', ?, ?, 1, ?)",
+                [(learner, word, int(grade >= 3), now) for word, _, grade in reviews])
+
+            passed = [word for word, _, grade in reviews if grade >= 3]
+            added = sum(conn.execute(
+                "INSERT OR IGNORE INTO learned (learner, word, created) VALUES (?, ?, ?)",
+                (learner, word, now)).rowcount for word in dict.fromkeys(passed))
+            conn.execute(
+                "UPDATE totals SET answers = answers + ?, correct_answers = correct_answers + ?, "
+                "words_learned = words_learned + ? WHERE learner = ?",
+                (len(reviews), len(passed), added, learner))
+
+        with self._lock:
+            self._writes += 1
+            compact = self.compact_every and self._writes % self.compact_every == 0
+        if compact:
+            self.compact(learner)
+        return {word: states[word] for word in categories}
+
+    def summary(self, learner, recent_quizzes=5, recent_words=10):
+        """Totals plus the latest quiz results and learned words"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT words_learned, answers, correct_answers, quizzes, study_sessions, last_session "
+            "FROM totals WHERE learner = ?", (learner,)).fetchone() or (0, 0, 0, 0, 0, None)
+        quizzes = conn.execute(
+            "SELECT score, total, created FROM events WHERE learner = ? AND kind = 'quiz' "
+            "ORDER BY id DESC LIMIT ?", (learner, recent_quizzes)).fetchall()
+        words = conn.execute(
+            "SELECT word FROM learned WHERE learner = ? ORDER BY created DESC LIMIT ?",
+            (learner, recent_words)).fetchall()
+
+        return {
+            'words_learned': row[0],
+            'answers': row[1],
+            'correct_answers': row[2],
+            'quizzes': row[3],
+            'study_sessions': row[4],
+            'last_session': datetime.fromtimestamp(row[5]).isoformat() if row[5] else None,
+            'recent_quizzes': [{
+                'date': datetime.fromtimestamp(created).isoformat(),
+                'score': score,
+                'total': total,
+                'percentage': score / total * 100 if total else 0.0,
+            } for score, total, created in reversed(quizzes)],
+            'recent_words': [word for word, in reversed(words)],
+        }
+
+    def compact(self, learner=None):
+        """
+        Drop all but the keep_events most recent answer events of learner
+        (of every learner when None); returns how many were deleted
+
+        Quiz and study session results are kept, since summary() lists them.
+        Each learner's trim is one range delete on the (learner, kind, id) index.
+        """
+        conn = self._connect()
+        if learner is None:
+            learners = [row[0] for row in conn.execute("SELECT learner FROM totals")]
+        else:
+            learners = [learner]
+
+        deleted = 0
+        for learner in learners:
+            with conn:
+                deleted += conn.execute(
+                    "DELETE FROM events WHERE learner = ? AND kind = 'answer' AND id <= ("
+                    "SELECT id FROM events WHERE learner = ? AND kind = 'answer' "
+                    "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (learner, learner, self.keep_events)).rowcount
+        return deleted
+
+    def import_json(self, learner, path):
+        """
+        Import a learning_progress.json written by older versions of the CLI
+
+        Only done for a learner with no progress yet, so it is safe to call
+        on every start. Returns True if anything was imported.
+        """
+        if self._connect().execute("SELECT 1 FROM totals WHERE learner = ?", (learner,)).fetchone():
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                old = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        for word in old.get('words_learned', []):
+            self.mark_learned(learner, word)
+        for quiz in old.get('quiz_scores', []):
+            self.record_session(learner, 'quiz', quiz['score'], quiz['total'],
+                                when=datetime.fromisoformat(quiz['date']).timestamp())
+        statements = [("UPDATE totals SET study_sessions = study_sessions + ? WHERE learner = ?",
+                       (old.get('total_study_sessions', 0), learner))]
+        if old.get('last_session'):
+            statements.append(("UPDATE totals SET last_session = MAX(COALESCE(last_session, 0), ?) "
+                               "WHERE learner = ?",
+                               (datetime.fromisoformat(old['last_session']).timestamp(), learner)))
+        self._write(learner, statements)
+        return True
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'learners': conn.execute("SELECT COUNT(*) FROM totals").fetchone()[0],
+            'learned_words': conn.execute("SELECT COUNT(*) FROM learned").fetchone()[0],
+            'events': conn.execute("SELECT COUNT(*) FROM events").fetchone()[0],
+            'keep_events': self.keep_events,
+        }
+
+
+class Learner:
+    """ProgressStore methods bound to one learner id"""
+
+    def __init__(self, store, learner_id):
+        self.store = store
+        self.id = learner_id
+
+    def mark_learned(self, word):
+        return self.store.mark_learned(self.id, word)
+
+    def is_learned(self, word):
+        return self.store.is_learned(self.id, word)
+
+    def record_answer(self, word, correct):
+        self.store.record_answer(self.id, word, correct)
+
+    def record_session(self, kind, score, total):
+        self.store.record_session(self.id, kind, score, total)
+
+    def next_cards(self, limit, new_words=(), category=None):
+        return self.store.next_cards(self.id, limit, new_words, category)
+
+    def next_due(self):
+        return self.store.next_due(self.id)
+
+    def review_cards(self, reviews):
+        return self.store.review_cards(self.id, reviews)
+
+    def summary(self, **kwargs):
+        return self.store.summary(self.id, **kwargs)
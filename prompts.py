@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Prompts
+Versioned prompt templates shared by the web app, the CLI and the batch tools
+
+A request is built as the template's static system prompt (the same bytes
+for every request, so OpenAI's automatic prompt caching can reuse it), then
+optional few-shot example pairs picked from the vocabulary for this input,
+then the text itself. Token usage reported by the API is recorded per
+template.
+"""
+
+import os
+import threading
+
+# Vocabulary examples added to each translation request (0 disables)
+TRANSLATION_FEW_SHOT = int(os.getenv('TRANSLATION_FEW_SHOT', 0))
+
+
+class PromptTemplate:
+    """A named, versioned system prompt"""
+
+    def __init__(self, name, version, system, few_shot=0):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.few_shot = few_shot
+
+    @property
+    def key(self):
+        return f"{self.name}-{self.version}"
+
+    @property
+    def cache_version(self):
+        """Part of the translation cache key; changes with anything that changes the output"""
+        return self.key + (f"+fewshot{self.few_shot}" if self.few_shot else '')
+
+    def messages(self, text, source_lang="mandarin", index=None):
+        """Chat messages for text, with few-shot examples when an index is given"""
+        messages = [{"role": "system", "content": self.system}]
+        if index is not None and self.few_shot:
+            for source, target in few_shot_examples(index, text, source_lang, self.few_shot):
+                messages.append({"role": "user", "content": source})
+                messages.append({"role": "assistant", "content": target})
+        messages.append({"role": "user", "content": text})
+        return messages
+
+
+def few_shot_examples(index, text, source_lang, limit):
+    """(source, shanghainese) pairs of the vocabulary words that occur in text"""
+    pairs = []
+    for word in index.contained_in(text, source_lang, limit):
+        pair = (word[source_lang], word['shanghainese'])
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+TRANSLATION_PROMPT = PromptTemplate('translate', 'v2', """You are an expert in Shanghainese (上海话/沪语). Translate Mandarin or English to authentic, colloquial Shanghainese.
+
+PRONOUNS: 侬 (nong) you, not 你 · 伊 (yi) he/she, not 他/她 · 阿拉 (a la) we/us, not 我们 · 伊拉 (yi la) they, not 他们 · 那 (na) you (plural), not 你们
+QUESTIONS: 啥 (sa) what, not 什么 · 哪能 (na nen) how, not 怎么 · 阿里/阿里的 (a li/a li di) where, not 哪里 · 几钿 (jih dih) how much money, not 多少钱
+NEGATION & VERBS: 勿/弗 (veq/fe) not, not 不 · 七 (qi) go, phonetic for 去 · 巴相 (ba xiang) play/hang out, not 玩 · 晓得 (xiao de) know, not 知道 · 讲 (gang) speak/say, not 说
+TIME: 今朝 (jin zhao) today, not 今天 · 早上 (zou lang xiang) morning, not 早晨 · 夜里 (ya li) night, not 晚上
+GREETINGS: 侬好 hello · 侬早 good morning · 谢谢侬 thank you · 对弗起 sorry
+
+Examples:
+你今天去哪里吃饭？ → 侬今朝七阿里的七饭
+你在干什么？ → 侬勒浪搭啥？
+我不知道 → 我勿晓得
+你吃饭了吗？ → 饭吃过伐？
+这个多少钱？ → 几钿？
+他们在说什么？ → 伊拉勒浪讲啥？
+
+Only return the Shanghainese translation, nothing else.""", few_shot=TRANSLATION_FEW_SHOT)
+
+PROMPTS = {template.name: template for template in (TRANSLATION_PROMPT,)}
+
+
+class TokenUsage:
+    """Prompt and completion tokens per template, as reported by the API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, name, usage):
+        """Add one response's usage (None when the API reported none)"""
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+        with self._lock:
+            totals = self._totals.setdefault(name, {'requests': 0, 'prompt_tokens': 0,
+                                                    'cached_prompt_tokens': 0, 'completion_tokens': 0})
+            totals['requests'] += 1
+            totals['prompt_tokens'] += usage.prompt_tokens or 0
+            totals['cached_prompt_tokens'] += cached
+            totals['completion_tokens'] += usage.completion_tokens or 0
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for name, totals in self._totals.items():
+                requests = totals['requests']
+                result[name] = dict(
+                    totals,
+                    prompt_tokens_per_request=round(totals['prompt_tokens'] / requests, 1),
+                    completion_tokens_per_request=round(totals['completion_tokens'] / requests, 1),
+                    cached_prompt_ratio=(round(totals['cached_prompt_tokens'] / totals['prompt_tokens'], 4)
+                                         if totals['prompt_tokens'] else 0.0),
+                )
+            return result
+
+
+TOKEN_USAGE = TokenUsage()
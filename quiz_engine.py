@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Quiz Engine
+Multiple-choice question generation over a precomputed word table
+
+Words are numbered once at load time. Each answer field gets a table of
+its distinct values, held as the number of one word with that value, plus
+the index of every word's value in that table, so distractors are drawn by
+rejection sampling over the table instead of scanning every word for every
+question. Words and values are only read from the vocabulary (which may be
+memory-mapped, see vocab_binary.py) when a question uses them.
+"""
+
+import bisect
+import random
+from array import array
+
+from vocab_binary import word_field
+
+QUESTION_TYPES = ['eng_to_sh', 'man_to_sh', 'sh_to_eng']
+INDEXED_FIELDS = ['english', 'mandarin', 'shanghainese']
+
+
+class QuizEngine:
+    """Built once per vocabulary; question generation cost does not grow with it"""
+
+    def __init__(self, vocab, rng=random):
+        self.rng = rng
+        self.categories = []  # word sequence of each category
+        self.starts = []      # number of the first word of each category
+        self.values = {field: array('I') for field in INDEXED_FIELDS}      # a word per distinct value
+        self.word_value = {field: array('I') for field in INDEXED_FIELDS}  # value index per word
+        self.count = 0
+
+        index = {field: {} for field in INDEXED_FIELDS}
+        for words in vocab.values():
+            self.categories.append(words)
+            self.starts.append(self.count)
+            for word in words:
+                for field in INDEXED_FIELDS:
+                    value = word[field]
+                    if value not in index[field]:
+                        index[field][value] = len(self.values[field])
+                        self.values[field].append(self.count)
+                    self.word_value[field].append(index[field][value])
+                self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def word(self, word_index):
+        """The word numbered word_index"""
+        i = bisect.bisect_right(self.starts, word_index) - 1
+        return self.categories[i][word_index - self.starts[i]]
+
+    def field(self, word_index, field):
+        """One field of the word numbered word_index"""
+        i = bisect.bisect_right(self.starts, word_index) - 1
+        return word_field(self.categories[i], word_index - self.starts[i], field)
+
+    def distractors(self, word_index, field, count=3):
+        """Up to count distinct wrong values of field for a word"""
+        values = self.values[field]
+        correct = self.word_value[field][word_index]
+        count = min(count, len(values) - 1)
+
+        picked = []
+        while len(picked) < count:
+            i = self.rng.randrange(len(values))
+            if i != correct and i not in picked:
+                picked.append(i)
+        return [self.field(values[i], field) for i in picked]
+
+    def question(self, word_index, q_type=None):
+        """Build one multiple-choice question for a word"""
+        word = self.word(word_index)
+        q_type = q_type or self.rng.choice(QUESTION_TYPES)
+
+        if q_type == 'eng_to_sh':
+            question_text = f"What is '{word['english']}' in Shanghainese?"
+            field = 'shanghainese'
+        elif q_type == 'man_to_sh':
+            question_text = f"What is '{word['mandarin']}' in Shanghainese?"
+            field = 'shanghainese'
+        else:  # sh_to_eng
+            question_text = f"What does '{word['shanghainese']}' mean in English?"
+            field = 'english'
+
+        options = [word[field]] + self.distractors(word_index, field)
+        self.rng.shuffle(options)
+
+        return {
+            'question': question_text,
+            'options': options,
+            'correct_answer': word[field],
+            'word': word
+        }
+
+    def generate(self, num_questions):
+        """A quiz of distinct words, at most one question per word"""
+        num_questions = min(num_questions, self.count)
+        return [self.question(i) for i in self.rng.sample(range(self.count), num_questions)]
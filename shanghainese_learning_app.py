@@ -4,14 +4,22 @@ Shanghainese Learning App
 Interactive tool for learning Shanghainese for English and Mandarin speakers
 """
 
-import openai
-from gradio_client import Client
-import shutil
-import json
-import random
+import argparse
 import os
-from datetime import datetime
+import sys
 from dotenv import load_dotenv
+from translation_cache import TranslationCache
+from batch_translator import (BATCH_TRANSLATE_SIZE, BATCH_TRANSLATE_WORKERS, BatchTranslator,
+                              translate_file)
+from clients import OPENAI_CLIENT, openai_configured
+from logs import configure_logging
+from prompts import TOKEN_USAGE, TRANSLATION_PROMPT
+from tts_router import TTS_ROUTER, stream_openai_tts, synthesize_hf
+from progress_store import ProgressStore
+from quiz_engine import QuizEngine
+from srs import GRADE_FORGOT, GRADE_KNEW
+from vocab_search import VocabularyIndex
+from vocab_binary import VOCAB_BINARY_FILE, load_vocabulary_file
 
 # Load environment variables
 load_dotenv()
@@ -20,151 +28,47 @@ load_dotenv()
 # CONFIGURATION
 # ============================================================================
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    print("❌ ERROR: OPENAI_API_KEY not found in environment variables!")
-    print("Please create a .env file with your API key (see .env.example)")
-    exit(1)
-
 VOCAB_FILE = "shanghainese_vocab.json"
+# Progress file of older versions, imported into the progress store once
 PROGRESS_FILE = "learning_progress.json"
+# Learner id of the CLI user in the progress store
+CLI_LEARNER = os.getenv('PROGRESS_LEARNER', 'cli')
+# Most cards per flashcard session
+FLASHCARD_SESSION_SIZE = 20
+
+# Translation model and prompt version (part of the translation cache key)
+TRANSLATION_MODEL = "gpt-4o"
+TRANSLATION_PROMPT_VERSION = TRANSLATION_PROMPT.cache_version
+
+TRANSLATION_CACHE = TranslationCache()
 
 # ============================================================================
 # CORE TRANSLATION & TTS FUNCTIONS
 # ============================================================================
 
-def get_shanghainese_text(input_text, source_lang="mandarin"):
+def get_shanghainese_text(input_text, source_lang="mandarin", search_index=None):
     """
     Translate English or Mandarin to Shanghainese using GPT-4o
 
     Args:
         input_text: Text to translate
         source_lang: "mandarin" or "english"
+        search_index: VocabularyIndex to draw few-shot examples from (optional)
     """
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-    if source_lang == "english":
-        system_prompt = """You are an expert in Shanghainese (上海话/沪语). Translate English to authentic Shanghainese dialect.
-
-Key characteristics of Shanghainese:
-PRONOUNS:
-- Use 侬 (nong) for "you" instead of 你
-- Use 伊 (yi) for "he/she" instead of 他/她
-- Use 阿拉 (a la) for "we/us" instead of 我们
-- Use 伊拉 (yi la) for "they/them" instead of 他们
-- Use 那 (na) for "you (plural)" instead of 你们
-
-QUESTION WORDS & LOCATION:
-- Use 啥 (sa) for "what" instead of 什么
-- Use 哪能 (na nen) for "how" instead of 怎么
-- Use 阿里/阿里的 (a li/a li di) for "where" instead of 哪里
-- Use 几钿 (jih dih) for "how much money" instead of 多少钱
-
-NEGATION & VERBS:
-- Use 勿/弗 (veq/fe) for negation instead of 不
-- Use 七 (qi) phonetically for 去 (go/to go)
-- Use 巴相 (ba xiang) for "play/hang out" instead of 玩
-- Use 晓得 (xiao de) for "know" instead of 知道
-- Use 讲 (gang) for "speak/say" instead of 说
-
-TIME:
-- Use 今朝 (jin zhao) for "today" instead of 今天
-- Use 早上 (zou lang xiang) for "morning" instead of 早晨
-- Use 夜里 (ya li) for "night" instead of 晚上
-
-GREETINGS:
-- 侬好 (nong ho) for "hello"
-- 侬早 (nong zo) for "good morning"
-- 谢谢 (xia xia/ya ya) for "thank you"
-- 对弗起 (dei fe qi) for "sorry"
-
-Keep natural, colloquial tone with authentic Shanghainese expressions.
-
-Only return the Shanghainese translation, nothing else."""
-    else:  # mandarin
-        system_prompt = """You are an expert in Shanghainese (上海话/沪语). Translate Mandarin to authentic Shanghainese dialect.
-
-Key characteristics of Shanghainese:
-PRONOUNS:
-- Use 侬 (nong) for "you" instead of 你
-- Use 伊 (yi) for "he/she" instead of 他/她
-- Use 阿拉 (a la) for "we/us" instead of 我们
-- Use 伊拉 (yi la) for "they/them" instead of 他们
-- Use 那 (na) for "you (plural)" instead of 你们
-
-QUESTION WORDS & LOCATION:
-- Use 啥 (sa) for "what" instead of 什么
-- Use 哪能 (na nen) for "how" instead of 怎么
-- Use 阿里/阿里的 (a li/a li di) for "where" instead of 哪里
-- Use 几钿 (jih dih) for "how much money" instead of 多少钱
-
-NEGATION & VERBS:
-- Use 勿/弗 (veq/fe) for negation instead of 不
-- Use 七 (qi) phonetically for 去 (go/to go)
-- Use 巴相 (ba xiang) for "play/hang out" instead of 玩
-- Use 晓得 (xiao de) for "know" instead of 知道
-- Use 讲 (gang) for "speak/say" instead of 说
-
-TIME:
-- Use 今朝 (jin zhao) for "today" instead of 今天
-- Use 早上 (zou lang xiang) for "morning" instead of 早晨
-- Use 夜里 (ya li) for "night" instead of 晚上
-
-GREETINGS:
-- 侬好 (nong ho) for "hello"
-- 侬早 (nong zo) for "good morning"
-- 谢谢 (xia xia/ya ya) for "thank you"
-- 对弗起 (dei fe qi) for "sorry"
-
-Keep natural, colloquial tone with authentic Shanghainese expressions.
-
-Examples:
-Mandarin: 你今天去哪里吃饭？
-Shanghainese: 侬今朝七阿里的七饭
-
-Mandarin: 你今天去哪儿玩？
-Shanghainese: 侬今朝七阿里巴相？
-
-Mandarin: 你在干什么？
-Shanghainese: 侬勒浪搭啥？
-
-Mandarin: 我不知道
-Shanghainese: 我勿晓得
-
-Mandarin: 他去哪里了？
-Shanghainese: 伊去哪里了？
-
-Mandarin: 你好吗？
-Shanghainese: 侬好伐？
-
-Mandarin: 你吃饭了吗？
-Shanghainese: 饭吃过伐？
-
-Mandarin: 这个多少钱？
-Shanghainese: 几钿？
+    cached = TRANSLATION_CACHE.get(input_text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+    if cached is not None:
+        return cached
 
-Mandarin: 谢谢你
-Shanghainese: 谢谢侬
-
-Mandarin: 对不起
-Shanghainese: 对弗起
-
-Mandarin: 我们一起去
-Shanghainese: 阿拉一道去
-
-Mandarin: 他们在说什么？
-Shanghainese: 伊拉勒浪讲啥？
-
-Only return the Shanghainese translation, nothing else."""
+    client = OPENAI_CLIENT.get()
 
     response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": input_text}
-        ]
+        model=TRANSLATION_MODEL,
+        messages=TRANSLATION_PROMPT.messages(input_text, source_lang, search_index)
     )
-    return response.choices[0].message.content
+    TOKEN_USAGE.record(TRANSLATION_PROMPT.key, response.usage)
+    translation = response.choices[0].message.content
+    TRANSLATION_CACHE.set(input_text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL, translation)
+    return translation
 
 
 def speak_shanghainese(text, output_file="output.wav", speaking_speed=1.0):
@@ -177,48 +81,34 @@ def speak_shanghainese(text, output_file="output.wav", speaking_speed=1.0):
         output_file: Output audio file path
         speaking_speed: Speed of speech (0.5 to 2.0)
     """
-    # Try Hugging Face Shanghainese TTS first
-    try:
-        print(f"🔊 Generating authentic Shanghainese speech...")
-        client = Client('CjangCjengh/Shanghainese-TTS')
-
-        result = client.predict(
-            text,
-            False,
-            speaking_speed,
-            fn_index=1
-        )
-
-        if isinstance(result, dict) and 'name' in result:
-            audio_path = result['name']
+    # Hugging Face first unless its circuit is open, then OpenAI TTS
+    backends = TTS_ROUTER.order()
+    if not backends:
+        print(f"❌ All TTS backends are unavailable, try again in {TTS_ROUTER.retry_after():.0f}s")
+        return None
+    for i, backend in enumerate(backends):
+        if i > 0:
+            print(f"🔄 Falling back to {backend} TTS...")
+
+        if backend == 'hf':
+            try:
+                print(f"🔊 Generating authentic Shanghainese speech...")
+                synthesize_hf(text, speaking_speed, output_file)
+                print(f"✅ Audio saved as {output_file}")
+                return output_file
+            except Exception as e:
+                print(f"⚠️  Hugging Face unavailable (rate limit or error): {e}")
         else:
-            audio_path = result
+            try:
+                with open(output_file, 'wb') as f:
+                    for chunk in stream_openai_tts(text, speaking_speed):
+                        f.write(chunk)
+                print(f"✅ Audio saved as {output_file} (OpenAI TTS)")
+                return output_file
+            except Exception as openai_error:
+                print(f"❌ OpenAI TTS failed: {openai_error}")
 
-        shutil.copy(audio_path, output_file)
-        print(f"✅ Audio saved as {output_file}")
-        return output_file
-    except Exception as e:
-        print(f"⚠️  Hugging Face unavailable (rate limit or error): {e}")
-        print(f"🔄 Falling back to OpenAI TTS...")
-
-        # Fallback to OpenAI TTS
-        try:
-            client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-            # Use OpenAI's Chinese voice (alloy works well for Chinese)
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text,
-                speed=speaking_speed
-            )
-
-            response.stream_to_file(output_file)
-            print(f"✅ Audio saved as {output_file} (OpenAI TTS)")
-            return output_file
-        except Exception as openai_error:
-            print(f"❌ OpenAI TTS also failed: {openai_error}")
-            return None
+    return None
 
 
 # ============================================================================
@@ -226,34 +116,20 @@ def speak_shanghainese(text, output_file="output.wav", speaking_speed=1.0):
 # ============================================================================
 
 def load_vocabulary():
-    """Load vocabulary from JSON file"""
+    """Load vocabulary (from the compiled binary when it is up to date)"""
     try:
-        with open(VOCAB_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_vocabulary_file(VOCAB_FILE, VOCAB_BINARY_FILE)
     except FileNotFoundError:
         print(f"❌ Vocabulary file {VOCAB_FILE} not found!")
         return {}
 
 
 def load_progress():
-    """Load learning progress"""
-    try:
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            "words_learned": [],
-            "quiz_scores": [],
-            "total_study_sessions": 0,
-            "last_session": None
-        }
-
-
-def save_progress(progress):
-    """Save learning progress"""
-    progress["last_session"] = datetime.now().isoformat()
-    with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, indent=2, ensure_ascii=False)
+    """Progress of the CLI learner (imports an old learning_progress.json once)"""
+    store = ProgressStore()
+    if store.import_json(CLI_LEARNER, PROGRESS_FILE):
+        print(f"📥 Imported progress from {PROGRESS_FILE}")
+    return store.learner(CLI_LEARNER)
 
 
 # ============================================================================
@@ -304,6 +180,37 @@ def show_category(words, category_name):
     input("\n📌 Press Enter to continue...")
 
 
+def search_mode(search_index):
+    """Search vocabulary across all categories"""
+    print("\n" + "="*60)
+    print("🔍 VOCABULARY SEARCH")
+    print("="*60)
+    print("Search by English, Mandarin, Shanghainese or romanization (e.g. 'za wei')")
+
+    while True:
+        query = input("\nSearch (Enter to go back): ").strip()
+        if not query:
+            break
+
+        page = 1
+        while True:
+            result = search_index.search(query, page=page, per_page=10)
+            if not result['total']:
+                print("❌ No matches")
+                break
+
+            first = (page - 1) * 10 + 1
+            print(f"\n{result['total']} matches (showing {first}-{first + len(result['results']) - 1}):\n")
+            for i, word in enumerate(result['results'], first):
+                print(f"{i}. {word['english']} [{word['category'].replace('_', ' ').title()}]")
+                print(f"   Mandarin:     {word['mandarin']}")
+                print(f"   Shanghainese: {word['shanghainese']} ({word['pinyin']})")
+
+            if page * 10 >= result['total'] or input("\nMore? (y/n): ").lower() != 'y':
+                break
+            page += 1
+
+
 def flashcard_mode(vocab, progress):
     """Interactive flashcard learning"""
     print("\n" + "="*60)
@@ -323,13 +230,19 @@ def flashcard_mode(vocab, progress):
             return
 
         category = categories[choice-1]
-        words = vocab[category].copy()
-        random.shuffle(words)
+        by_text = {word['shanghainese']: word for word in vocab[category]}
+        # Due reviews first, then words not studied yet
+        queue = progress.next_cards(FLASHCARD_SESSION_SIZE, list(by_text), category)
+        words = [by_text[text] for text, _ in queue if text in by_text]
+        if not words:
+            print("\n🎉 All caught up in this category! Come back later for your next reviews.")
+            return
 
         print(f"\n📚 Starting flashcards for: {category.replace('_', ' ').title()}")
         print(f"📊 {len(words)} cards to review\n")
 
         correct = 0
+        reviews = []
         for i, word in enumerate(words, 1):
             print(f"\n--- Card {i}/{len(words)} ---")
             print(f"English: {word['english']}")
@@ -344,92 +257,69 @@ def flashcard_mode(vocab, progress):
             if hear == 'y':
                 speak_shanghainese(word['shanghainese'], f"flashcard_{i}.wav")
 
-            knew_it = input("Did you know it? (y/n): ").lower()
-            if knew_it == 'y':
+            knew_it = input("Did you know it? (y/n): ").lower() == 'y'
+            reviews.append((word['shanghainese'], category, GRADE_KNEW if knew_it else GRADE_FORGOT))
+            if knew_it:
                 correct += 1
-                if word['shanghainese'] not in progress['words_learned']:
-                    progress['words_learned'].append(word['shanghainese'])
 
         print(f"\n{'='*60}")
         print(f"📊 Session Complete!")
         print(f"✅ Correct: {correct}/{len(words)} ({correct/len(words)*100:.1f}%)")
         print(f"{'='*60}")
 
-        progress['total_study_sessions'] += 1
-        save_progress(progress)
+        # Schedules the next reviews and marks known words learned
+        progress.review_cards(reviews)
+        progress.record_session('flashcards', correct, len(words))
 
     except ValueError:
         print("❌ Invalid input!")
 
 
-def quiz_mode(vocab, progress):
+def quiz_mode(quiz_engine, progress):
     """Interactive quiz with multiple choice"""
     print("\n" + "="*60)
     print("🎯 QUIZ MODE")
     print("="*60)
 
-    # Gather all words
-    all_words = []
-    for category in vocab.values():
-        all_words.extend(category)
-
-    if len(all_words) < 4:
+    if len(quiz_engine) < 4:
         print("❌ Need at least 4 words for quiz mode!")
         return
 
     # Select quiz size
     try:
-        num_questions = int(input(f"\nHow many questions? (max {min(20, len(all_words))}): "))
-        num_questions = min(num_questions, len(all_words))
+        num_questions = int(input(f"\nHow many questions? (max {min(20, len(quiz_engine))}): "))
+        num_questions = min(num_questions, len(quiz_engine))
     except ValueError:
         num_questions = 5
 
-    quiz_words = random.sample(all_words, num_questions)
+    questions = quiz_engine.generate(num_questions)
+    num_questions = len(questions)
     score = 0
 
     print(f"\n📝 Starting quiz with {num_questions} questions!\n")
 
-    for i, word in enumerate(quiz_words, 1):
+    for i, question in enumerate(questions, 1):
         print(f"\n--- Question {i}/{num_questions} ---")
-
-        # Randomly choose question type
-        q_type = random.choice(['eng_to_sh', 'man_to_sh', 'sh_to_eng'])
-
-        if q_type == 'eng_to_sh':
-            print(f"What is '{word['english']}' in Shanghainese?")
-            correct_answer = word['shanghainese']
-        elif q_type == 'man_to_sh':
-            print(f"What is '{word['mandarin']}' in Shanghainese?")
-            correct_answer = word['shanghainese']
-        else:  # sh_to_eng
-            print(f"What does '{word['shanghainese']}' mean in English?")
-            correct_answer = word['english']
-
-        # Generate multiple choice options
-        if q_type == 'sh_to_eng':
-            options = [word['english']]
-            other_words = [w for w in all_words if w['english'] != word['english']]
-            options.extend([w['english'] for w in random.sample(other_words, min(3, len(other_words)))])
-        else:
-            options = [word['shanghainese']]
-            other_words = [w for w in all_words if w['shanghainese'] != word['shanghainese']]
-            options.extend([w['shanghainese'] for w in random.sample(other_words, min(3, len(other_words)))])
-
-        random.shuffle(options)
+        print(question['question'])
+        options = question['options']
+        correct_answer = question['correct_answer']
 
         # Display options
         for j, option in enumerate(options, 1):
             print(f"  {j}. {option}")
 
+        is_correct = False
         try:
             answer = int(input("\nYour answer (1-4): "))
             if options[answer-1] == correct_answer:
                 print("✅ Correct!")
                 score += 1
+                is_correct = True
             else:
                 print(f"❌ Wrong! Correct answer: {correct_answer}")
         except (ValueError, IndexError):
             print(f"❌ Invalid input! Correct answer: {correct_answer}")
+        progress.record_answer(question['word']['shanghainese'], is_correct)
 
     # Show results
     percentage = (score / num_questions) * 100
@@ -439,21 +329,20 @@ def quiz_mode(vocab, progress):
     print(f"{'='*60}")
 
     # Save score
-    progress['quiz_scores'].append({
-        'date': datetime.now().isoformat(),
-        'score': score,
-        'total': num_questions,
-        'percentage': percentage
-    })
-    save_progress(progress)
+    progress.record_session('quiz', score, num_questions)
 
 
-def translator_mode():
+def translator_mode(search_index=None):
     """Free translation mode"""
     print("\n" + "="*60)
     print("🌐 TRANSLATOR MODE")
     print("="*60)
 
+    if not openai_configured():
+        print("❌ ERROR: OPENAI_API_KEY not found in environment variables!")
+        print("Please create a .env file with your API key (see .env.example)")
+        return
+
     while True:
         print("\n1. Mandarin → Shanghainese")
         print("2. English → Shanghainese")
@@ -471,7 +360,7 @@ def translator_mode():
                 continue
 
             print("\n🔄 Translating...")
-            result = get_shanghainese_text(text, source)
+            result = get_shanghainese_text(text, source, search_index)
             print(f"\n✅ Shanghainese: {result}")
 
             # Option to hear it
@@ -488,24 +377,79 @@ def view_progress(progress):
     print("📈 YOUR PROGRESS")
     print("="*60)
 
-    print(f"\n📚 Words learned: {len(progress['words_learned'])}")
-    print(f"🎓 Study sessions: {progress['total_study_sessions']}")
-    print(f"📅 Last session: {progress.get('last_session', 'Never')}")
+    summary = progress.summary()
+    print(f"\n📚 Words learned: {summary['words_learned']}")
+    print(f"🎓 Study sessions: {summary['study_sessions']}")
+    print(f"📅 Last session: {summary['last_session'] or 'Never'}")
 
-    if progress['quiz_scores']:
+    if summary['recent_quizzes']:
         print(f"\n🎯 Quiz History (last 5):")
-        for quiz in progress['quiz_scores'][-5:]:
+        for quiz in summary['recent_quizzes']:
             date = quiz['date'][:10]
             print(f"  {date}: {quiz['score']}/{quiz['total']} ({quiz['percentage']:.1f}%)")
 
-    if progress['words_learned']:
+    if summary['recent_words']:
         print(f"\n📝 Recently learned words:")
-        for word in progress['words_learned'][-10:]:
+        for word in summary['recent_words']:
             print(f"  • {word}")
 
     input("\n📌 Press Enter to continue...")
 
 
+# ============================================================================
+# BATCH TRANSLATION
+# ============================================================================
+
+def batch_translate_command(args):
+    """Translate a JSONL file, resuming from the output file if it exists"""
+    if not openai_configured():
+        print("❌ ERROR: OPENAI_API_KEY not found in environment variables!")
+        print("Please create a .env file with your API key (see .env.example)")
+        raise SystemExit(1)
+
+    # Failed requests are logged by batch_translator
+    configure_logging(fmt='text')
+    translator = BatchTranslator(TRANSLATION_CACHE, TRANSLATION_PROMPT, TRANSLATION_MODEL,
+                                 batch_size=args.batch_size, workers=args.workers)
+    try:
+        summary = translate_file(translator, args.input, args.output)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    print(f"✅ {summary['translated']} translated, {summary['cached']} from cache, "
+          f"{summary['skipped']} already done, {summary['failed']} failed "
+          f"({summary['requests']} GPT-4o requests)")
+    usage = TOKEN_USAGE.stats().get(translator.batch_prompt_version)
+    if usage:
+        print(f"🧮 {usage['prompt_tokens']} input tokens ({usage['cached_prompt_tokens']} cached), "
+              f"{usage['completion_tokens']} output tokens")
+    if summary['failed']:
+        print(f"⚠️  Run the same command again to retry the failed records")
+        raise SystemExit(1)
+
+
+def run_command(argv):
+    """Non-interactive subcommands"""
+    parser = argparse.ArgumentParser(prog='shanghainese_learning_app.py',
+                                     description="Shanghainese learning app (no arguments: interactive menu)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch = commands.add_parser('translate-batch',
+                                help='Translate a JSONL file ({"id", "text", "source"} per line)')
+    batch.add_argument('input', help="JSONL file to translate")
+    batch.add_argument('output', help="JSONL results, appended as they complete; "
+                                      "rerunning resumes from it")
+    batch.add_argument('--workers', type=int, default=BATCH_TRANSLATE_WORKERS,
+                       help=f"Concurrent GPT-4o requests (default {BATCH_TRANSLATE_WORKERS})")
+    batch.add_argument('--batch-size', type=int, default=BATCH_TRANSLATE_SIZE,
+                       help=f"Sentences per GPT-4o request (default {BATCH_TRANSLATE_SIZE})")
+    batch.set_defaults(func=batch_translate_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
 # ============================================================================
 # MAIN MENU
 # ============================================================================
@@ -519,6 +463,12 @@ def main():
         print("❌ Unable to load vocabulary database!")
         return
 
+    quiz_engine = QuizEngine(vocab)
+    search_index = VocabularyIndex(vocab)
+
+    if not openai_configured():
+        print("⚠️  OPENAI_API_KEY not set: the translator is unavailable")
+
     print("\n" + "="*60)
     print("🏮 SHANGHAINESE LEARNING APP 🏮")
     print("Learn Shanghainese from English & Mandarin")
@@ -531,9 +481,10 @@ def main():
         print("  3. 🎯 Quiz Mode")
         print("  4. 🌐 Translator")
         print("  5. 📈 View Progress")
+        print("  6. 🔍 Search Vocabulary")
         print("  0. ❌ Exit")
 
-        choice = input("\nSelect option (0-5): ")
+        choice = input("\nSelect option (0-6): ")
 
         if choice == '0':
             print("\n👋 再会 (Goodbye)! Happy learning!")
@@ -543,14 +494,19 @@ def main():
         elif choice == '2':
             flashcard_mode(vocab, progress)
         elif choice == '3':
-            quiz_mode(vocab, progress)
+            quiz_mode(quiz_engine, progress)
         elif choice == '4':
-            translator_mode()
+            translator_mode(search_index)
         elif choice == '5':
             view_progress(progress)
+        elif choice == '6':
+            search_mode(search_index)
         else:
-            print("❌ Invalid choice! Please select 0-5.")
+            print("❌ Invalid choice! Please select 0-6.")
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Single-Flight
+Collapses concurrent identical upstream calls into one
+
+Within a worker, callers with the same key wait on the first caller (the
+leader) and receive its result or exception. Across gunicorn workers on the
+same host, leaders serialize on a striped lock file, so the second worker's
+leader runs after the first one finished and finds the result in the cache.
+Functions passed to do() should therefore check the cache first.
+
+If a leader goes away before finishing (its client disconnected), the
+waiting callers are not failed with it: they retry, and one of them becomes
+the new leader.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process coalescing only
+    fcntl = None
+
+SINGLE_FLIGHT_LOCK_DIR = os.getenv(
+    'SINGLE_FLIGHT_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'shanghainese-locks'))
+# Number of lock files keys are spread over (bounds files on disk)
+SINGLE_FLIGHT_STRIPES = int(os.getenv('SINGLE_FLIGHT_STRIPES', 1024))
+
+
+class LeaderCancelled(Exception):
+    """The leader stopped before finishing; followers retry the call"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Claim:
+    """Leadership of a key held past one function call, e.g. by a streamed response"""
+
+    def __init__(self, flight, key, call, fd):
+        self.flight = flight
+        self.key = key
+        self.call = call
+        self._fd = fd
+
+    def finish(self, result=None, error=None):
+        """Hand result (or error) to the waiting callers; later calls do nothing"""
+        with self.flight._lock:
+            if self.flight._calls.get(self.key) is not self.call:
+                return
+            del self.flight._calls[self.key]
+        if self._fd is not None:
+            self.flight._release(self._fd)
+            self._fd = None
+        self.call.result = result
+        self.call.error = error
+        self.call.done.set()
+
+
+class SingleFlight:
+    """Per-key call coalescing across threads, coroutines and processes"""
+
+    def __init__(self, lock_dir=SINGLE_FLIGHT_LOCK_DIR, stripes=SINGLE_FLIGHT_STRIPES):
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        self.leaders = 0
+        self.shared = 0
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        if fcntl is not None:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once for all concurrent callers with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, LeaderCancelled):
+                return self.do(key, fn, *args, **kwargs)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._host_lock(key):
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # GeneratorExit, KeyboardInterrupt, SystemExit: not the followers'
+            # error to raise, and without one they would take None as the result
+            call.error = LeaderCancelled(key)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def claim(self, key):
+        """
+        Lead key for work that finishes after this call returns
+
+        Returns a Claim to finish() once the result is ready, or None if
+        another caller already leads key (do() then waits for it).
+        """
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = self._calls[key] = _Call()
+            self.leaders += 1
+        try:
+            fd = self._acquire(key)
+        except BaseException:
+            with self._lock:
+                del self._calls[key]
+            call.error = LeaderCancelled(key)
+            call.done.set()
+            raise
+        return Claim(self, key, call, fd)
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """Coroutine version of do() for the ASGI app"""
+        loop = asyncio.get_running_loop()
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except LeaderCancelled:
+                # The leader's request was cancelled: the next caller takes over
+                return await self.do_async(key, coro_fn, *args, **kwargs)
+
+        future = self._async_calls[key] = loop.create_future()
+        self.leaders += 1
+        lock = None
+        acquire = None
+        try:
+            # Taking the host lock blocks, so do it off the event loop
+            acquire = loop.run_in_executor(None, self._acquire, key)
+            lock = await asyncio.shield(acquire)
+            result = await coro_fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            if lock is None and acquire is not None:
+                # Release the lock once the blocked acquire returns
+                acquire.add_done_callback(self._release_when_acquired)
+            # Cancelling the shared future would cancel every follower too
+            future.set_exception(LeaderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            if lock is not None:
+                self._release(lock)
+            del self._async_calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def stats(self):
+        return {
+            'leaders': self.leaders,
+            'shared': self.shared,
+            'in_flight': self.in_flight(),
+        }
+
+    # ------------------------------------------------------------------
+    # Host-wide lock files
+    # ------------------------------------------------------------------
+
+    def _lock_path(self, key):
+        stripe = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % self.stripes
+        return os.path.join(self.lock_dir, f'{stripe:04x}.lock')
+
+    def _acquire(self, key):
+        if fcntl is None:
+            return None
+        fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _release_when_acquired(self, acquire):
+        if not acquire.cancelled() and acquire.exception() is None and acquire.result() is not None:
+            self._release(acquire.result())
+
+    @contextmanager
+    def _host_lock(self, key):
+        fd = self._acquire(key)
+        try:
+            yield
+        finally:
+            if fd is not None:
+                self._release(fd)
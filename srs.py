@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Spaced Repetition
+SM-2 scheduling of flashcard reviews
+
+Each card a learner has seen has an ease factor, an interval and a due
+time. Grades follow SM-2 (0-5, 3 and above is a pass): passing pushes the
+card further out, failing brings it back after SRS_RELEARN_DELAY and
+lowers its ease. Card state is stored by progress_store.py, whose
+(learner, due) index serves as the due queue.
+"""
+
+import os
+
+SRS_INITIAL_EASE = float(os.getenv('SRS_INITIAL_EASE', 2.5))
+# Seconds until a failed card is shown again
+SRS_RELEARN_DELAY = int(os.getenv('SRS_RELEARN_DELAY', 600))
+MIN_EASE = 1.3
+DAY = 86400
+
+# Grades for the flashcard buttons ("Yes, I knew it" / "No, need practice")
+GRADE_KNEW = 4
+GRADE_FORGOT = 1
+
+
+class CardState:
+    """Scheduling state of one card for one learner"""
+
+    __slots__ = ('ease', 'interval', 'repetitions', 'lapses', 'due')
+
+    def __init__(self, ease=SRS_INITIAL_EASE, interval=0.0, repetitions=0, lapses=0, due=None):
+        self.ease = ease
+        self.interval = interval  # days
+        self.repetitions = repetitions  # passes in a row
+        self.lapses = lapses
+        self.due = due  # unix time; None for a card never reviewed
+
+    def review(self, grade, now):
+        """State after a review graded 0-5 at time now"""
+        if not 0 <= grade <= 5:
+            raise ValueError(f"grade must be between 0 and 5, not {grade}")
+
+        ease = max(MIN_EASE, self.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+        if grade < 3:
+            # Only forgetting a card that had been learned counts as a lapse
+            lapses = self.lapses + (1 if self.repetitions else 0)
+            return CardState(ease, 0.0, 0, lapses, now + SRS_RELEARN_DELAY)
+
+        repetitions = self.repetitions + 1
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = round(self.interval * ease, 2)
+        return CardState(ease, interval, repetitions, self.lapses, now + interval * DAY)
+
+    def as_dict(self):
+        return {
+            'ease': round(self.ease, 2),
+            'interval': self.interval,
+            'repetitions': self.repetitions,
+            'lapses': self.lapses,
+            'due': self.due,
+            'new': self.due is None,
+        }
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The app's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """Stands in for time.monotonic(); advance() moves it forward"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    return fake
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """web_app with its audio cache in a temporary directory"""
+    import web_app
+    from audio_cache import AudioCache
+
+    monkeypatch.setattr(web_app, 'AUDIO_CACHE', AudioCache(str(tmp_path / 'audio'), 10 ** 8))
+    return web_app
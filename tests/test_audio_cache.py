@@ -0,0 +1,84 @@
+import os
+import time
+
+import audio_cache
+from audio_cache import AudioCache
+
+
+def store(cache, key, data=b'RIFF....WAVE'):
+    tmp = cache.tmp_path('.wav')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    return cache.store(key, tmp)
+
+
+def test_hits_leave_mtime_alone(tmp_path):
+    cache = AudioCache(str(tmp_path), 10 ** 6)
+    path = store(cache, 'a' * 32)
+    old = time.time_ns() - 3600 * 10 ** 9
+    os.utime(path, ns=(old, old))
+
+    assert cache.lookup('a' * 32) == path
+    st = os.stat(path)
+    assert st.st_mtime_ns == old
+    # Access is recorded in the atime instead
+    assert st.st_atime_ns > old
+
+
+def test_atime_is_written_at_most_once_per_resolution(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path), 10 ** 6)
+    path = store(cache, 'a' * 32)
+    cache.lookup('a' * 32)
+    touched = os.stat(path).st_atime_ns
+
+    calls = []
+    monkeypatch.setattr(audio_cache.os, 'utime', lambda *args, **kwargs: calls.append(args))
+    cache.lookup('a' * 32)
+    assert calls == [] and os.stat(path).st_atime_ns == touched
+
+
+def test_collector_evicts_least_recently_accessed(tmp_path):
+    cache = AudioCache(str(tmp_path), 10 ** 6)
+    old, new = 'a' * 32, 'b' * 32
+    for key, age in ((old, 7200), (new, 3600)):
+        path = store(cache, key)
+        stamp = time.time_ns() - age * 10 ** 9
+        os.utime(path, ns=(stamp, stamp))
+    # Reading the older file makes it the most recently used
+    cache.lookup(old)
+
+    cache.max_files = 1
+    assert cache.collect() == 1
+    assert os.path.exists(cache.path_for(old, '.wav'))
+    assert not os.path.exists(cache.path_for(new, '.wav'))
+
+
+def cached_clip(web, text):
+    hf_key, _ = web.audio_cache_keys(text, 1.0)
+    return store(web.AUDIO_CACHE, hf_key, b'RIFF' + b'x' * 1000)
+
+
+def test_repeat_conditional_request_gets_304(web):
+    cached_clip(web, '侬好')
+    client = web.app.test_client()
+    url = '/speak/audio?text=侬好&format=original'
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    for _ in range(2):
+        again = client.get(url, headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.headers['ETag'] == etag
+
+
+def test_if_range_gets_a_partial_response(web):
+    cached_clip(web, '侬好')
+    client = web.app.test_client()
+    url = '/speak/audio?text=侬好&format=original'
+
+    etag = client.get(url).headers['ETag']
+    partial = client.get(url, headers={'Range': 'bytes=0-3', 'If-Range': etag})
+    assert partial.status_code == 206
+    assert partial.data == b'RIFF'
@@ -0,0 +1,70 @@
+import threading
+
+import clients
+from clients import ClientRegistry
+
+
+def test_concurrent_gets_build_once():
+    release = threading.Event()
+
+    def factory():
+        release.wait(5)
+        return object()
+
+    registry = ClientRegistry('test', factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert registry.builds == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_slow_build_does_not_block_failure_reports():
+    building = threading.Event()
+    release = threading.Event()
+
+    def factory():
+        building.set()
+        release.wait(5)
+        return object()
+
+    registry = ClientRegistry('test', factory)
+    builder = threading.Thread(target=registry.get)
+    builder.start()
+    assert building.wait(5)
+
+    reported = threading.Thread(target=lambda: (registry.report_failure(), registry.invalidate()))
+    reported.start()
+    reported.join(1)
+    assert not reported.is_alive()
+
+    release.set()
+    builder.join(5)
+    assert registry.builds == 1
+
+
+def test_failed_health_check_rebuilds(clock):
+    healthy = {'value': True}
+    registry = ClientRegistry('test', object, health_check=lambda client: healthy['value'])
+    first = registry.get()
+
+    healthy['value'] = False
+    assert registry.get() is first  # not due for a check yet
+    clock.advance(clients.CLIENT_HEALTH_INTERVAL + 1)
+    assert registry.get() is not first
+    assert registry.builds == 2
+
+
+def test_hf_client_is_unhealthy_once_its_heartbeat_ends():
+    class FakeGradioClient:
+        def __init__(self):
+            self.heartbeat = threading.Thread(target=lambda: None)
+            self.heartbeat.start()
+
+    client = FakeGradioClient()
+    client.heartbeat.join()
+    assert not clients._hf_tts_connected(client)
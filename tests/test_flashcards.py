@@ -0,0 +1,57 @@
+def card_order(response):
+    return [card['shanghainese'] for card in response.json['cards']]
+
+
+def first_category(web):
+    return next(iter(web.VOCAB_STORE.current().vocab))
+
+
+def test_same_seed_gives_same_order(web):
+    client = web.app.test_client()
+    category = first_category(web)
+    first = client.get(f'/flashcards/{category}?seed=3')
+    second = client.get(f'/flashcards/{category}?seed=3')
+    assert card_order(first) == card_order(second)
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.json['seed'] == 3
+    assert 'public' in first.headers['Cache-Control']
+
+
+def test_seeds_give_different_orders_of_every_card(web):
+    client = web.app.test_client()
+    category = first_category(web)
+    words = sorted(word['shanghainese'] for word in web.VOCAB_STORE.current().vocab[category])
+    orders = [card_order(client.get(f'/flashcards/{category}?seed={seed}'))
+              for seed in range(web.FLASHCARD_ORDERS)]
+    assert all(sorted(order) == words for order in orders)
+    assert len({tuple(order) for order in orders}) > 1
+
+
+def test_unseeded_requests_are_shuffled_privately(web):
+    client = web.app.test_client()
+    category = first_category(web)
+    responses = [client.get(f'/flashcards/{category}') for _ in range(30)]
+    assert len({tuple(card_order(response)) for response in responses}) > 1
+    assert all(response.headers['Cache-Control'] == 'private, no-cache' for response in responses)
+    seeded = client.get(f"/flashcards/{category}?seed={responses[0].json['seed']}")
+    assert card_order(seeded) == card_order(responses[0])
+
+
+def test_review_rejects_unknown_categories(web, tmp_path, monkeypatch):
+    from progress_store import ProgressStore
+
+    monkeypatch.setattr(web, 'PROGRESS_STORE', ProgressStore(str(tmp_path / 'progress.db')))
+    client = web.app.test_client()
+    category = first_category(web)
+    word = web.VOCAB_STORE.current().vocab[category][0]['shanghainese']
+
+    for bad in ('no_such_category', ['a', 'list']):
+        response = client.post('/flashcards/review', json={
+            'reviews': [{'word': word, 'category': bad, 'grade': 4}]})
+        assert response.status_code == 400
+        assert 'category' in response.json['error']
+
+    response = client.post('/flashcards/review', json={
+        'reviews': [{'word': word, 'category': category, 'grade': 4}]})
+    assert response.status_code == 200
+    assert word in response.json['cards']
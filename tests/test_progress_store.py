@@ -0,0 +1,38 @@
+from progress_store import ProgressStore
+
+
+def event_kinds(store, learner):
+    return [kind for kind, in store._connect().execute(
+        "SELECT kind FROM events WHERE learner = ? ORDER BY id", (learner,))]
+
+
+def test_compact_keeps_the_newest_answers_of_each_learner(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.db'), keep_events=3, compact_every=0)
+    for i in range(10):
+        store.record_answer('a', f'word{i}', True)
+    store.record_answer('b', 'word', False)
+
+    assert store.compact('a') == 7
+    answers = store._connect().execute(
+        "SELECT word FROM events WHERE learner = 'a' ORDER BY id").fetchall()
+    assert answers == [('word7',), ('word8',), ('word9',)]
+    assert event_kinds(store, 'b') == ['answer']
+    assert store.summary('a')['answers'] == 10
+
+
+def test_compact_keeps_session_results(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.db'), keep_events=1, compact_every=0)
+    for i in range(4):
+        store.record_session('a', 'quiz', i, 5)
+        store.record_answer('a', f'word{i}', True)
+
+    assert store.compact() == 3
+    assert event_kinds(store, 'a') == ['quiz', 'quiz', 'quiz', 'quiz', 'answer']
+    assert len(store.summary('a')['recent_quizzes']) == 4
+
+
+def test_writes_compact_the_writing_learner(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.db'), keep_events=2, compact_every=5)
+    for i in range(5):
+        store.record_answer('a', f'word{i}', True)
+    assert event_kinds(store, 'a') == ['answer', 'answer']
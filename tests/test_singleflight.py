@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.fixture
+def flight(tmp_path):
+    return SingleFlight(lock_dir=str(tmp_path), stripes=4)
+
+
+def run_concurrently(flight, key, fn, callers):
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except BaseException as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_callers_share_one_call(flight):
+    calls = []
+
+    def render():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'audio.wav'
+
+    results, errors = run_concurrently(flight, 'k', render, 4)
+    assert results == ['audio.wav'] * 4 and errors == [None] * 4
+    assert len(calls) == 1
+    assert flight.stats()['shared'] == 3
+
+
+def test_followers_get_the_leaders_exception(flight):
+    def render():
+        time.sleep(0.1)
+        raise RuntimeError('space down')
+
+    _, errors = run_concurrently(flight, 'k', render, 3)
+    assert all(isinstance(e, RuntimeError) for e in errors)
+
+
+@pytest.mark.parametrize('exit_error', [KeyboardInterrupt, SystemExit, GeneratorExit])
+def test_followers_take_over_when_the_leader_exits(flight, exit_error):
+    calls = []
+
+    def render():
+        calls.append(1)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise exit_error()
+        return 'audio.wav'
+
+    results, errors = run_concurrently(flight, 'k', render, 3)
+    assert isinstance(errors[0], exit_error)
+    # Not None: a follower ran the call again and shared its result
+    assert results[1:] == ['audio.wav', 'audio.wav']
+    assert len(calls) == 2
+
+
+def test_claim_finish_releases_the_followers(flight):
+    claim = flight.claim('k')
+    assert flight.claim('k') is None
+    results = []
+
+    follower = threading.Thread(target=lambda: results.append(flight.do('k', lambda: 'again')))
+    follower.start()
+    time.sleep(0.05)
+    claim.finish('streamed.mp3')
+    follower.join()
+    assert results == ['streamed.mp3']
+    # Finishing twice does nothing
+    claim.finish(None)
+    assert flight.in_flight() == 0
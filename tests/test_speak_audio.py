@@ -0,0 +1,25 @@
+import pytest
+
+
+def cache_clip(web, text, speed):
+    hf_key, _ = web.audio_cache_keys(text, speed)
+    tmp = web.AUDIO_CACHE.tmp_path('.wav')
+    with open(tmp, 'wb') as f:
+        f.write(b'RIFF....WAVE')
+    web.AUDIO_CACHE.store(hf_key, tmp)
+
+
+@pytest.mark.parametrize('speed', ['50', '0', '-1', '0.2', '4.5', 'nan', 'inf'])
+def test_speed_out_of_range_is_rejected(web, speed):
+    response = web.app.test_client().get(f'/speak/audio?text=侬好&speed={speed}&format=original')
+    assert response.status_code == 400
+    assert 'speed' in response.json['error']
+
+
+def test_near_equal_speeds_share_one_rendering(web):
+    cache_clip(web, '侬好', 1.25)
+    client = web.app.test_client()
+    for speed in ('1.25', '1.2500001', '1.249'):
+        response = client.get(f'/speak/audio?text=侬好&speed={speed}&format=original')
+        assert response.status_code == 200
+        assert response.data == b'RIFF....WAVE'
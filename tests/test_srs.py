@@ -0,0 +1,55 @@
+import pytest
+
+from srs import DAY, MIN_EASE, SRS_INITIAL_EASE, SRS_RELEARN_DELAY, CardState
+
+NOW = 1_700_000_000
+
+
+def test_new_card_is_not_scheduled():
+    state = CardState()
+    assert state.due is None
+    assert state.as_dict()['new'] is True
+
+
+def test_passing_grades_grow_the_interval():
+    first = CardState().review(4, NOW)
+    assert (first.interval, first.repetitions) == (1.0, 1)
+    assert first.due == NOW + DAY
+
+    second = first.review(4, NOW)
+    assert (second.interval, second.repetitions) == (6.0, 2)
+
+    third = second.review(4, NOW)
+    assert third.interval == round(6.0 * third.ease, 2)
+    assert third.due == NOW + third.interval * DAY
+
+
+def test_ease_follows_sm2():
+    assert CardState().review(5, NOW).ease == pytest.approx(SRS_INITIAL_EASE + 0.1)
+    assert CardState().review(4, NOW).ease == pytest.approx(SRS_INITIAL_EASE)
+    assert CardState().review(3, NOW).ease == pytest.approx(SRS_INITIAL_EASE - 0.14)
+
+
+def test_ease_never_drops_below_the_minimum():
+    state = CardState()
+    for _ in range(20):
+        state = state.review(0, NOW)
+    assert state.ease == MIN_EASE
+
+
+def test_failing_brings_the_card_back_soon():
+    state = CardState().review(4, NOW).review(4, NOW).review(1, NOW)
+    assert (state.interval, state.repetitions) == (0.0, 0)
+    assert state.due == NOW + SRS_RELEARN_DELAY
+
+
+def test_only_forgetting_a_learned_card_is_a_lapse():
+    assert CardState().review(1, NOW).lapses == 0
+    assert CardState().review(4, NOW).review(1, NOW).lapses == 1
+
+
+def test_grade_out_of_range():
+    with pytest.raises(ValueError):
+        CardState().review(6, NOW)
+    with pytest.raises(ValueError):
+        CardState().review(-1, NOW)
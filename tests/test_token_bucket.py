@@ -0,0 +1,38 @@
+import pytest
+
+from batch_tts import TokenBucket
+
+
+def test_starts_full_then_paces(clock):
+    bucket = TokenBucket(60, burst=3)
+    for _ in range(3):
+        assert bucket.wait_time() == 0
+        bucket.take()
+    assert bucket.wait_time() == pytest.approx(1.0)
+
+    clock.advance(0.5)
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.wait_time() == 0
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    bucket = TokenBucket(60, burst=2)
+    bucket.take()
+    bucket.take()
+    clock.advance(3600)
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time() > 0
+
+
+def test_default_burst_is_five_seconds_of_calls(clock):
+    assert TokenBucket(600).capacity == 50
+    # Slow rates still allow one call right away
+    assert TokenBucket(6).capacity == 1
+
+
+@pytest.mark.parametrize('rate', [0, -5])
+def test_rate_must_be_positive(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
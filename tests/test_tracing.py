@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    """The app's tracer, tracing every request to a temporary file"""
+    monkeypatch.setattr(tracing.TRACER, 'path', str(tmp_path / 'traces.jsonl'))
+    monkeypatch.setattr(tracing.TRACER, 'sample_rate', 1.0)
+    return tracing.TRACER
+
+
+def call_asgi(app, method, path, body):
+    messages = []
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': []}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = messages[0]['status']
+    payload = json.loads(b''.join(m.get('body', b'') for m in messages[1:]))
+    return status, payload
+
+
+@pytest.mark.parametrize('body', [b'{not json', b'["a list"]', b'\xff'])
+@pytest.mark.parametrize('path', ['/translate', '/translate/stream', '/speak'])
+def test_asgi_rejects_invalid_json(tracer, path, body):
+    import asgi_app
+
+    status, payload = call_asgi(asgi_app.app, 'POST', path, body)
+    assert status == 400
+    assert payload == {'error': 'Invalid JSON', 'success': False}
+
+
+def test_asgi_handler_errors_are_not_reported_as_invalid_json(tracer, monkeypatch):
+    import asgi_app
+
+    async def broken(text, source_lang='mandarin'):
+        raise ValueError('upstream said no')
+
+    monkeypatch.setattr(asgi_app, 'get_shanghainese_translation_async', broken)
+    status, payload = call_asgi(asgi_app.app, 'POST', '/translate', b'{"text": "hi"}')
+    assert status == 500
+    assert payload['error'] == 'upstream said no'
+
+
+def test_flask_request_span_is_reset(tracer, web):
+    client = web.app.test_client()
+    assert client.get('/vocabulary/version').status_code == 200
+    assert tracing.current_span() is tracing.NULL_SPAN
+
+
+def test_flask_request_span_is_reset_when_the_view_fails(tracer, web, monkeypatch):
+    def broken():
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(web.VOCAB_STORE, 'current', broken)
+    assert web.app.test_client().get('/vocabulary/version').status_code == 500
+    assert tracing.current_span() is tracing.NULL_SPAN
@@ -0,0 +1,65 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch_translator import BatchTranslator
+from translation_cache import TranslationCache
+
+
+@pytest.fixture
+def batch(web, tmp_path, monkeypatch):
+    """web_app with a batch translator that answers locally on a 2-thread pool"""
+    translator = BatchTranslator(TranslationCache(str(tmp_path / 'translations.db')), web.TRANSLATION_PROMPT,
+                                 web.TRANSLATION_MODEL, batch_size=2,
+                                 executor=ThreadPoolExecutor(max_workers=2))
+    translator.threads = set()
+
+    def request(texts):
+        translator.threads.add(threading.current_thread().name)
+        return [f"沪:{text}" for text in texts]
+
+    monkeypatch.setattr(translator, '_request', request)
+    monkeypatch.setattr(web, 'BATCH_TRANSLATOR', translator)
+    yield translator
+    translator.executor.shutdown()
+
+
+def post(web, lines):
+    body = '\n'.join(json.dumps(line, ensure_ascii=False) for line in lines)
+    response = web.app.test_client().post('/translate/batch', data=body.encode('utf-8'))
+    return response, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_every_record_then_the_summary(web, batch):
+    response, lines = post(web, [f"句子{i}" for i in range(7)])
+    assert response.status_code == 200
+    assert sorted(line['translation'] for line in lines[:-1]) == sorted(f"沪:句子{i}" for i in range(7))
+    assert lines[-1]['success'] and lines[-1]['summary']['translated'] == 7
+
+
+def test_concurrent_batches_share_the_pool(web, batch):
+    threads = [threading.Thread(target=post, args=(web, [f"{n}-{i}" for i in range(6)])) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert 0 < len(batch.threads) <= 2
+
+
+def test_cached_batch_is_answered_without_requests(web, batch):
+    post(web, ['侬好', '再会'])
+    _, lines = post(web, ['侬好', '再会'])
+    assert [line['cached'] for line in lines[:-1]] == [True, True]
+    assert lines[-1]['summary']['cached'] == 2
+
+
+def test_oversized_batches_are_rejected(web, batch, monkeypatch):
+    monkeypatch.setattr(web, 'BATCH_TRANSLATE_MAX_RECORDS', 3)
+    response, _ = post(web, ['a', 'b', 'c', 'd'])
+    assert response.status_code == 413
+
+    monkeypatch.setattr(web, 'BATCH_TRANSLATE_MAX_BYTES', 10)
+    response, _ = post(web, ['a sentence longer than ten bytes'])
+    assert response.status_code == 413
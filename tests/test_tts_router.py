@@ -0,0 +1,143 @@
+import pytest
+
+from tts_router import CLOSED, HALF_OPEN, OPEN, BackendRouter, BackendUnavailable, CircuitBreaker
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.acquire()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    assert not breaker.acquire()
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_single_probe_after_reset_timeout(breaker, clock):
+    open_breaker(breaker)
+    clock.advance(29)
+    assert not breaker.probe_due()
+    assert breaker.retry_after() == pytest.approx(1)
+
+    clock.advance(1)
+    assert breaker.probe_due() and breaker.available()
+    assert breaker.retry_after() == 0
+    assert breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    # Only one call is let through while the probe is out
+    assert not breaker.available()
+    assert not breaker.acquire()
+
+
+def test_successful_probe_closes(breaker, clock):
+    open_breaker(breaker)
+    clock.advance(30)
+    breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0
+    assert breaker.acquire() and breaker.acquire()
+
+
+def test_failed_probe_reopens(breaker, clock):
+    open_breaker(breaker)
+    clock.advance(30)
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.acquire()
+    clock.advance(30)
+    assert breaker.acquire()
+
+
+@pytest.fixture
+def router(clock):
+    router = BackendRouter(['hf', 'openai'], {'hf': 1, 'openai': 1})
+    for breaker in router.breakers.values():
+        breaker.failure_threshold = 1
+    return router
+
+
+def test_order_skips_open_circuits(router):
+    assert router.order() == ['hf', 'openai']
+    router.breakers['hf'].record_failure()
+    assert router.order() == ['openai']
+
+
+def test_order_is_empty_while_every_circuit_is_open(router, clock):
+    for breaker in router.breakers.values():
+        breaker.record_failure()
+    assert router.order() == []
+    with pytest.raises(BackendUnavailable):
+        with router.track('hf'):
+            pass
+
+    # Each comes back as a probe once its reset period is over
+    clock.advance(router.breakers['hf'].reset_timeout)
+    assert router.order() == ['hf', 'openai']
+
+
+def test_track_records_outcomes(router):
+    with router.track('hf'):
+        pass
+    with pytest.raises(RuntimeError):
+        with router.track('hf'):
+            raise RuntimeError('space down')
+    assert router.breakers['hf'].state == OPEN
+    stats = router.stats()['hf']
+    assert stats['calls'] == 2 and stats['error_rate'] == 0.5
+
+
+def bad_request():
+    import httpx
+    import openai
+    request = httpx.Request('POST', 'https://api.openai.com/v1/audio/speech')
+    return openai.BadRequestError('speed out of range', response=httpx.Response(400, request=request), body=None)
+
+
+@pytest.mark.parametrize('error', [bad_request, lambda: ValueError('bad speed')])
+def test_request_errors_do_not_move_the_breaker(router, error):
+    for _ in range(5):
+        with pytest.raises(Exception):
+            with router.track('openai'):
+                raise error()
+    assert router.breakers['openai'].state == CLOSED
+    assert router.stats()['openai']['error_rate'] == 0.0
+    assert router.order() == ['hf', 'openai']
+
+
+def test_request_error_frees_the_probe(router, clock):
+    router.breakers['hf'].record_failure()
+    clock.advance(router.breakers['hf'].reset_timeout)
+    with pytest.raises(ValueError):
+        with router.track('hf'):
+            raise ValueError('bad input')
+    # Still half-open, and the next call may probe
+    assert router.breakers['hf'].state == HALF_OPEN
+    assert router.breakers['hf'].acquire()
+
+
+@pytest.mark.parametrize('status, counted', [(400, False), (404, False), (429, True), (500, True), (503, True)])
+def test_status_codes(status, counted):
+    from tts_router import is_request_error
+    error = type('StatusError', (Exception,), {'status_code': status})()
+    assert is_request_error(error) is not counted
+    assert not is_request_error(TimeoutError())
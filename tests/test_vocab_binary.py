@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from vocab_binary import BinaryVocabulary, compile_vocabulary, load_vocabulary_file, word_field
+
+VOCAB = {
+    'greetings': [
+        {'shanghainese': '侬好', 'mandarin': '你好', 'english': 'hello', 'pinyin': 'nóng hǎo'},
+        {'shanghainese': '再会', 'mandarin': '再见', 'english': 'goodbye', 'pinyin': ''},
+    ],
+    'empty': [],
+    'food': [
+        {'shanghainese': '小笼包', 'mandarin': '小笼包', 'english': '', 'note': 'soup dumplings'},
+        {'shanghainese': '侬好', 'mandarin': '你好', 'english': 'hello'},
+    ],
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    json_path = tmp_path / 'vocab.json'
+    json_path.write_text(json.dumps(VOCAB, ensure_ascii=False), encoding='utf-8')
+    return str(json_path), str(tmp_path / 'vocab.bin')
+
+
+@pytest.fixture
+def binary(paths):
+    compile_vocabulary(*paths)
+    vocab = BinaryVocabulary(paths[1])
+    yield vocab
+    vocab.close()
+
+
+def test_round_trip(binary):
+    assert list(binary) == list(VOCAB)
+    assert {category: binary[category].copy() for category in binary} == VOCAB
+    assert binary.word_count == 4
+
+
+def test_empty_and_missing_fields_are_kept_apart(binary):
+    assert binary['greetings'][1]['pinyin'] == ''
+    assert binary['food'][0]['english'] == ''
+    assert 'pinyin' not in binary['food'][0]
+    assert 'note' not in binary['food'][1]
+
+
+def test_single_field_access(binary):
+    food = binary['food']
+    assert word_field(food, 0, 'note') == 'soup dumplings'
+    assert word_field(food, 1, 'note') == ''
+    assert word_field(food, 0, 'no such field') == ''
+    assert word_field(VOCAB['food'], 1, 'note') == ''
+
+
+def test_category_view_is_a_sequence(binary):
+    greetings = binary['greetings']
+    assert len(greetings) == 2
+    assert greetings[-1] == VOCAB['greetings'][-1]
+    assert greetings[:1] == VOCAB['greetings'][:1]
+    assert len(binary['empty']) == 0
+    with pytest.raises(IndexError):
+        greetings[2]
+
+
+def test_strings_are_stored_once(paths):
+    size = compile_vocabulary(*paths)
+    assert open(paths[1], 'rb').read().count('侬好'.encode('utf-8')) == 1
+    assert size == os.path.getsize(paths[1])
+
+
+def test_load_prefers_an_up_to_date_binary(paths):
+    json_path, binary_path = paths
+    assert isinstance(load_vocabulary_file(json_path, binary_path), dict)
+
+    compile_vocabulary(json_path, binary_path)
+    assert isinstance(load_vocabulary_file(json_path, binary_path), BinaryVocabulary)
+
+    # Edited after compiling: the JSON wins until the binary is rebuilt
+    stamp = os.path.getmtime(binary_path) + 10
+    os.utime(json_path, (stamp, stamp))
+    assert load_vocabulary_file(json_path, binary_path) == VOCAB
+
+
+def test_other_versions_fall_back_to_json(paths):
+    json_path, binary_path = paths
+    compile_vocabulary(json_path, binary_path)
+    with open(binary_path, 'r+b') as f:
+        f.seek(4)
+        f.write(b'\x01\x00')
+    with pytest.raises(ValueError):
+        BinaryVocabulary(binary_path)
+    assert load_vocabulary_file(json_path, binary_path) == VOCAB
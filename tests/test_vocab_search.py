@@ -0,0 +1,101 @@
+import pytest
+
+from vocab_search import EXACT, PREFIX, SUBSTRING, WORD_PREFIX, PrefixIndex, VocabularyIndex, normalize_latin
+
+
+def test_prefix_index():
+    prefixes = PrefixIndex([('tea', 1), ('team', 2), ('to', 3), ('tea', 4), ('tea', 1)])
+    assert prefixes.lookup('t') == {1, 2, 3, 4}
+    assert prefixes.lookup('tea') == {1, 2, 4}
+    assert prefixes.lookup('x') == set()
+    assert prefixes.exact('tea') == {1, 4}
+    assert prefixes.exact('te') == set()
+    assert prefixes.exact('team') == {2}
+    assert prefixes.keys == ['tea', 'tea', 'team', 'to']
+    assert prefixes.keys[0] is prefixes.keys[1]
+
+
+def test_normalize_latin():
+    assert normalize_latin('  Zä  Wēi! ') == 'za wei'
+
+
+def word(shanghainese, mandarin, english, pinyin=''):
+    return {'shanghainese': shanghainese, 'mandarin': mandarin, 'english': english, 'pinyin': pinyin}
+
+
+VOCAB = {
+    'food': [
+        word('茶', '茶', 'tea'),
+        word('红茶', '红茶', 'black tea'),
+        word('茶叶蛋', '茶叶蛋', 'tea egg'),
+        word('老师', '老师', 'teacher'),
+    ],
+    'greetings': [
+        word('侬好', '你好', 'hello', 'nóng hǎo'),
+        word('味道', '味道', 'taste', 'zä wēi'),
+    ],
+}
+
+
+@pytest.fixture
+def index():
+    return VocabularyIndex(VOCAB)
+
+
+def english(result):
+    return [entry['english'] for entry in result['results']]
+
+
+def test_latin_ranking(index):
+    # Exact, then shortest prefix matches, then entries with a word starting with it
+    assert english(index.search('tea')) == ['tea', 'tea egg', 'teacher', 'black tea']
+    assert index._search_latin('tea')[:1] == [(EXACT, 3, 0)]
+    ranks = {item_id: rank for rank, _, item_id in index._search_latin('tea')}
+    assert ranks == {0: EXACT, 2: PREFIX, 3: PREFIX, 1: WORD_PREFIX}
+
+
+def test_every_query_word_must_match(index):
+    assert english(index.search('black t')) == ['black tea']
+    assert english(index.search('black egg')) == []
+
+
+def test_diacritics_and_spaces_are_ignored(index):
+    assert english(index.search('za wei')) == ['taste']
+    assert english(index.search('ZAWEI')) == ['taste']
+    assert english(index.search('nong')) == ['hello']
+
+
+def test_cjk_ranking(index):
+    assert english(index.search('茶')) == ['tea', 'tea egg', 'black tea']
+    ranks = sorted(index._search_cjk('茶'))
+    assert [rank for rank, _, _ in ranks] == [EXACT, PREFIX, SUBSTRING]
+    # Mandarin matches too
+    assert english(index.search('你好')) == ['hello']
+
+
+def test_results_carry_their_category(index):
+    assert index.search('hello')['results'][0]['category'] == 'greetings'
+
+
+def test_pagination(index):
+    page = index.search('t', page=2, per_page=2)
+    assert page['total'] == 5
+    assert english(page) == english(index.search('t', per_page=5))[2:4]
+
+
+def test_contained_in(index):
+    assert [w['english'] for w in index.contained_in('我想要茶叶蛋', 'shanghainese')] == ['tea egg', 'tea']
+    assert [w['english'] for w in index.contained_in('A black tea, please', 'english')] == ['black tea', 'tea']
+    assert index.contained_in('teapot', 'english') == []
+
+
+def test_find_shanghainese(index):
+    assert index.find_shanghainese('红茶') == ('food', 1)
+    assert index.find_shanghainese('味道') == ('greetings', 1)
+    assert index.find_shanghainese('红') is None
+    assert index.find_shanghainese('') is None
+
+
+def test_find_shanghainese_returns_the_first_duplicate():
+    vocab = {'a': [word('茶', '茶', 'tea')], 'b': [word('侬好', '你好', 'hello'), word('茶', '茶', 'tea again')]}
+    assert VocabularyIndex(vocab).find_shanghainese('茶') == ('a', 0)
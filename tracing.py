@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Tracing
+Per-request spans exported as OTLP JSON lines to a local file
+
+Each sampled request gets a trace: a span for the request itself and one
+for every stage wrapped in span() below it (cache lookups, client setup,
+upstream calls, file copies). Once the request's span and every span below
+it have ended (a streamed body can outlive the request's span), the whole
+trace is appended to TRACE_FILE as one OTLP/JSON ExportTraceServiceRequest
+per line, the format the OpenTelemetry Collector's otlpjsonfile receiver reads.
+Writing happens on a background thread. With TRACE_FILE unset, span()
+returns a shared no-op and costs one function call.
+"""
+
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+# Where finished traces are appended (unset disables tracing)
+TRACE_FILE = os.getenv('TRACE_FILE', '')
+# Share of requests traced
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 1.0))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'shanghainese-learning-app')
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current = contextvars.ContextVar('span', default=None)
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_attributes(attributes):
+    return [{'key': key, 'value': otlp_value(value)} for key, value in attributes.items()]
+
+
+class NullSpan:
+    """Stands in for a span when the request is not traced"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class UnsampledSpan(NullSpan):
+    """Root of a request that was not sampled, so its stages are skipped too"""
+
+    def __enter__(self):
+        self._token = _current.set(NULL_SPAN)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass
+        return False
+
+
+class Trace:
+    """The finished spans of one request, and how many are still open"""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.open = 0
+        self.root_ended = False
+        self.exported = False
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.open += 1
+
+    def finished(self, span):
+        """Record an ended span; True once the trace is complete and due for export"""
+        with self._lock:
+            self.open -= 1
+            if self.exported:
+                # Started after the trace was written out
+                return False
+            self.spans.append(span)
+            if span.parent_id is None:
+                self.root_ended = True
+            if self.root_ended and self.open == 0:
+                self.exported = True
+                return True
+            return False
+
+
+class Span:
+    """One timed stage of a trace"""
+
+    def __init__(self, tracer, name, trace, parent_id, kind, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.status = None
+        self.start = self.end = 0
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        self.trace.started()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Ended in another context (a generator finished by another task)
+            pass
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.status = {'code': STATUS_ERROR, 'message': f"{exc_type.__name__}: {exc}"}
+        if self.trace.finished(self):
+            self.tracer.export(self.trace)
+        return False
+
+    def as_otlp(self, trace_id):
+        span = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': otlp_attributes(self.attributes),
+            'status': self.status or {'code': STATUS_OK},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Tracer:
+    """Starts spans and writes finished traces to a file from a background thread"""
+
+    def __init__(self, path=TRACE_FILE, sample_rate=TRACE_SAMPLE_RATE, service_name=TRACE_SERVICE_NAME):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def span(self, name, kind=KIND_INTERNAL, **attributes):
+        """Context manager timing one stage; a new trace if no span is active"""
+        if not self.path:
+            return NULL_SPAN
+        parent = _current.get()
+        if parent is NULL_SPAN:
+            return NULL_SPAN
+        if parent is None:
+            return self.start_trace(name, kind, **attributes)
+        return Span(self, name, parent.trace, parent.span_id, kind, attributes)
+
+    def start_trace(self, name, kind=KIND_SERVER, **attributes):
+        """Root span of a new (sampled) trace, whatever span is active"""
+        if not self.path:
+            return NULL_SPAN
+        if random.random() >= self.sample_rate:
+            return UnsampledSpan()
+        return Span(self, name, Trace(), None, kind, attributes)
+
+    def export(self, trace):
+        self._ensure_writer()
+        self._queue.put(trace)
+
+    def _ensure_writer(self):
+        # One writer thread per process (threads do not survive a fork)
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        threading.Thread(target=self._write_forever, name='trace-writer', daemon=True).start()
+
+    def _write_forever(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                line = json.dumps(self.as_otlp(trace), ensure_ascii=False, separators=(',', ':')) + '\n'
+                # One O_APPEND write per trace keeps lines whole across workers
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line.encode('utf-8'))
+                finally:
+                    os.close(fd)
+                self.exported += 1
+            except (OSError, TypeError, ValueError):
+                self.dropped += 1
+
+    def as_otlp(self, trace):
+        """An ExportTraceServiceRequest holding the finished spans of one trace"""
+        return {'resourceSpans': [{
+            'resource': {'attributes': otlp_attributes({
+                'service.name': self.service_name,
+                'process.pid': os.getpid(),
+            })},
+            'scopeSpans': [{
+                'scope': {'name': 'shanghainese'},
+                'spans': [span.as_otlp(trace.trace_id) for span in trace.spans],
+            }],
+        }]}
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'file': self.path or None,
+            'sample_rate': self.sample_rate,
+            'exported': self.exported,
+            'dropped': self.dropped,
+        }
+
+
+TRACER = Tracer()
+
+
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Time a stage of the current request: with span('hf_tts.predict'): ..."""
+    return TRACER.span(name, kind, **attributes)
+
+
+def current_span():
+    """The active span (a no-op span outside a traced request)"""
+    current = _current.get()
+    return current if current is not None else NULL_SPAN
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Translation Cache
+Memoizes GPT-4o translations in an in-process LRU backed by SQLite
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from audio_cache import normalize_text
+
+TRANSLATION_CACHE_DB = os.getenv('TRANSLATION_CACHE_DB', 'translation_cache.db')
+TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', 100000))
+TRANSLATION_CACHE_MEMORY_ENTRIES = int(os.getenv('TRANSLATION_CACHE_MEMORY_ENTRIES', 2048))
+
+# Prune the SQLite store after this many writes
+PRUNE_EVERY = 500
+
+
+def cache_key(text, source_lang, prompt_version, model):
+    """Hash of (normalized input, source language, prompt version, model)"""
+    raw = '\x1f'.join([normalize_text(text), source_lang, prompt_version, model])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    """
+    Two-level translation cache
+
+    The in-process LRU answers repeated phrases without touching disk. The
+    SQLite store (WAL mode) survives restarts and is shared by every worker
+    on the host. A ttl of 0 keeps entries until they are evicted by size.
+    """
+
+    def __init__(self, db_path=TRANSLATION_CACHE_DB, ttl=TRANSLATION_CACHE_TTL,
+                 max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+                 memory_entries=TRANSLATION_CACHE_MEMORY_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (translation, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                translation TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS translations_created ON translations (created)")
+        conn.commit()
+
+    def _connect(self):
+        """One SQLite connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expires_at(self, created):
+        return created + self.ttl if self.ttl else float('inf')
+
+    def get(self, text, source_lang, prompt_version, model, count=True):
+        """Return a cached translation or None (count=False skips the stats)"""
+        key = cache_key(text, source_lang, prompt_version, model)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                translation, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    if count:
+                        self.memory_hits += 1
+                    return translation
+                del self._memory[key]
+
+        row = self._connect().execute(
+            "SELECT translation, created FROM translations WHERE key = ?", (key,)
+        ).fetchone()
+
+        with self._lock:
+            if row is not None and self._expires_at(row[1]) > now:
+                self._remember(key, row[0], self._expires_at(row[1]))
+                if count:
+                    self.disk_hits += 1
+                return row[0]
+            if count:
+                self.misses += 1
+            return None
+
+    def set(self, text, source_lang, prompt_version, model, translation):
+        """Store a translation in both levels"""
+        key = cache_key(text, source_lang, prompt_version, model)
+        created = time.time()
+
+        with self._lock:
+            self._remember(key, translation, self._expires_at(created))
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO translations (key, translation, created) VALUES (?, ?, ?)",
+            (key, translation, created)
+        )
+        conn.commit()
+
+        if prune:
+            self.prune()
+
+    def _remember(self, key, translation, expires_at):
+        self._memory[key] = (translation, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def prune(self):
+        """Delete expired rows and the oldest rows beyond max_entries"""
+        conn = self._connect()
+        if self.ttl:
+            conn.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.ttl,))
+        conn.execute("""
+            DELETE FROM translations WHERE key IN (
+                SELECT key FROM translations ORDER BY created DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+
+    def stats(self):
+        """Hit/miss counters and store sizes"""
+        disk_entries = self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+            }
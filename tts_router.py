@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+TTS Router
+Circuit breakers and adaptive backend selection for Shanghainese TTS
+
+Both the web app and the CLI ask the router which backend to try next.
+A backend that keeps failing is skipped (circuit open) until a single
+half-open probe succeeds, so an outage of the Hugging Face space costs one
+timeout per reset period instead of one per request.
+"""
+
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from clients import HF_TTS_CLIENT, OPENAI_CLIENT
+from metrics import track_upstream
+from tracing import span
+
+HF_TTS_VOICE = 'default'
+OPENAI_TTS_VOICE = 'alloy'
+AUDIO_CHUNK_SIZE = 16 * 1024
+# Speaking speeds OpenAI TTS accepts
+MIN_SPEED = 0.25
+MAX_SPEED = 4.0
+
+# Per-backend timeouts (seconds)
+HF_TTS_TIMEOUT = float(os.getenv('HF_TTS_TIMEOUT', 20))
+OPENAI_TTS_TIMEOUT = float(os.getenv('OPENAI_TTS_TIMEOUT', 15))
+
+# Open the circuit after this many consecutive failures...
+TTS_BREAKER_FAILURES = int(os.getenv('TTS_BREAKER_FAILURES', 5))
+# ...and let a probe through again after this many seconds
+TTS_BREAKER_RESET = float(os.getenv('TTS_BREAKER_RESET', 30))
+# Rolling window of recent calls used for latency/error statistics
+TTS_STATS_WINDOW = int(os.getenv('TTS_STATS_WINDOW', 100))
+# A backend failing more often than this over the last TTS_DEGRADED_PERIOD
+# seconds is tried last
+TTS_DEGRADED_ERROR_RATE = float(os.getenv('TTS_DEGRADED_ERROR_RATE', 0.5))
+TTS_DEGRADED_PERIOD = float(os.getenv('TTS_DEGRADED_PERIOD', 60))
+TTS_DEGRADED_MIN_CALLS = int(os.getenv('TTS_DEGRADED_MIN_CALLS', 5))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend's circuit is open"""
+
+
+def is_request_error(error):
+    """
+    Whether a call failed because of what was asked (bad input, a 4xx
+    answer) rather than because the backend is unwell
+
+    Only backend faults (transport errors, timeouts, 5xx, 429) may open a
+    circuit; otherwise one client sending bad input could cut TTS off for
+    everyone.
+    """
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return 400 <= status < 500 and status not in (408, 429)
+    return isinstance(error, (ValueError, TypeError))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold=TTS_BREAKER_FAILURES, reset_timeout=TTS_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def available(self):
+        """Whether a call would be let through (does not claim the probe)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self.probing
+
+    def probe_due(self):
+        """Open long enough that the next call should be a half-open probe"""
+        return self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def retry_after(self):
+        """Seconds until a call would be let through (0 if one would be now)"""
+        if self.state == OPEN:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        if self.state == HALF_OPEN and self.probing:
+            # The probe's own outcome decides; it is bounded by the backend timeout
+            return self.reset_timeout
+        return 0.0
+
+    def acquire(self):
+        """Claim permission for one call, moving open -> half-open when due"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_inconclusive(self):
+        """The call said nothing about the backend's health (a request error)"""
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class BackendStats:
+    """Rolling latency and error statistics over the last N calls"""
+
+    def __init__(self, window=TTS_STATS_WINDOW):
+        self.calls = deque(maxlen=window)  # (finished_at, latency, ok)
+        self.total = 0
+        self.rejected = 0
+
+    def record(self, latency, ok):
+        self.calls.append((time.monotonic(), latency, ok))
+        self.total += 1
+
+    def recent(self, period):
+        since = time.monotonic() - period
+        return [ok for finished_at, _, ok in self.calls if finished_at >= since]
+
+    def error_rate(self):
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, _, ok in self.calls if not ok) / len(self.calls)
+
+    def degraded(self):
+        """Failing often lately, but not (yet) enough to open the circuit"""
+        recent = self.recent(TTS_DEGRADED_PERIOD)
+        if len(recent) < TTS_DEGRADED_MIN_CALLS:
+            return False
+        return recent.count(False) / len(recent) > TTS_DEGRADED_ERROR_RATE
+
+    def percentile(self, p):
+        latencies = sorted(latency for _, latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+class BackendRouter:
+    """Orders backends by preference, skipping open circuits and demoting degraded ones"""
+
+    def __init__(self, preference, timeouts):
+        self.preference = list(preference)
+        self.timeouts = dict(timeouts)
+        self.breakers = {name: CircuitBreaker() for name in self.preference}
+        self.stats_by_backend = {name: BackendStats() for name in self.preference}
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Backends to try, best first; empty while every circuit is open"""
+        with self._lock:
+            available = [name for name in self.preference if self.breakers[name].available()]
+            # A pending probe goes in its preferred slot so recovery is noticed
+            healthy = [name for name in available
+                       if self.breakers[name].probe_due() or not self.stats_by_backend[name].degraded()]
+            degraded = [name for name in available if name not in healthy]
+            return healthy + degraded
+
+    def timeout(self, name):
+        return self.timeouts[name]
+
+    def retry_after(self):
+        """Seconds until some backend will take a call again"""
+        with self._lock:
+            return min(breaker.retry_after() for breaker in self.breakers.values())
+
+    @contextmanager
+    def track(self, name):
+        """
+        Run one call through a backend's circuit breaker
+
+        Raises BackendUnavailable if the circuit is open; records latency
+        and success or failure otherwise. Request errors (see
+        is_request_error) are re-raised without counting against the backend.
+        """
+        with self._lock:
+            if not self.breakers[name].acquire():
+                self.stats_by_backend[name].rejected += 1
+                raise BackendUnavailable(f"{name} circuit is open")
+
+        start = time.monotonic()
+        try:
+            with track_upstream(f"{name}_tts"):
+                yield
+        except GeneratorExit:
+            # A streaming caller stopped reading; the backend itself was fine
+            with self._lock:
+                self.breakers[name].record_success()
+            raise
+        except BaseException as e:
+            with self._lock:
+                if is_request_error(e):
+                    self.breakers[name].record_inconclusive()
+                else:
+                    self.breakers[name].record_failure()
+                    self.stats_by_backend[name].record(time.monotonic() - start, False)
+            raise
+        with self._lock:
+            if self.breakers[name].state == HALF_OPEN:
+                # Recovered: forget the outage so it is no longer demoted
+                self.stats_by_backend[name].calls.clear()
+            self.breakers[name].record_success()
+            self.stats_by_backend[name].record(time.monotonic() - start, True)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for name in self.preference:
+                breaker = self.breakers[name]
+                stats = self.stats_by_backend[name]
+                p50 = stats.percentile(0.5)
+                p95 = stats.percentile(0.95)
+                result[name] = {
+                    'state': breaker.state,
+                    'consecutive_failures': breaker.failures,
+                    'calls': stats.total,
+                    'rejected': stats.rejected,
+                    'error_rate': round(stats.error_rate(), 4),
+                    'degraded': stats.degraded(),
+                    'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                    'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                    'timeout': self.timeouts[name],
+                }
+            return result
+
+
+TTS_ROUTER = BackendRouter(['hf', 'openai'], {'hf': HF_TTS_TIMEOUT, 'openai': OPENAI_TTS_TIMEOUT})
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+def synthesize_hf(text, speed, output_file):
+    """Render text with the Hugging Face Shanghainese TTS space into output_file"""
+    with TTS_ROUTER.track('hf'):
+        with span('hf_tts.client') as client_span:
+            builds = HF_TTS_CLIENT.builds
+            client = HF_TTS_CLIENT.get()
+            # True when this call paid for building the gradio Client
+            client_span.set_attribute('built', HF_TTS_CLIENT.builds != builds)
+        with span('hf_tts.predict', text_length=len(text)):
+            job = client.submit(text, False, speed, fn_index=1)
+            try:
+                result = job.result(timeout=TTS_ROUTER.timeout('hf'))
+            except Exception as e:
+                job.cancel()
+                if not is_request_error(e):
+                    HF_TTS_CLIENT.report_failure()
+                raise
+        HF_TTS_CLIENT.report_success()
+
+    if isinstance(result, dict) and 'name' in result:
+        audio_path = result['name']
+    else:
+        audio_path = result
+
+    with span('hf_tts.copy'):
+        shutil.copy(audio_path, output_file)
+
+
+def stream_openai_tts(text, speed):
+    """Yield OpenAI TTS audio bytes as they arrive"""
+    with TTS_ROUTER.track('openai'), span('openai_tts.stream', text_length=len(text)):
+        client = OPENAI_CLIENT.get().with_options(timeout=TTS_ROUTER.timeout('openai'))
+
+        # Use OpenAI's Chinese voice (alloy works well for Chinese)
+        with client.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=OPENAI_TTS_VOICE,
+            input=text,
+            speed=speed
+        ) as response:
+            for chunk in response.iter_bytes(AUDIO_CHUNK_SIZE):
+                yield chunk
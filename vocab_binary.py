@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Binary Vocabulary
+Compiles shanghainese_vocab.json into a compact, memory-mapped format
+
+Usage:
+    python vocab_binary.py [shanghainese_vocab.json] [shanghainese_vocab.bin]
+
+Layout (little-endian):
+    header      magic, version, field count, category count, word count
+    fields      (offset, length) of each field name in the string pool
+    categories  (name offset, name length, first word, word count)
+    words       word count x field count x (offset, length), MISSING where
+                the word has no such field ('' is stored like any string)
+    pool        deduplicated UTF-8 strings
+
+Every worker maps the same file, so the page cache holds one shared copy,
+and an entry is only decoded into a dict when it is accessed.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'SHVB'
+VERSION = 2
+HEADER = struct.Struct('<4sHHII')
+STRING_REF = struct.Struct('<II')
+CATEGORY = struct.Struct('<IIII')
+# String reference of a field the word does not have
+MISSING = (0xFFFFFFFF, 0)
+
+VOCAB_FILE = "shanghainese_vocab.json"
+VOCAB_BINARY_FILE = os.getenv('VOCAB_BINARY_FILE', "shanghainese_vocab.bin")
+
+
+def compile_vocabulary(json_path=VOCAB_FILE, binary_path=VOCAB_BINARY_FILE):
+    """Write the binary form of a JSON vocabulary file"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        vocab = json.load(f)
+
+    fields = []
+    for words in vocab.values():
+        for word in words:
+            for field in word:
+                if field not in fields:
+                    fields.append(field)
+
+    pool = bytearray()
+    interned = {}
+
+    def intern(text):
+        if text not in interned:
+            data = text.encode('utf-8')
+            interned[text] = (len(pool), len(data))
+            pool.extend(data)
+        return interned[text]
+
+    field_refs = [intern(field) for field in fields]
+    category_rows = []
+    word_rows = []
+    for category, words in vocab.items():
+        category_rows.append((*intern(category), len(word_rows) // len(fields), len(words)))
+        for word in words:
+            for field in fields:
+                word_rows.append(intern(word[field]) if field in word else MISSING)
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(fields), len(category_rows), len(word_rows) // len(fields)))
+    for ref in field_refs:
+        out += STRING_REF.pack(*ref)
+    for row in category_rows:
+        out += CATEGORY.pack(*row)
+    for ref in word_rows:
+        out += STRING_REF.pack(*ref)
+    out += pool
+
+    # Write-then-rename so readers never map a half-written file
+    tmp_path = binary_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(out)
+    os.replace(tmp_path, binary_path)
+    return len(out)
+
+
+class CategoryView(Sequence):
+    """Read-only list of the words in one category, decoded on access"""
+
+    def __init__(self, vocab, first, count):
+        self._vocab = vocab
+        self._first = first
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('word index out of range')
+        return self._vocab.word(self._first + index)
+
+    def field(self, index, name):
+        """One field of a word, without decoding the others"""
+        return self._vocab.field(self._first + index, name)
+
+    def copy(self):
+        """Decoded list of the category's words (like list.copy())"""
+        return list(self)
+
+
+class BinaryVocabulary(Mapping):
+    """Memory-mapped vocabulary with the same interface as the JSON dict"""
+
+    def __init__(self, path=VOCAB_BINARY_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, field_count, category_count, word_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} vocabulary file")
+
+        offset = HEADER.size
+        fields_offset = offset
+        offset += field_count * STRING_REF.size
+        categories_offset = offset
+        offset += category_count * CATEGORY.size
+        self._words_offset = offset
+        self._pool_offset = offset + word_count * field_count * STRING_REF.size
+
+        self.word_count = word_count
+        self.fields = [
+            self._string(*STRING_REF.unpack_from(self._mm, fields_offset + i * STRING_REF.size))
+            for i in range(field_count)
+        ]
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+        self._categories = {}
+        for i in range(category_count):
+            name_offset, name_length, first, count = CATEGORY.unpack_from(
+                self._mm, categories_offset + i * CATEGORY.size)
+            self._categories[self._string(name_offset, name_length)] = (first, count)
+
+    def _string(self, offset, length):
+        start = self._pool_offset + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def word(self, index):
+        """Decode the word at a global index"""
+        row = self._words_offset + index * len(self.fields) * STRING_REF.size
+        word = {}
+        for i, field in enumerate(self.fields):
+            ref = STRING_REF.unpack_from(self._mm, row + i * STRING_REF.size)
+            if ref != MISSING:
+                word[field] = self._string(*ref)
+        return word
+
+    def field(self, index, name):
+        """Decode one field of the word at a global index ('' if it has none)"""
+        i = self._field_index.get(name)
+        if i is None:
+            return ''
+        row = self._words_offset + index * len(self.fields) * STRING_REF.size
+        ref = STRING_REF.unpack_from(self._mm, row + i * STRING_REF.size)
+        return '' if ref == MISSING else self._string(*ref)
+
+    def __getitem__(self, category):
+        first, count = self._categories[category]
+        return CategoryView(self, first, count)
+
+    def __iter__(self):
+        return iter(self._categories)
+
+    def __len__(self):
+        return len(self._categories)
+
+    def close(self):
+        self._mm.close()
+
+
+def word_field(words, index, field):
+    """words[index][field] ('' if missing), decoding only that field of a CategoryView"""
+    if isinstance(words, CategoryView):
+        return words.field(index, field)
+    return words[index].get(field, '')
+
+
+def load_vocabulary_file(json_path=VOCAB_FILE, binary_path=VOCAB_BINARY_FILE):
+    """
+    Load the vocabulary, preferring the compiled binary
+
+    The binary is used only when it is at least as new as the JSON file, so
+    editing the JSON without recompiling never serves stale words.
+    """
+    try:
+        if os.path.getmtime(binary_path) >= os.path.getmtime(json_path):
+            return BinaryVocabulary(binary_path)
+    except (OSError, ValueError):
+        pass
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else VOCAB_FILE
+    binary_path = sys.argv[2] if len(sys.argv) > 2 else VOCAB_BINARY_FILE
+
+    size = compile_vocabulary(json_path, binary_path)
+    vocab = BinaryVocabulary(binary_path)
+    print(f"✅ {binary_path}: {vocab.word_count} words in {len(vocab)} categories, {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
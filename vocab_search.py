@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Vocabulary Search
+Indexes built once at load time for ranked, paginated vocabulary lookup
+
+- CJK text (mandarin, shanghainese): inverted index of character unigrams
+  and bigrams, intersected and then verified as a substring
+- English and romanization (pinyin): sorted prefix indexes over the whole
+  entry and each of its words, diacritic-insensitive ("za wei" finds "zä wēi")
+- Shanghainese text to entry: entry ids sorted by their text, bisected
+  against the vocabulary itself
+
+No copy of the entries' original text is kept: ranking needs only the
+normalized lengths and keys, and the few candidates that must be compared
+again are read back from the vocabulary one field at a time.
+"""
+
+import heapq
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+
+from vocab_binary import word_field
+
+CJK_FIELDS = ['shanghainese', 'mandarin']
+LATIN_FIELDS = ['english', 'pinyin']
+
+# Rank of each kind of match, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+# Sorts after every character, so prefix + MAX_CHAR ends the prefix's range
+MAX_CHAR = chr(0x10FFFF)
+
+
+def is_cjk(char):
+    return '㐀' <= char <= '鿿' or '豈' <= char <= '﫿'
+
+
+def normalize_latin(text):
+    """Lowercase, strip diacritics and punctuation, collapse whitespace"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = ''.join(c if c.isalnum() else ' ' for c in text)
+    return ' '.join(text.split())
+
+
+def cjk_grams(text):
+    """Character unigrams and bigrams of the CJK runs in text"""
+    chars = [c for c in text if is_cjk(c)]
+    grams = set(chars)
+    grams.update(a + b for a, b in zip(chars, chars[1:]))
+    return grams
+
+
+class PrefixIndex:
+    """
+    (key, id) pairs sorted by key: the keys in one list (equal keys share a
+    string) and the ids in a parallel array('I'). The keys starting with a
+    prefix are one contiguous range, found by bisection.
+    """
+
+    def __init__(self, pairs):
+        self.keys = []
+        self.ids = array('I')
+        key = None
+        for pair_key, item_id in sorted(set(pairs)):
+            if pair_key != key:
+                key = pair_key
+            self.keys.append(key)
+            self.ids.append(item_id)
+
+    def lookup(self, prefix):
+        """Ids of every key starting with prefix, in O(log n) plus the matches"""
+        start = bisect_left(self.keys, prefix)
+        return set(self.ids[start:bisect_left(self.keys, prefix + MAX_CHAR, start)])
+
+    def exact(self, key):
+        """Ids of every key equal to key"""
+        start = bisect_left(self.keys, key)
+        return set(self.ids[start:bisect_right(self.keys, key, start)])
+
+
+class VocabularyIndex:
+    """Search indexes over every entry of the vocabulary"""
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.entries = []  # (category, position in category)
+        self.grams = {}    # CJK gram -> set of ids
+        self.lengths = {field: array('I') for field in CJK_FIELDS + LATIN_FIELDS}  # normalized, per id
+
+        full_keys = {field: [] for field in LATIN_FIELDS}
+        word_keys = {field: [] for field in LATIN_FIELDS}
+        for category, words in vocab.items():
+            for position, word in enumerate(words):
+                self._add(category, position, word, full_keys, word_keys)
+
+        self.full_prefixes = {field: PrefixIndex(full_keys[field]) for field in LATIN_FIELDS}
+        self.word_prefixes = {field: PrefixIndex(word_keys[field]) for field in LATIN_FIELDS}
+        # Ids ordered by Shanghainese text (ties in vocabulary order), for find_shanghainese()
+        self.by_shanghainese = array('I', sorted(range(len(self.entries)),
+                                                 key=lambda item_id: self.text(item_id, 'shanghainese')))
+
+    def _add(self, category, position, word, full_keys, word_keys):
+        item_id = len(self.entries)
+        self.entries.append((category, position))
+
+        for field in CJK_FIELDS:
+            text = word.get(field, '')
+            self.lengths[field].append(len(text))
+            for gram in cjk_grams(text):
+                self.grams.setdefault(gram, set()).add(item_id)
+
+        for field in LATIN_FIELDS:
+            text = normalize_latin(word.get(field, ''))
+            self.lengths[field].append(len(text))
+            if text:
+                full_keys[field].append((text, item_id))
+                # "za wei" is also reachable as "zawei"
+                full_keys[field].append((text.replace(' ', ''), item_id))
+            for token in text.split():
+                word_keys[field].append((token, item_id))
+
+    def text(self, item_id, field):
+        """A field of an entry as indexed (normalized for LATIN_FIELDS)"""
+        category, position = self.entries[item_id]
+        text = word_field(self.vocab[category], position, field)
+        return normalize_latin(text) if field in LATIN_FIELDS else text
+
+    def find_shanghainese(self, text):
+        """(category, position) of the first entry whose Shanghainese is text, or None"""
+        ids = self.by_shanghainese
+        low, high = 0, len(ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.text(ids[middle], 'shanghainese') < text:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(ids) and self.text(ids[low], 'shanghainese') == text:
+            return self.entries[ids[low]]
+        return None
+
+    def search(self, query, page=1, per_page=20):
+        """Ranked, paginated matches for query"""
+        query = query.strip()
+        if any(is_cjk(c) for c in query):
+            ranked = self._search_cjk(query)
+        else:
+            ranked = self._search_latin(normalize_latin(query))
+
+        # Only the entries up to the requested page need to be ordered
+        start = (page - 1) * per_page
+        results = []
+        for _, _, item_id in heapq.nsmallest(start + per_page, ranked)[start:]:
+            category, position = self.entries[item_id]
+            results.append(dict(self.vocab[category][position], category=category))
+        return {
+            'query': query,
+            'results': results,
+            'total': len(ranked),
+            'page': page,
+            'per_page': per_page,
+        }
+
+    def contained_in(self, text, field, limit=5):
+        """Entries whose field occurs in text (the words of a sentence), longest first"""
+        candidates = set()
+        if field in CJK_FIELDS:
+            for char in set(text):
+                if is_cjk(char):
+                    candidates |= self.grams.get(char, set())
+        else:
+            # Pad with spaces so only whole words match
+            text = f" {normalize_latin(text)} "
+            for token in text.split():
+                candidates |= self.word_prefixes[field].lookup(token)
+
+        matches = []
+        lengths = self.lengths[field]
+        for item_id in candidates:
+            if not lengths[item_id]:
+                continue
+            value = self.text(item_id, field)
+            if value in text if field in CJK_FIELDS else f" {value} " in text:
+                matches.append(item_id)
+        matches.sort(key=lambda item_id: (-lengths[item_id], item_id))
+        return [self.vocab[category][position]
+                for category, position in (self.entries[item_id] for item_id in matches[:limit])]
+
+    def _search_cjk(self, query):
+        grams = cjk_grams(query)
+        chars = [c for c in query if is_cjk(c)]
+        # Bigrams are far more selective; fall back to the single character
+        keys = [g for g in grams if len(g) == 2] or chars
+        candidates = None
+        for gram in sorted(keys, key=lambda g: len(self.grams.get(g, ()))):
+            postings = self.grams.get(gram, set())
+            candidates = postings.copy() if candidates is None else candidates & postings
+            if not candidates:
+                return []
+
+        ranked = []
+        for item_id in candidates or ():
+            best = None
+            for field in CJK_FIELDS:
+                text = self.text(item_id, field)
+                if text == query:
+                    rank = EXACT
+                elif text.startswith(query):
+                    rank = PREFIX
+                elif query in text:
+                    rank = SUBSTRING
+                else:
+                    continue
+                if best is None or rank < best[0]:
+                    best = (rank, len(text))
+            if best:
+                ranked.append((best[0], best[1], item_id))
+        return ranked
+
+    def _search_latin(self, query):
+        if not query:
+            return []
+        compact = query.replace(' ', '')
+        tokens = query.split()
+
+        best = {}
+        for field in LATIN_FIELDS:
+            lengths = self.lengths[field]
+            prefixes = self.full_prefixes[field]
+            # Spaceless forms are indexed too, so an exact key means an exact match
+            exact = prefixes.exact(compact)
+            for item_id in prefixes.lookup(query) | prefixes.lookup(compact):
+                self._keep(best, item_id, EXACT if item_id in exact else PREFIX, lengths[item_id])
+
+            # Every query word must prefix some word of the entry
+            matches = None
+            for token in tokens:
+                ids = self.word_prefixes[field].lookup(token)
+                matches = ids.copy() if matches is None else matches & ids
+                if not matches:
+                    break
+            for item_id in matches or ():
+                self._keep(best, item_id, WORD_PREFIX, lengths[item_id])
+
+        return [(rank, length, item_id) for item_id, (rank, length) in best.items()]
+
+    @staticmethod
+    def _keep(best, item_id, rank, length):
+        if item_id not in best or (rank, length) < best[item_id]:
+            best[item_id] = (rank, length)
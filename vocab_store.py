@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Vocabulary Store
+Hot-reloadable vocabulary with copy-on-write snapshots
+
+A snapshot bundles the vocabulary with everything derived from it (quiz
+engine, search index, pre-rendered audio URLs). A background thread polls
+the source files and, when one changes, builds a complete new snapshot and
+swaps it in with a single reference assignment. Requests call current()
+once and use that snapshot throughout, so they never block on a reload and
+never see a half-built index.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from logs import get_logger
+from quiz_engine import QuizEngine
+from vocab_binary import BinaryVocabulary, load_vocabulary_file, word_field
+from vocab_search import VocabularyIndex
+
+log = get_logger('vocab_store')
+
+# Seconds between checks of the vocabulary files (0 disables hot reload)
+VOCAB_RELOAD_INTERVAL = float(os.getenv('VOCAB_RELOAD_INTERVAL', 5))
+
+
+def file_stamp(path):
+    """Cheap change detector: (mtime, size), or None if missing"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return ''
+
+
+class VocabularySnapshot:
+    """One immutable version of the vocabulary and its indexes"""
+
+    def __init__(self, vocab, audio, version):
+        self.vocab = vocab
+        self.audio = audio  # shanghainese text -> static audio URL
+        self.version = version
+        self.loaded_at = time.time()
+        self.word_count = sum(len(words) for words in vocab.values())
+        self.quiz = QuizEngine(vocab)
+        self.search = VocabularyIndex(vocab)
+        self._prepared = {}
+
+    def prepared(self, key, build):
+        """Build a response from this snapshot once and reuse it (it never changes)"""
+        response = self._prepared.get(key)
+        if response is None:
+            response = self._prepared.setdefault(key, build())
+        return response
+
+    def lookup(self, text):
+        """(category, word) of the first word with this Shanghainese text, or None"""
+        found = self.search.find_shanghainese(text)
+        if found is None:
+            return None
+        category, index = found
+        return category, self.vocab[category][index]
+
+    def deck(self, category=None):
+        """Shanghainese text of every word in a category (all if None), in order"""
+        for name in ([category] if category else self.vocab):
+            words = self.vocab[name]
+            for index in range(len(words)):
+                yield word_field(words, index, 'shanghainese')
+
+    def with_audio_urls(self, words):
+        """Words as dicts, each with its pre-rendered audio_url when there is one"""
+        result = []
+        for word in words:
+            if word['shanghainese'] in self.audio:
+                word = dict(word, audio_url=self.audio[word['shanghainese']])
+            result.append(word)
+        return result
+
+
+class VocabularyStore:
+    """Holds the current snapshot and replaces it when the source files change"""
+
+    def __init__(self, json_path, binary_path, manifest_path, interval=VOCAB_RELOAD_INTERVAL):
+        self.json_path = json_path
+        self.binary_path = binary_path
+        self.manifest_path = manifest_path
+        self.interval = interval
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+
+        self._stamps = self._current_stamps()
+        self._snapshot = self._build()
+
+    def _current_stamps(self):
+        return tuple(file_stamp(path) for path in (self.json_path, self.binary_path, self.manifest_path))
+
+    def _load_audio(self):
+        """Load the pre-rendered audio manifest (see build_audio_bundle.py)"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('entries', {})
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _build(self):
+        vocab = load_vocabulary_file(self.json_path, self.binary_path)
+        source = self.binary_path if isinstance(vocab, BinaryVocabulary) else self.json_path
+        version = hashlib.sha256(
+            (file_digest(source) + file_digest(self.manifest_path)).encode('ascii')).hexdigest()[:12]
+        return VocabularySnapshot(vocab, self._load_audio(), version)
+
+    def current(self):
+        """The snapshot to use for the rest of this request"""
+        if self.interval > 0 and self._watcher_pid != os.getpid():
+            self._start_watcher()
+        return self._snapshot
+
+    def _start_watcher(self):
+        # Started lazily so each forked worker gets its own thread
+        with self._reload_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name='vocab-reload', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            self.reload_if_changed()
+
+    def reload_if_changed(self):
+        """Rebuild and swap in a new snapshot if any source file changed"""
+        stamps = self._current_stamps()
+        if stamps == self._stamps:
+            return False
+        return self.reload(stamps)
+
+    def reload(self, stamps=None):
+        """Build a new snapshot off the request path, then swap it in"""
+        with self._reload_lock:
+            stamps = stamps or self._current_stamps()
+            try:
+                snapshot = self._build()
+            except (OSError, ValueError, KeyError) as e:
+                # Keep serving the previous version (e.g. a half-saved JSON
+                # file) and retry once the files change again
+                self._stamps = stamps
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                log.warning("Vocabulary reload failed, keeping the current version",
+                            version=self._snapshot.version, error=str(e))
+                return False
+
+            self._stamps = stamps
+            changed = snapshot.version != self._snapshot.version
+            self._snapshot = snapshot
+            self.last_error = None
+            if changed:
+                self.reloads += 1
+                log.info("Vocabulary reloaded", version=snapshot.version, words=snapshot.word_count)
+            return changed
+
+    def stats(self):
+        snapshot = self.current()
+        return {
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'source': 'binary' if isinstance(snapshot.vocab, BinaryVocabulary) else 'json',
+            'categories': len(snapshot.vocab),
+            'words': snapshot.word_count,
+            'audio_entries': len(snapshot.audio),
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.last_error,
+            'reload_interval': self.interval,
+        }
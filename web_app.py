@@ -4,137 +4,458 @@ Shanghainese Learning Web App
 Flask web interface for learning Shanghainese
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, session
-import openai
-from gradio_client import Client
-import shutil
+from flask import (Flask, Response, g, render_template, request, jsonify, send_file, session,
+                   stream_with_context)
 import json
-import random
+import math
+import queue
 import os
-from datetime import datetime
+import random
+import re
 import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
 from dotenv import load_dotenv
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from audio_cache import AudioCache, cache_key
+from audio_transcode import (FORMATS as AUDIO_FORMATS, TranscodeError, available as transcoding_available,
+                             mimetype_for, transcode, variant_key)
+from translation_cache import TranslationCache, cache_key as translation_cache_key
+from singleflight import LeaderCancelled, SingleFlight
+from batch_translator import BATCH_TRANSLATE_WORKERS, BatchTranslator, parse_records
+from logs import configure_logging, get_logger
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, FALLBACKS, REGISTRY, REQUEST_LATENCY, REQUESTS,
+                     REQUESTS_IN_FLIGHT, snapshot, track_upstream)
+from prepared_response import PreparedResponse
+from profiler import PROFILE_INTERVAL, PROFILER
+from progress_store import SESSION_KINDS, ProgressStore
+from srs import GRADE_FORGOT, GRADE_KNEW
+from prompts import TOKEN_USAGE, TRANSLATION_PROMPT
+from tracing import TRACER, span
+from vocab_binary import VOCAB_BINARY_FILE
+from vocab_store import VocabularyStore
+from clients import OPENAI_CLIENT, client_stats, openai_configured
+from tts_router import (HF_TTS_VOICE, MAX_SPEED, MIN_SPEED, OPENAI_TTS_VOICE, TTS_ROUTER,
+                        BackendUnavailable, stream_openai_tts, synthesize_hf)
 
 # Load environment variables
 load_dotenv()
 
+configure_logging()
+log = get_logger('web')
+
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
 
 # Configuration
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    print("❌ ERROR: OPENAI_API_KEY not found in environment variables!")
-    print("Please create a .env file with your API key (see .env.example)")
-    exit(1)
+if not openai_configured():
+    # Vocabulary, flashcards and quizzes still work; translation and OpenAI
+    # TTS report the missing key when first used
+    log.warning("OPENAI_API_KEY not found in environment variables; "
+                "create a .env file with your API key (see .env.example)")
 
 VOCAB_FILE = "shanghainese_vocab.json"
 AUDIO_DIR = "static/audio"
+VOCAB_AUDIO_DIR = f"{AUDIO_DIR}/vocab"
+VOCAB_AUDIO_MANIFEST = f"{VOCAB_AUDIO_DIR}/manifest.json"
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+AUDIO_CACHE_MAX_FILES = int(os.getenv('AUDIO_CACHE_MAX_FILES', 100000))
+# Files not played for this long are deleted (seconds, 0 keeps them)
+AUDIO_CACHE_MAX_AGE = int(os.getenv('AUDIO_CACHE_MAX_AGE', 30 * 86400))
+# Seconds between garbage collection passes over the audio directory
+AUDIO_CACHE_GC_INTERVAL = float(os.getenv('AUDIO_CACHE_GC_INTERVAL', 600))
+# Format served when the client accepts anything (mp3 plays everywhere)
+AUDIO_DEFAULT_FORMAT = os.getenv('AUDIO_DEFAULT_FORMAT', 'mp3')
+# Browser cache lifetime of /speak/audio responses (seconds)
+AUDIO_URL_MAX_AGE = int(os.getenv('AUDIO_URL_MAX_AGE', 86400))
+
+# Translation model and prompt version (part of the translation cache key)
+TRANSLATION_MODEL = "gpt-4o"
+TRANSLATION_PROMPT_VERSION = TRANSLATION_PROMPT.cache_version
+
+# Most records and body bytes accepted by one /translate/batch request
+BATCH_TRANSLATE_MAX_RECORDS = int(os.getenv('BATCH_TRANSLATE_MAX_RECORDS', 1000))
+BATCH_TRANSLATE_MAX_BYTES = int(os.getenv('BATCH_TRANSLATE_MAX_BYTES', 1024 * 1024))
+
+# Bearer token for the /admin endpoints (unset disables them)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Most reviews accepted by one /flashcards/review request
+FLASHCARDS_REVIEW_MAX = 200
 
-# Ensure audio directory exists
-os.makedirs(AUDIO_DIR, exist_ok=True)
+# Precomputed card orders per category served by /flashcards/<category>
+FLASHCARD_ORDERS = max(1, int(os.getenv('FLASHCARD_ORDERS', 8)))
 
-# Load vocabulary
-with open(VOCAB_FILE, 'r', encoding='utf-8') as f:
-    VOCABULARY = json.load(f)
+# Audio cache (also creates the audio directory)
+AUDIO_CACHE = AudioCache(AUDIO_DIR, AUDIO_CACHE_MAX_BYTES, max_files=AUDIO_CACHE_MAX_FILES,
+                         max_age=AUDIO_CACHE_MAX_AGE or None, gc_interval=AUDIO_CACHE_GC_INTERVAL)
+
+# Translation cache shared by all workers on this host
+TRANSLATION_CACHE = TranslationCache()
+
+# Coalesces identical concurrent upstream calls (threads and workers)
+SINGLE_FLIGHT = SingleFlight()
+
+# Learning progress, one learner per browser session
+PROGRESS_STORE = ProgressStore()
+
+# Vocabulary, quiz and search indexes; reloaded in the background when the
+# vocabulary files or the audio manifest change
+VOCAB_STORE = VocabularyStore(VOCAB_FILE, VOCAB_BINARY_FILE, VOCAB_AUDIO_MANIFEST)
+
+
+# Every /translate/batch request shares one pool of BATCH_TRANSLATE_WORKERS
+# GPT-4o requests, so concurrent batches queue instead of multiplying threads
+BATCH_TRANSLATOR = BatchTranslator(
+    TRANSLATION_CACHE, TRANSLATION_PROMPT, TRANSLATION_MODEL,
+    executor=ThreadPoolExecutor(max_workers=BATCH_TRANSLATE_WORKERS, thread_name_prefix='batch-translate'))
 
 
 def get_shanghainese_translation(text, source_lang="mandarin"):
-    """Translate to Shanghainese using GPT-4o"""
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-    system_prompt = """You are an expert in Shanghainese (上海话/沪语). Translate to authentic Shanghainese dialect.
-
-Key characteristics of Shanghainese:
-PRONOUNS:
-- Use 侬 (nong) for "you" instead of 你
-- Use 伊 (yi) for "he/she" instead of 他/她
-- Use 阿拉 (a la) for "we/us" instead of 我们
-- Use 伊拉 (yi la) for "they/them" instead of 他们
-
-QUESTION WORDS & LOCATION:
-- Use 啥 (sa) for "what" instead of 什么
-- Use 哪能 (na nen) for "how" instead of 怎么
-- Use 阿里/阿里的 (a li/a li di) for "where" instead of 哪里
-- Use 几钿 (jih dih) for "how much money"
-
-NEGATION & VERBS:
-- Use 勿/弗 (veq/fe) for negation instead of 不
-- Use 七 (qi) for 去 (go)
-- Use 巴相 (ba xiang) for "play" instead of 玩
-- Use 晓得 (xiao de) for "know" instead of 知道
-- Use 讲 (gang) for "speak" instead of 说
-
-TIME:
-- Use 今朝 (jin zhao) for "today"
-- Use 夜里 (ya li) for "night"
-
-Examples:
-Mandarin: 你今天去哪里吃饭？
-Shanghainese: 侬今朝七阿里的七饭
-
-Mandarin: 你在干什么？
-Shanghainese: 侬勒浪搭啥？
-
-Only return the Shanghainese translation."""
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text}
-        ]
-    )
-    return response.choices[0].message.content
-
-
-def generate_audio(text):
+    """Translate to Shanghainese using GPT-4o (cached, coalesced)"""
+    with span('get_shanghainese_translation', source=source_lang, text_length=len(text)) as translation_span:
+        cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+        translation_span.set_attribute('cache_hit', cached is not None)
+        if cached is not None:
+            return cached
+
+        key = translation_cache_key(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+        return SINGLE_FLIGHT.do(f"translate:{key}", translate_uncached, text, source_lang)
+
+
+def translate_uncached(text, source_lang):
+    """Call GPT-4o unless another worker cached the result while we waited"""
+    cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL,
+                                   count=False)
+    if cached is not None:
+        return cached
+
+    client = OPENAI_CLIENT.get()
+
+    with track_upstream('openai_chat'), span('openai.chat', model=TRANSLATION_MODEL) as chat_span:
+        response = client.chat.completions.create(
+            model=TRANSLATION_MODEL,
+            messages=TRANSLATION_PROMPT.messages(text, source_lang, VOCAB_STORE.current().search)
+        )
+        if response.usage:
+            chat_span.set_attribute('prompt_tokens', response.usage.prompt_tokens)
+    TOKEN_USAGE.record(TRANSLATION_PROMPT.key, response.usage)
+    translation = response.choices[0].message.content
+    TRANSLATION_CACHE.set(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL, translation)
+    return translation
+
+
+def stream_shanghainese_translation(text, source_lang="mandarin"):
+    """
+    Yield the translation piece by piece as GPT-4o produces it
+    The complete result is stored in the translation cache at the end
+    """
+    cached = TRANSLATION_CACHE.get(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL)
+    if cached is not None:
+        yield cached
+        return
+
+    client = OPENAI_CLIENT.get()
+
+    parts = []
+    with track_upstream('openai_chat'), span('openai.chat', model=TRANSLATION_MODEL, stream=True):
+        stream = client.chat.completions.create(
+            model=TRANSLATION_MODEL,
+            messages=TRANSLATION_PROMPT.messages(text, source_lang, VOCAB_STORE.current().search),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                # Usage arrives in a final chunk without choices
+                TOKEN_USAGE.record(TRANSLATION_PROMPT.key, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+
+    TRANSLATION_CACHE.set(text, source_lang, TRANSLATION_PROMPT_VERSION, TRANSLATION_MODEL, ''.join(parts))
+
+
+def sse_event(event, payload):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def audio_cache_keys(text, speed=1.0):
+    """Cache keys for the Hugging Face and OpenAI renderings of text"""
+    return (cache_key(text, 'hf', HF_TTS_VOICE, speed),
+            cache_key(text, 'openai', OPENAI_TTS_VOICE, speed))
+
+
+def tmp_audio_file(extension='.wav'):
+    """Unique temp name so concurrent requests never overwrite each other"""
+    return AUDIO_CACHE.tmp_path(extension)
+
+
+def negotiate_audio_format(requested=None, accept=None):
+    """
+    Format to serve: 'opus', 'mp3', or None for the file as rendered
+
+    An explicit ?format= wins; otherwise the Accept header decides, with
+    AUDIO_DEFAULT_FORMAT for clients that accept anything.
+    """
+    if requested == 'original' or not transcoding_available():
+        return None
+    if requested in AUDIO_FORMATS:
+        return requested
+    if not accept:
+        return AUDIO_DEFAULT_FORMAT
+    offered = [AUDIO_FORMATS[AUDIO_DEFAULT_FORMAT]['mimetype']]
+    offered += [f['mimetype'] for name, f in AUDIO_FORMATS.items() if name != AUDIO_DEFAULT_FORMAT]
+    best = parse_accept_header(accept, MIMEAccept).best_match(offered)
+    for name, f in AUDIO_FORMATS.items():
+        if f['mimetype'] == best:
+            return name
+    return None
+
+
+def audio_variant(master_file, fmt):
+    """
+    master_file in fmt, transcoded on first use (coalesced across workers)
+    Returns master_file itself if fmt is None or transcoding fails
+    """
+    if fmt is None:
+        return master_file
+    key = variant_key(os.path.splitext(os.path.basename(master_file))[0], fmt)
+    cached = AUDIO_CACHE.lookup(key, count=False)
+    if cached:
+        return cached
+    return SINGLE_FLIGHT.do(f"transcode:{key}", transcode_audio, master_file, fmt, key)
+
+
+def transcode_audio(master_file, fmt, key):
+    cached = AUDIO_CACHE.lookup(key, count=False)
+    if cached:
+        return cached
+
+    tmp_file = tmp_audio_file(AUDIO_FORMATS[fmt]['extension'])
+    try:
+        transcode(master_file, fmt, tmp_file)
+        return AUDIO_CACHE.store(key, tmp_file)
+    except (TranscodeError, OSError) as e:
+        log.warning("Transcoding failed, serving the original", format=fmt, error=str(e))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return master_file
+
+
+def cached_audio(text, speed=1.0, fmt=None):
+    """Cached audio for text in fmt (transcoding a cached master if needed), or None"""
+    hf_key, openai_key = audio_cache_keys(text, speed)
+    keys = []
+    for master_key in (hf_key, openai_key):
+        if fmt:
+            keys.append(variant_key(master_key, fmt))
+        keys.append(master_key)
+
+    cached = AUDIO_CACHE.lookup(*keys)
+    if cached and fmt and os.path.splitext(os.path.basename(cached))[0] in (hf_key, openai_key):
+        cached = audio_variant(cached, fmt)
+    return cached
+
+
+def render_hf_audio(text, speed=1.0):
+    """
+    Render text with Hugging Face into the audio cache
+    Returns the cached file, or None if the space is unavailable
+    """
+    hf_key, openai_key = audio_cache_keys(text, speed)
+
+    # Another worker may have rendered it while we waited
+    cached = AUDIO_CACHE.lookup(hf_key, openai_key, count=False)
+    if cached:
+        return cached
+
+    tmp_file = tmp_audio_file()
+    try:
+        synthesize_hf(text, speed, tmp_file)
+        with span('audio_cache.store'):
+            output_file = AUDIO_CACHE.store(hf_key, tmp_file)
+        log.info("Audio saved", backend='hf', path=output_file)
+        return output_file
+    except Exception as e:
+        log.warning("Hugging Face TTS unavailable", error=str(e))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return None
+
+
+def render_openai_audio(text, speed=1.0):
+    """
+    Render text with OpenAI TTS into the audio cache
+    Returns the cached file, or None if OpenAI TTS failed
+    """
+    hf_key, openai_key = audio_cache_keys(text, speed)
+
+    cached = AUDIO_CACHE.lookup(hf_key, openai_key, count=False)
+    if cached:
+        return cached
+
+    # OpenAI TTS returns MP3
+    tmp_file = tmp_audio_file('.mp3')
+    try:
+        with open(tmp_file, 'wb') as f:
+            for chunk in stream_openai_tts(text, speed):
+                f.write(chunk)
+        with span('audio_cache.store'):
+            output_file = AUDIO_CACHE.store(openai_key, tmp_file)
+        log.info("Audio saved", backend='openai', path=output_file)
+        return output_file
+    except Exception as openai_error:
+        log.error("OpenAI TTS failed", error=str(openai_error))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return None
+
+
+def generate_audio(text, speed=1.0):
     """
     Generate Shanghainese audio
     Falls back to OpenAI TTS if Hugging Face is unavailable
+    Returns a cached file when the same text was already synthesized, and
+    concurrent requests for the same text share one upstream call. Raises
+    BackendUnavailable while every backend's circuit is open.
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f"{AUDIO_DIR}/shanghainese_{timestamp}.wav"
+    with span('generate_audio', text_length=len(text)) as audio_span:
+        hf_key, openai_key = audio_cache_keys(text, speed)
+
+        with span('audio_cache.lookup'):
+            cached = AUDIO_CACHE.lookup(hf_key, openai_key)
+        audio_span.set_attribute('cache_hit', bool(cached))
+        if cached:
+            return cached
+
+        # Hugging Face first unless its circuit is open, then OpenAI TTS
+        backends = TTS_ROUTER.order()
+        if not backends:
+            raise BackendUnavailable("All TTS backends are unavailable")
+        for i, backend in enumerate(backends):
+            if i > 0:
+                FALLBACKS.inc(backend=backend)
+                log.info("Falling back to another TTS backend", backend=backend)
+            audio_span.set_attribute('backend', backend)
+            key = hf_key if backend == 'hf' else openai_key
+            output_file = SINGLE_FLIGHT.do(f"audio-{backend}:{key}", AUDIO_RENDERERS[backend], text, speed)
+            if output_file:
+                return output_file
+        return None
+
+
+AUDIO_RENDERERS = {
+    'hf': render_hf_audio,
+    'openai': render_openai_audio,
+}
+
+
+HASHED_AUDIO_NAME = re.compile(r'[0-9a-f]{32}\.(wav|mp3|opus)')
+
+
+@app.after_request
+def cache_hashed_audio(response):
+    """Cached and pre-rendered audio have hashed names and can be cached forever"""
+    if (request.path.startswith(f'/{AUDIO_DIR}/')
+            and HASHED_AUDIO_NAME.fullmatch(os.path.basename(request.path))):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def route_label():
+    """The matched URL rule, so /vocabulary/<category> is one route in the metrics"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def start_request_timer():
+    # Root span of this request's trace; stages below it nest under it. It is
+    # entered on a stack kept on g, which teardown always closes
+    g.request_trace = ExitStack()
+    g.request_span = g.request_trace.enter_context(TRACER.start_trace(
+        f"{request.method} {route_label()}", **{'http.method': request.method, 'http.route': route_label()}))
+    g.request_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(route=route_label())
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Latency until the headers (a streamed body may still be on its way)"""
+    if 'request_started' in g:
+        route = route_label()
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_started, route=route, method=request.method)
+        REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        g.request_span.set_attribute('http.status_code', response.status_code)
+    return response
+
 
-    # Try Hugging Face Shanghainese TTS first
+@app.teardown_request
+def end_request_timer(exc):
     try:
-        print(f"🔊 Generating authentic Shanghainese speech...")
-        client = Client('CjangCjengh/Shanghainese-TTS')
-        result = client.predict(text, False, 1.0, fn_index=1)
+        if 'request_started' in g:
+            REQUESTS_IN_FLIGHT.dec(route=route_label())
+    finally:
+        # Ends the request's span and resets the active span, even when a
+        # later before_request hook or the view failed
+        if 'request_trace' in g:
+            g.pop('request_trace').__exit__(type(exc) if exc else None, exc, None)
 
-        if isinstance(result, dict) and 'name' in result:
-            audio_path = result['name']
-        else:
-            audio_path = result
 
-        # Copy to static folder
-        shutil.copy(audio_path, output_file)
-        print(f"✅ Audio saved: {output_file}")
-        return output_file
+@REGISTRY.collector
+def app_metrics():
+    """Cache, token and backend counters the app keeps anyway, read at scrape time"""
+    translation = TRANSLATION_CACHE.stats()
+    audio = AUDIO_CACHE.stats()
+    yield snapshot('counter', 'cache_hits_total', "Cache lookups that hit", ('cache',), {
+        ('translation',): translation['memory_hits'] + translation['disk_hits'],
+        ('audio',): audio['hits'],
+    })
+    yield snapshot('counter', 'cache_misses_total', "Cache lookups that missed", ('cache',), {
+        ('translation',): translation['misses'],
+        ('audio',): audio['misses'],
+    })
+    yield snapshot('gauge', 'cache_hit_ratio', "Share of cache lookups that hit", ('cache',), {
+        ('translation',): translation['hit_ratio'],
+        ('audio',): audio['hit_ratio'],
+    })
+    yield snapshot('gauge', 'audio_cache_bytes', "Disk usage of the audio cache", (), {(): audio['bytes']})
 
-    except Exception as e:
-        print(f"⚠️  Hugging Face unavailable (rate limit or error): {e}")
-        print(f"🔄 Falling back to OpenAI TTS...")
+    tokens = {}
+    for prompt, usage in TOKEN_USAGE.stats().items():
+        for kind in ('prompt', 'cached_prompt', 'completion'):
+            tokens[(prompt, kind)] = usage[f'{kind}_tokens']
+    yield snapshot('counter', 'llm_tokens_total', "Tokens reported by OpenAI, by prompt", ('prompt', 'kind'), tokens)
 
-        # Fallback to OpenAI TTS
-        try:
-            client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    backends = TTS_ROUTER.stats()
+    yield snapshot('gauge', 'tts_circuit_open', "1 while a TTS backend's circuit is open", ('backend',),
+                   {(name,): int(stats['state'] == 'open') for name, stats in backends.items()})
+    yield snapshot('counter', 'tts_rejected_total', "Calls skipped because the circuit was open",
+                   ('backend',), {(name,): stats['rejected'] for name, stats in backends.items()})
+    yield snapshot('counter', 'single_flight_shared_total', "Upstream calls saved by coalescing", (),
+                   {(): SINGLE_FLIGHT.stats()['shared']})
 
-            # Use OpenAI's Chinese voice (alloy works well for Chinese)
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text,
-                speed=1.0
-            )
+    tracing = TRACER.stats()
+    yield snapshot('counter', 'traces_exported_total', "Traces written to TRACE_FILE", (),
+                   {(): tracing['exported']})
+    yield snapshot('counter', 'traces_dropped_total', "Traces that could not be written", (),
+                   {(): tracing['dropped']})
 
-            response.stream_to_file(output_file)
-            print(f"✅ Audio saved: {output_file} (OpenAI TTS)")
-            return output_file
 
-        except Exception as openai_error:
-            print(f"❌ OpenAI TTS also failed: {openai_error}")
-            return None
+def send_audio(audio_file):
+    """
+    Serve an audio file with Range support and browser caching
+    Cached files are named after a hash of what they contain, which makes
+    the name a stable ETag
+    """
+    response = send_file(audio_file, mimetype=mimetype_for(audio_file), conditional=True,
+                         etag=os.path.basename(audio_file), max_age=AUDIO_URL_MAX_AGE)
+    response.vary.add('Accept')
+    return response
 
 
 # Routes
@@ -164,6 +485,95 @@ def translate():
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+@app.route('/translate/stream', methods=['POST'])
+def translate_stream():
+    """
+    Streaming translation endpoint (Server-Sent Events)
+    Sends 'delta' events as tokens arrive, then 'done' with the full text
+    """
+    data = request.json
+    text = data.get('text', '')
+    source = data.get('source', 'mandarin')
+
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    def events():
+        parts = []
+        try:
+            for delta in stream_shanghainese_translation(text, source):
+                parts.append(delta)
+                yield sse_event('delta', {'text': delta})
+            yield sse_event('done', {'translation': ''.join(parts), 'success': True})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e), 'success': False})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    """
+    Batch translation endpoint (JSONL in, JSONL out)
+
+    Each input line is {"id", "text", "source"} or a bare JSON string. One
+    result line is streamed per input line as soon as it is translated (in
+    completion order, matched by id), followed by a {"summary": ...} line.
+    Translations finished after the client disconnects are still cached.
+    """
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required', 'success': False}), 411
+    if request.content_length > BATCH_TRANSLATE_MAX_BYTES:
+        return jsonify({'error': f'Body must be at most {BATCH_TRANSLATE_MAX_BYTES} bytes',
+                        'success': False}), 413
+    try:
+        records = parse_records(request.get_data(as_text=True).splitlines())
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+    if not records:
+        return jsonify({'error': 'No text provided'}), 400
+    if len(records) > BATCH_TRANSLATE_MAX_RECORDS:
+        return jsonify({'error': f'At most {BATCH_TRANSLATE_MAX_RECORDS} records per request',
+                        'success': False}), 413
+
+    results = queue.Queue()
+    summary, futures = BATCH_TRANSLATOR.submit(records, results.put)
+    for future in futures:
+        # A packed request reports its records before its future completes
+        future.add_done_callback(results.put)
+
+    def lines():
+        remaining = len(futures)
+        while remaining or not results.empty():
+            result = results.get()
+            if isinstance(result, Future):
+                remaining -= 1
+            else:
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            yield json.dumps({'error': str(errors[0]), 'success': False}, ensure_ascii=False) + '\n'
+        else:
+            yield json.dumps({'summary': summary, 'success': True}, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/translate/stats')
+def translate_stats():
+    """Translation cache hit/miss counters and token usage per prompt"""
+    return jsonify({
+        'cache': TRANSLATION_CACHE.stats(),
+        'prompt': TRANSLATION_PROMPT_VERSION,
+        'tokens': TOKEN_USAGE.stats(),
+        'success': True
+    })
+
+
 @app.route('/speak', methods=['POST'])
 def speak():
     """Generate audio for Shanghainese text"""
@@ -173,9 +583,11 @@ def speak():
     if not text:
         return jsonify({'error': 'No text provided'}), 400
 
+    fmt = negotiate_audio_format(data.get('format'), request.headers.get('Accept'))
     try:
         audio_file = generate_audio(text)
         if audio_file:
+            audio_file = audio_variant(audio_file, fmt)
             # Return correct path for Flask static files
             return jsonify({
                 'audio_url': f'/{audio_file}',
@@ -183,46 +595,315 @@ def speak():
             })
         else:
             return jsonify({'error': 'Failed to generate audio', 'success': False}), 500
+    except BackendUnavailable:
+        return backends_unavailable()
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+def retry_after():
+    """Retry-After value (whole seconds) while every TTS circuit is open"""
+    return str(max(1, math.ceil(TTS_ROUTER.retry_after())))
+
+
+def backends_unavailable():
+    """503 for a speech request made while every TTS circuit is open"""
+    response = jsonify({'error': 'All TTS backends are unavailable, try again later', 'success': False})
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after()
+    return response
+
+
+@app.route('/speak/audio')
+def speak_audio():
+    """
+    Stream Shanghainese audio straight into the response
+    Cached audio is served with Range support, as Opus or MP3 depending on
+    ?format= or the Accept header. On a miss, the OpenAI fallback is piped
+    to the client (as MP3) while it is written to the cache.
+    """
+    text = request.args.get('text', '')
+    speed = request.args.get('speed', 1.0, type=float)
+
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    # Also rejects nan and inf
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        return jsonify({'error': f'speed must be between {MIN_SPEED} and {MAX_SPEED}', 'success': False}), 400
+    # Every distinct speed is its own rendering, so near-equal ones share one
+    speed = round(speed, 2)
+
+    fmt = negotiate_audio_format(request.args.get('format'), request.headers.get('Accept'))
+    hf_key, openai_key = audio_cache_keys(text, speed)
+    cached = cached_audio(text, speed, fmt)
+    if cached:
+        return send_audio(cached)
+
+    # The Hugging Face space only returns whole files; OpenAI TTS is streamed
+    backends = TTS_ROUTER.order()
+    if not backends:
+        return backends_unavailable()
+    for i, backend in enumerate(backends):
+        if i > 0:
+            FALLBACKS.inc(backend=backend)
+            log.info("Falling back to another TTS backend", backend=backend)
+        if backend == 'openai':
+            response = stream_openai_audio(text, speed, fmt)
+            if response is not None:
+                return response
+            continue
+        output_file = SINGLE_FLIGHT.do(f"audio-hf:{hf_key}", render_hf_audio, text, speed)
+        if output_file:
+            return send_audio(audio_variant(output_file, fmt))
+    return jsonify({'error': 'Failed to generate audio', 'success': False}), 500
+
+
+def stream_openai_audio(text, speed, fmt):
+    """
+    Response piping OpenAI TTS to the client while it is written to the
+    cache, or None if OpenAI TTS failed
+
+    Only one request per text streams from OpenAI; concurrent requests for
+    the same text wait for its cached file. A background thread writes the
+    upstream audio to a temp file as fast as it arrives, and the response
+    follows that file, so a slow client never holds up the upstream call,
+    the host lock or the waiting requests.
+    """
+    hf_key, openai_key = audio_cache_keys(text, speed)
+    key = f"audio-openai:{openai_key}"
+    claim = SINGLE_FLIGHT.claim(key)
+    if claim is None:
+        output_file = SINGLE_FLIGHT.do(key, render_openai_audio, text, speed)
+        return send_audio(audio_variant(output_file, fmt)) if output_file else None
+
+    # Another worker may have rendered it while we waited for the host lock
+    cached = AUDIO_CACHE.lookup(hf_key, openai_key, count=False)
+    if cached:
+        claim.finish(cached)
+        return send_audio(audio_variant(cached, fmt))
+
+    tmp_file = tmp_audio_file('.mp3')
+
+    # Wait for the first chunk so upstream errors still return JSON
+    chunks = stream_openai_tts(text, speed)
+    try:
+        first = next(chunks)
+    except Exception as openai_error:
+        log.error("OpenAI TTS failed", error=str(openai_error))
+        claim.finish(None)
+        return None
+
+    writer = open(tmp_file, 'wb')
+    writer.write(first)
+    writer.flush()
+    # Still readable after store() moves the file into the cache
+    reader = open(tmp_file, 'rb')
+    progress = threading.Condition()
+    state = {'size': len(first), 'done': False}
+
+    def pump():
+        output_file = None
+        try:
+            with writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+                    writer.flush()
+                    with progress:
+                        state['size'] += len(chunk)
+                        progress.notify_all()
+            output_file = AUDIO_CACHE.store(openai_key, tmp_file)
+        except Exception as openai_error:
+            log.error("OpenAI TTS stream failed", error=str(openai_error))
+        finally:
+            chunks.close()
+            if output_file is None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            # Releases the host lock and the waiting requests
+            claim.finish(output_file, None if output_file else LeaderCancelled(key))
+            with progress:
+                state['done'] = True
+                progress.notify_all()
+
+    def follow():
+        position = 0
+        with reader:
+            while True:
+                with progress:
+                    progress.wait_for(lambda: state['size'] > position or state['done'])
+                    size = state['size']
+                if size == position:
+                    return
+                data = reader.read(size - position)
+                position += len(data)
+                yield data
+
+    threading.Thread(target=pump, name='openai-audio', daemon=True).start()
+    # A Range request on an uncached file gets the whole body (200)
+    response = Response(follow(), mimetype='audio/mpeg', headers={'Cache-Control': 'no-cache'})
+    # A body that is never iterated must still close the file
+    response.call_on_close(reader.close)
+    return response
+
+
+@app.route('/speak/stats')
+def speak_stats():
+    """Audio cache hit/miss counters"""
+    return jsonify({
+        'cache': AUDIO_CACHE.stats(),
+        'clients': client_stats(),
+        'backends': TTS_ROUTER.stats(),
+        'single_flight': SINGLE_FLIGHT.stats(),
+        'transcoding': {
+            'ffmpeg': transcoding_available(),
+            'formats': list(AUDIO_FORMATS),
+            'default_format': AUDIO_DEFAULT_FORMAT,
+        },
+        'success': True
+    })
+
+
 @app.route('/vocabulary')
 def vocabulary():
-    """Vocabulary browser page"""
-    return render_template('vocabulary.html', vocab=VOCABULARY)
+    """Vocabulary browser page (rendered once per vocabulary version)"""
+    snapshot = VOCAB_STORE.current()
+    return snapshot.prepared('vocabulary.html', lambda: PreparedResponse(
+        render_template('vocabulary.html', vocab=snapshot.vocab), mimetype='text/html')).serve(request)
+
+
+@app.route('/vocabulary/version')
+def vocabulary_version():
+    """Version of the vocabulary currently being served"""
+    return jsonify({**VOCAB_STORE.stats(), 'success': True})
+
+
+@app.route('/vocabulary/search')
+def vocabulary_search():
+    """Search all categories by English, Mandarin, Shanghainese or romanization"""
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    if not query:
+        return jsonify({'error': 'No query provided', 'success': False}), 400
+
+    result = VOCAB_STORE.current().search.search(query, page=page, per_page=per_page)
+    result['success'] = True
+    return jsonify(result)
 
 
 @app.route('/vocabulary/<category>')
 def vocabulary_category(category):
     """Get vocabulary for a specific category"""
-    if category in VOCABULARY:
-        return jsonify({
+    snapshot = VOCAB_STORE.current()
+    if category in snapshot.vocab:
+        return snapshot.prepared(('vocabulary', category), lambda: PreparedResponse.json({
             'category': category,
-            'words': VOCABULARY[category],
+            'words': snapshot.with_audio_urls(snapshot.vocab[category]),
             'success': True
-        })
+        })).serve(request)
     return jsonify({'error': 'Category not found', 'success': False}), 404
 
 
 @app.route('/flashcards')
 def flashcards():
     """Flashcards page"""
-    return render_template('flashcards.html', categories=list(VOCABULARY.keys()))
+    return render_template('flashcards.html', categories=list(VOCAB_STORE.current().vocab.keys()))
 
 
 @app.route('/flashcards/<category>')
 def get_flashcards(category):
-    """Get flashcards for a category"""
-    if category in VOCABULARY:
-        words = VOCABULARY[category].copy()
-        random.shuffle(words)
-        return jsonify({
-            'category': category,
-            'cards': words,
-            'success': True
-        })
-    return jsonify({'error': 'Category not found', 'success': False}), 404
+    """Get shuffled flashcards for a category
+
+    Each category has FLASHCARD_ORDERS precomputed shuffles. ?seed=<n> picks one
+    (the same seed always gives the same order); without it a random order is
+    served and marked private so shared caches don't hand it to everyone.
+    """
+    snapshot = VOCAB_STORE.current()
+    if category not in snapshot.vocab:
+        return jsonify({'error': 'Category not found', 'success': False}), 404
+
+    seed = request.args.get('seed', type=int)
+    order = random.randrange(FLASHCARD_ORDERS) if seed is None else seed % FLASHCARD_ORDERS
+
+    def build():
+        cards = snapshot.with_audio_urls(snapshot.vocab[category])
+        random.Random(f"{category}:{order}").shuffle(cards)
+        return PreparedResponse.json({'category': category, 'cards': cards,
+                                      'seed': order, 'success': True})
+
+    response = snapshot.prepared(('flashcards', category, order), build).serve(request)
+    if seed is None:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.route('/flashcards/due')
+def flashcards_due():
+    """The learner's next cards: due reviews (most overdue first), then new cards"""
+    snapshot = VOCAB_STORE.current()
+    category = request.args.get('category') or None
+    if category is not None and category not in snapshot.vocab:
+        return jsonify({'error': 'Category not found', 'success': False}), 404
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    learner = current_learner()
+    cards = []
+    for text, state in learner.next_cards(limit, snapshot.deck(category), category):
+        found = snapshot.lookup(text)
+        if found is None:
+            continue  # removed from the vocabulary since it was reviewed
+        word_category, word = found
+        card = snapshot.with_audio_urls([word])[0]
+        cards.append(dict(card, category=category or word_category, srs=state.as_dict()))
+
+    new = sum(card['srs']['new'] for card in cards)
+    return jsonify({
+        'cards': cards,
+        'due': len(cards) - new,
+        'new': new,
+        'next_due': learner.next_due(),
+        'success': True
+    })
+
+
+@app.route('/flashcards/review', methods=['POST'])
+def flashcards_review():
+    """
+    Record a batch of flashcard reviews
+
+    Body: {"reviews": [{"word", "category", "grade"}]}, with an SM-2 grade
+    (0-5) or "knew": true/false instead of the grade.
+    """
+    data = request.get_json(silent=True) or {}
+    reviews = data.get('reviews')
+    if not isinstance(reviews, list) or not reviews:
+        return jsonify({'error': 'No reviews provided', 'success': False}), 400
+    if len(reviews) > FLASHCARDS_REVIEW_MAX:
+        return jsonify({'error': f'At most {FLASHCARDS_REVIEW_MAX} reviews per request',
+                        'success': False}), 413
+
+    vocab = VOCAB_STORE.current().vocab
+    batch = []
+    for review in reviews:
+        if not isinstance(review, dict):
+            return jsonify({'error': 'Each review must be an object', 'success': False}), 400
+        category = review.get('category')
+        if category is not None and (not isinstance(category, str) or category not in vocab):
+            return jsonify({'error': f'Unknown category: {category!r}', 'success': False}), 400
+        grade = review.get('grade')
+        if grade is None and 'knew' in review:
+            grade = GRADE_KNEW if review['knew'] else GRADE_FORGOT
+        word = review.get('word')
+        if not isinstance(word, str) or not word.strip() or not isinstance(grade, int) or not 0 <= grade <= 5:
+            return jsonify({'error': 'Each review needs a word and a grade from 0 to 5',
+                            'success': False}), 400
+        batch.append((word, category, grade))
+
+    states = current_learner().review_cards(batch)
+    return jsonify({
+        'cards': {word: state.as_dict() for word, state in states.items()},
+        'success': True
+    })
 
 
 @app.route('/quiz')
@@ -237,48 +918,12 @@ def generate_quiz():
     data = request.json
     num_questions = min(int(data.get('num_questions', 5)), 20)
 
-    # Collect all words
-    all_words = []
-    for category in VOCABULARY.values():
-        all_words.extend(category)
-
-    if len(all_words) < 4:
+    quiz_engine = VOCAB_STORE.current().quiz
+    if len(quiz_engine) < 4:
         return jsonify({'error': 'Not enough words', 'success': False}), 400
 
-    # Generate questions
-    quiz_words = random.sample(all_words, min(num_questions, len(all_words)))
-    questions = []
-
-    for word in quiz_words:
-        q_type = random.choice(['eng_to_sh', 'man_to_sh', 'sh_to_eng'])
-
-        if q_type == 'eng_to_sh':
-            question_text = f"What is '{word['english']}' in Shanghainese?"
-            correct_answer = word['shanghainese']
-            options = [word['shanghainese']]
-            other_words = [w for w in all_words if w['shanghainese'] != word['shanghainese']]
-            options.extend([w['shanghainese'] for w in random.sample(other_words, min(3, len(other_words)))])
-        elif q_type == 'man_to_sh':
-            question_text = f"What is '{word['mandarin']}' in Shanghainese?"
-            correct_answer = word['shanghainese']
-            options = [word['shanghainese']]
-            other_words = [w for w in all_words if w['shanghainese'] != word['shanghainese']]
-            options.extend([w['shanghainese'] for w in random.sample(other_words, min(3, len(other_words)))])
-        else:  # sh_to_eng
-            question_text = f"What does '{word['shanghainese']}' mean in English?"
-            correct_answer = word['english']
-            options = [word['english']]
-            other_words = [w for w in all_words if w['english'] != word['english']]
-            options.extend([w['english'] for w in random.sample(other_words, min(3, len(other_words)))])
-
-        random.shuffle(options)
-
-        questions.append({
-            'question': question_text,
-            'options': options,
-            'correct_answer': correct_answer,
-            'word': word
-        })
+    with span('generate_quiz', num_questions=num_questions):
+        questions = quiz_engine.generate(num_questions)
 
     return jsonify({
         'questions': questions,
@@ -286,6 +931,100 @@ def generate_quiz():
     })
 
 
+def current_learner():
+    """Progress of the learner identified by this browser's session cookie"""
+    if 'learner' not in session:
+        session['learner'] = secrets.token_urlsafe(16)
+        session.permanent = True
+    return PROGRESS_STORE.learner(session['learner'])
+
+
+@app.route('/progress')
+def progress():
+    """Learning progress of the current browser session"""
+    return jsonify({**current_learner().summary(), 'success': True})
+
+
+@app.route('/progress/answer', methods=['POST'])
+def progress_answer():
+    """Record one flashcard or quiz answer (a known flashcard marks the word learned)"""
+    data = request.get_json(silent=True) or {}
+    word = data.get('word', '')
+    if not isinstance(word, str) or not word.strip():
+        return jsonify({'error': 'No word provided', 'success': False}), 400
+
+    learner = current_learner()
+    correct = bool(data.get('correct'))
+    learner.record_answer(word, correct)
+    learned = correct and data.get('mode') == 'flashcards' and learner.mark_learned(word)
+    return jsonify({'learned': bool(learned), 'success': True})
+
+
+@app.route('/progress/session', methods=['POST'])
+def progress_session():
+    """Record the score of a finished quiz or flashcard session"""
+    data = request.get_json(silent=True) or {}
+    try:
+        score, total = int(data['score']), int(data['total'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'score and total are required', 'success': False}), 400
+    if data.get('mode') not in SESSION_KINDS or not 0 <= score <= total:
+        return jsonify({'error': f"mode must be one of {', '.join(SESSION_KINDS)} and 0 <= score <= total",
+                        'success': False}), 400
+
+    current_learner().record_session(data['mode'], score, total)
+    return jsonify({'success': True})
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of this worker"""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def admin_authorized():
+    """True if the request carries ADMIN_TOKEN as a bearer token"""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Sampling profile of this worker, in folded-stack format for flame graphs
+    POST ?seconds=N starts a capture (with &wait=1, answers with the result
+    when it is done); GET returns the last finished capture
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required', 'success': False}), 403
+
+    if request.method == 'POST':
+        seconds = request.args.get('seconds', 10, type=float)
+        interval = request.args.get('interval', PROFILE_INTERVAL, type=float)
+        if not PROFILER.start(seconds, interval):
+            return jsonify({**PROFILER.status(), 'error': 'A capture is already running', 'success': False}), 409
+        log.info("Profiling started", seconds=PROFILER.seconds, interval=PROFILER.interval)
+        if not request.args.get('wait', type=int):
+            return jsonify({**PROFILER.status(), 'success': True}), 202
+        PROFILER.wait()
+
+    if PROFILER.running:
+        return jsonify({**PROFILER.status(), 'success': True}), 202
+    if not PROFILER.samples:
+        return jsonify({'error': 'No capture yet', 'success': False}), 404
+    return Response(PROFILER.folded(), mimetype='text/plain',
+                    headers={'X-Profile-Samples': str(PROFILER.samples),
+                             'X-Profile-Pid': str(os.getpid())})
+
+
+@app.route('/progress/stats')
+def progress_stats():
+    """Size of the progress store"""
+    return jsonify({**PROGRESS_STORE.stats(), 'success': True})
+
+
 if __name__ == '__main__':
     # Get port from environment variable (for deployment) or use default
     port = int(os.getenv('PORT', 8080))